@@ -0,0 +1,82 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Cost of decoding and encoding Neutron bodies with each JSON backend."""
+from __future__ import print_function
+
+import json
+import timeit
+
+from wafflehaus import codec
+
+PAGE_LINK = "http://localhost:9696/v2.0/ports?limit=1000&marker=port-999"
+
+
+def build_ports(size):
+    return {"ports": [{"id": "6f3c2d1e-%04d-4c8b-9e2f-7a1b3c5d7e9f" % i,
+                       "name": u"port-\u00e9-%d" % i,
+                       "network_id": "net-%d" % (i % 10),
+                       "tenant_id": "a3c5e7f9b1d3",
+                       "admin_state_up": True,
+                       "status": "ACTIVE",
+                       "mac_address": "fa:16:3e:00:%02x:%02x" % (
+                           i // 256, i % 256),
+                       "device_owner": "compute:nova",
+                       "binding:host_id": "compute-%d" % (i % 50),
+                       "binding:vif_details": {"port_filter": True,
+                                               "ovs_hybrid_plug": True},
+                       "security_groups": ["sg-default"],
+                       "fixed_ips": [{"subnet_id": "subnet-%d" % (i % 10),
+                                      "ip_address": "10.0.%d.%d" % (
+                                          i // 256, i % 256)}]}
+                      for i in range(size)],
+            "ports_links": [{"href": PAGE_LINK, "rel": "next"}]}
+
+
+def build_rules(size):
+    return {"security_group_rules": [
+        {"id": "rule-%d" % i,
+         "direction": "ingress",
+         "ethertype": "IPv4",
+         "protocol": "tcp",
+         "port_range_min": i % 1024,
+         "port_range_max": i % 1024,
+         "remote_ip_prefix": "10.%d.0.0/16" % (i % 256),
+         "security_group_id": "sg-%d" % (i % 20)}
+        for i in range(size)]}
+
+
+PAYLOADS = (('1 port', build_ports(1)),
+            ('1k ports', build_ports(1000)),
+            ('10k rules', build_rules(10000)))
+
+
+def main():
+    print('backends available: %s, default: %s' %
+          (', '.join(c.name for c in codec.CODECS), codec.BACKEND))
+    for label, payload in PAYLOADS:
+        raw = json.dumps(payload)
+        number = max(3, 2000000 // len(raw))
+        for backend in codec.CODECS:
+            decode = timeit.timeit(lambda: backend.loads(raw),
+                                   number=number)
+            encode = timeit.timeit(lambda: backend.dumps(payload),
+                                   number=number)
+            print('%-10s %-10s loads %10.1f usec  dumps %10.1f usec' %
+                  (label, backend.name, decode / number * 1e6,
+                   encode / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
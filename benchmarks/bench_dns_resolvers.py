@@ -0,0 +1,137 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Cost of the lookups of one request against a local stand-in nameserver."""
+from __future__ import print_function
+
+import socket
+import struct
+import threading
+import timeit
+
+import dns.message
+import dns.query
+import dns.rdatatype
+import dns.resolver
+import dns.rrset
+
+from wafflehaus.dns_filter import tcp
+
+PTR = '1.1.168.192.in-addr.arpa.'
+NAME = 'derp.widget.com.'
+RECORDS = {(PTR, 'PTR'): NAME, (NAME, 'A'): '192.168.1.1'}
+
+
+def answer(wire):
+    query = dns.message.from_wire(wire)
+    response = dns.message.make_response(query)
+    question = query.question[0]
+    value = RECORDS[(question.name.to_text(),
+                     dns.rdatatype.to_text(question.rdtype))]
+    response.answer.append(dns.rrset.from_text(question.name, 300, 'IN',
+                                               question.rdtype, value))
+    return response.to_wire()
+
+
+def recv_exactly(conn, count):
+    data = b''
+    while len(data) < count:
+        chunk = conn.recv(count - len(data))
+        if not chunk:
+            raise EOFError()
+        data += chunk
+    return data
+
+
+def serve_udp(sock):
+    while True:
+        wire, peer = sock.recvfrom(65535)
+        sock.sendto(answer(wire), peer)
+
+
+def serve_tcp_connection(conn):
+    try:
+        while True:
+            length, = struct.unpack('!H', recv_exactly(conn, 2))
+            wire = answer(recv_exactly(conn, length))
+            conn.sendall(struct.pack('!H', len(wire)) + wire)
+    except (socket.error, EOFError):
+        conn.close()
+
+
+def serve_tcp(sock):
+    while True:
+        conn, _ = sock.accept()
+        start(serve_tcp_connection, conn)
+
+
+def start(func, *args):
+    thread = threading.Thread(target=func, args=args)
+    thread.daemon = True
+    thread.start()
+
+
+def start_nameserver():
+    """Serves RECORDS over UDP and TCP on the same local port."""
+    tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    tcp_sock.bind(('127.0.0.1', 0))
+    tcp_sock.listen(16)
+    port = tcp_sock.getsockname()[1]
+    udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_sock.bind(('127.0.0.1', port))
+    start(serve_tcp, tcp_sock)
+    start(serve_udp, udp_sock)
+    return port
+
+
+def lookups(res):
+    res.query(PTR, 'PTR')
+    res.query(NAME, 'A')
+
+
+def resolver_per_request(port):
+    """The resolvers built for every request before they were reused."""
+    str(dns.resolver.Resolver().nameservers[0])
+    res = dns.resolver.Resolver(configure=False)
+    res.nameservers = ['127.0.0.1']
+    res.port = port
+    lookups(res)
+
+
+def connection_per_query(port):
+    for qname, rdtype in ((PTR, 'PTR'), (NAME, 'A')):
+        dns.query.tcp(dns.message.make_query(qname, rdtype), '127.0.0.1',
+                      timeout=5, port=port)
+
+
+def main():
+    port = start_nameserver()
+    udp_resolver = dns.resolver.Resolver(configure=False)
+    udp_resolver.nameservers = ['127.0.0.1']
+    udp_resolver.port = port
+    tcp_resolver = tcp.TCPResolver(['127.0.0.1'], tcp.ConnectionPool(),
+                                   port=port)
+    number = 2000
+    for label, func in (
+            ('udp, resolver per request', lambda: resolver_per_request(port)),
+            ('udp, reused resolver', lambda: lookups(udp_resolver)),
+            ('tcp, connection per query', lambda: connection_per_query(port)),
+            ('tcp, pooled connections', lambda: lookups(tcp_resolver))):
+        func()
+        elapsed = timeit.timeit(func, number=number)
+        print('%-28s %8.1f usec/request' % (label, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
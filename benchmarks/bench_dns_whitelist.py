@@ -0,0 +1,63 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Cost of matching a name against a growing DNS whitelist."""
+from __future__ import print_function
+
+import timeit
+
+from wafflehaus.dns_filter import domains
+
+SIZES = (10, 1000, 100000)
+
+
+def build_whitelist(size):
+    return ['partner%d.example.com' % i for i in range(size)]
+
+
+def endswith_scan(domain, whitelist):
+    """The matching done before the whitelist was compiled."""
+    domain = domain.rstrip('.')
+    for ok_host in whitelist:
+        if domain.endswith(ok_host):
+            return True
+    return False
+
+
+def run(size, number):
+    whitelist = build_whitelist(size)
+    trie = domains.DomainTrie(whitelist)
+    hit = 'host-1.rack-2.partner%d.example.com.' % (size - 1)
+    miss = 'host-1.rack-2.stranger.example.org.'
+
+    results = []
+    for name, domain in (('hit', hit), ('miss', miss)):
+        elapsed = timeit.timeit(lambda: endswith_scan(domain, whitelist),
+                                number=number)
+        results.append(('endswith scan', name, elapsed / number * 1e6))
+        elapsed = timeit.timeit(lambda: domain in trie, number=number * 100)
+        results.append(('label trie', name, elapsed / number / 100 * 1e6))
+    return results
+
+
+def main():
+    for size in SIZES:
+        number = max(10, 100000 // size)
+        for label, name, usec in run(size, number):
+            print('%6d domains  %-14s %-4s %12.2f usec/lookup' %
+                  (size, label, name, usec))
+
+
+if __name__ == '__main__':
+    main()
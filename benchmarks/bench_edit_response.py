@@ -0,0 +1,93 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Cost of editing a list of ports with several EditResponse filters."""
+from __future__ import print_function
+
+import copy
+import timeit
+
+from wafflehaus import edit_response
+
+SIZES = (100, 10000)
+
+CONF = {"enabled": "true",
+        "filters": "host profile mac",
+        "host_resource": "GET /v2.0/ports",
+        "host_key": "binding:host_id",
+        "profile_resource": "GET /v2.0/ports",
+        "profile_key": "binding:profile",
+        "profile_value": "{}",
+        "mac_resource": "GET /v2.0/ports",
+        "mac_key": "mac_address",
+        "mac_value": "REDACTED"}
+
+
+def build_ports(size):
+    return {"ports": [{"id": "port-%d" % i,
+                       "network_id": "net-%d" % (i % 10),
+                       "mac_address": "fa:16:3e:00:%02x:%02x" % (
+                           i // 256, i % 256),
+                       "binding:host_id": "compute-%d" % (i % 50),
+                       "binding:profile": {"pci_slot": "0000:00:%02x" % (
+                           i % 32)},
+                       "security_groups": ["sg-default"],
+                       "fixed_ips": [{"subnet_id": "subnet-%d" % (i % 10),
+                                      "ip_address": "10.0.%d.%d" % (
+                                          i // 256, i % 256)}]}
+                      for i in range(size)]}
+
+
+def walk_keys_per_filter(data, resources, waffle):
+    """The recursive walk, once for each filter, used before."""
+    for resource in resources:
+        def walk_keys(data):
+            if isinstance(data, dict):
+                for key, value in data.items():
+                    if key == resource['key']:
+                        val = resource.get('value', None)
+                        if val is None:
+                            del(data[key])
+                        else:
+                            data[key] = waffle._replace_lookup(val)
+                    elif isinstance(value, dict) or isinstance(value, list):
+                        data[key] = walk_keys(value)
+            elif isinstance(data, list):
+                data = [walk_keys(part) for part in data]
+            return data
+        data = walk_keys(data)
+    return data
+
+
+def main():
+    waffle = edit_response.filter_factory(CONF)(None)
+    plan = list(waffle.resources.values())
+    actions = waffle._actions(plan)
+    for size in SIZES:
+        body = build_ports(size)
+        number = max(3, 30000 // size)
+        for label, func in (
+                ('recursive walk per filter',
+                 lambda data: walk_keys_per_filter(data, plan, waffle)),
+                ('single pass walk',
+                 lambda data: waffle._edit_body(data, actions))):
+            copies = [copy.deepcopy(body) for i in range(number)]
+            elapsed = timeit.timeit(lambda: func(copies.pop()),
+                                    number=number)
+            print('%5d ports  %-26s %10.1f usec/response' %
+                  (size, label, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
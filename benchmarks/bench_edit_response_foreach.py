@@ -0,0 +1,86 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Cost of filtering a list of security group rules with foreach."""
+from __future__ import print_function
+
+import timeit
+
+from wafflehaus import edit_response
+
+SIZES = (100, 10000)
+
+EXPRESSION = ("foreach:drop_if:protocol=icmp,protocol=udp,protocol=gre,"
+              "ethertype=IPv6")
+
+
+def build_rules(size):
+    protocols = ("tcp", "udp", "icmp", "gre")
+    return [{"id": "rule-%d" % i,
+             "direction": "ingress",
+             "ethertype": "IPv4" if i % 7 else "IPv6",
+             "protocol": protocols[i % len(protocols)],
+             "port_range_min": i % 1024,
+             "port_range_max": i % 1024,
+             "remote_ip_prefix": "10.%d.0.0/16" % (i % 256)}
+            for i in range(size)]
+
+
+def split_per_list(conditional, data):
+    """The foreach parsed again for every list, used before."""
+    new_data = []
+    splits = conditional.split(":", 2)
+    action = splits[1]
+    conditionals = splits[2].split(',')
+    for item in data:
+        do_action = False
+        for cond in conditionals:
+            (target, value) = cond.split("=")
+            if target not in item:
+                continue
+            if item.get(target) == value:
+                do_action = True
+        if do_action:
+            if action == 'keep_if':
+                new_data.append(item)
+        if not do_action:
+            if action == 'drop_if':
+                new_data.append(item)
+    return new_data
+
+
+def main():
+    conf = {"enabled": "true",
+            "filters": "rules",
+            "rules_resource": "GET /v2.0/security-group-rules",
+            "rules_key": "security_group_rules",
+            "rules_value": EXPRESSION}
+    waffle = edit_response.filter_factory(conf)(None)
+    foreach = waffle.resources["rules"]["foreach"]
+    for size in SIZES:
+        rules = build_rules(size)
+        assert split_per_list(EXPRESSION, rules) == foreach.filter(rules)
+        number = max(3, 100000 // size)
+        for label, func in (
+                ('parsed for every list',
+                 lambda: split_per_list(EXPRESSION, rules)),
+                ('compiled predicates',
+                 lambda: waffle._foreach(foreach, rules))):
+            elapsed = timeit.timeit(func, number=number)
+            print('%5d rules  %-22s %10.1f usec/list' %
+                  (size, label, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Cost of streaming a body holding one long string through EditResponse."""
+from __future__ import print_function
+
+import json
+import timeit
+
+import webob
+
+from wafflehaus import edit_response
+
+SIZES = (1 << 10, 1 << 20)
+CHUNK_SIZE = 512
+
+
+def main():
+    for size in SIZES:
+        body = json.dumps({"user_data": "x" * size, "secret": "s3cr3t"})
+        chunks = [body[i:i + CHUNK_SIZE]
+                  for i in range(0, len(body), CHUNK_SIZE)]
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'application/json')])
+            return chunks
+
+        number = max(3, (1 << 20) // size)
+        for streaming in ('false', 'true'):
+            waffle = edit_response.filter_factory(
+                {"enabled": "true",
+                 "streaming": streaming,
+                 "filters": "secret",
+                 "secret_resource": "GET /servers",
+                 "secret_key": "secret"})(app)
+            elapsed = timeit.timeit(
+                lambda: webob.Request.blank("/servers").get_response(
+                    waffle).body, number=number)
+            print('%8d bytes  streaming=%-5s %10.1f usec/response' %
+                  (size, streaming, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Cost of rewriting the links of a page of ports with Pagination."""
+from __future__ import print_function
+
+import json
+import timeit
+
+import webob
+
+from wafflehaus.pagination import pagination
+
+SIZES = (100, 10000)
+
+
+def build_page(size):
+    href = "http://localhost:9696/v2.0/ports?limit=%d&marker=port-%d"
+    return json.dumps(
+        {"ports": [{"id": "port-%d" % i,
+                    "network_id": "net-%d" % (i % 10),
+                    "mac_address": "fa:16:3e:00:%02x:%02x" % (
+                        i // 256, i % 256),
+                    "fixed_ips": [{"subnet_id": "subnet-%d" % (i % 10),
+                                   "ip_address": "10.0.%d.%d" % (
+                                       i // 256, i % 256)}]}
+                   for i in range(size)],
+         "ports_links": [{"href": href % (size, size - 1), "rel": "next"},
+                         {"href": href % (size, 0) + "&page_reverse=True",
+                          "rel": "previous"}]})
+
+
+def main():
+    for size in SIZES:
+        page = build_page(size)
+
+        @webob.dec.wsgify
+        def app(req):
+            return webob.Response(body=page, content_type="application/json")
+
+        number = max(3, 30000 // size)
+        for mode in ('json', 'bytes'):
+            waffle = pagination.filter_factory(
+                {"enabled": "true",
+                 "pagination_url": "https://neutron.example.com:7575",
+                 "rewrite_mode": mode})(app)
+            elapsed = timeit.timeit(
+                lambda: webob.Request.blank("/v2.0/ports").get_response(
+                    waffle).body, number=number)
+            print('%5d ports  %-6s %10.1f usec/response' %
+                  (size, mode, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
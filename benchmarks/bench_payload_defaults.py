@@ -0,0 +1,82 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Cost of setting the DefaultPayload defaults of a bulk port create."""
+from __future__ import print_function
+
+import copy
+import timeit
+
+import wafflehaus.payload_filter as pf
+
+DEFAULTS = (5, 50)
+PORTS = 100
+
+
+def build_conf(count):
+    conf = ['ports:option%d=null' % i for i in range(count)]
+    conf.extend('ports:fixed_ips:option%d=off' % i for i in range(count))
+    return ','.join(conf)
+
+
+def build_payload():
+    return {"ports": [{"network_id": "net-%d" % i,
+                       "fixed_ips": [{"subnet_id": "subnet-%d" % j}
+                                     for j in range(3)]}
+                      for i in range(PORTS)]}
+
+
+def walk_per_default(payload, value, path, depth=0):
+    """The recursive walk, once for each default, used before."""
+    key = path[depth]
+    if len(path) - 1 == depth:
+        if key not in payload:
+            if value == 'null':
+                value = None
+            payload[key] = value
+        return
+    if key not in payload:
+        return
+    ptr = payload[key]
+    if isinstance(ptr, list) and not isinstance(ptr, str):
+        for child in ptr:
+            walk_per_default(child, value, path, depth=depth + 1)
+    else:
+        walk_per_default(ptr, value, path, depth=depth + 1)
+
+
+def set_per_default(payload, conf):
+    for working in conf.split(','):
+        path, value = working.split('=')
+        walk_per_default(payload, value, path.split(':'))
+
+
+def main():
+    payload = build_payload()
+    for count in DEFAULTS:
+        conf = build_conf(count)
+        tree = pf.get_defaults(conf)
+        number = 200 // count
+        for label, func in (
+                ('walk per default', lambda data: set_per_default(data, conf)),
+                ('tree walk', lambda data: pf.set_unset_keys(data, tree))):
+            copies = [copy.deepcopy(payload) for i in range(number)]
+            elapsed = timeit.timeit(lambda: func(copies.pop()),
+                                    number=number)
+            print('%3d defaults  %-17s %10.1f usec/request' %
+                  (count * 2, label, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
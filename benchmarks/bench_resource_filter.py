@@ -0,0 +1,74 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Per-request cost of resource matching for a growing resource list."""
+from __future__ import print_function
+
+import timeit
+
+from routes import Mapper
+import webob
+
+import wafflehaus.resource_filter as rf
+
+SIZES = (1, 50, 500)
+
+
+def build_spec(size):
+    resources = ['GET POST /v2.0/widget%d/{id}/sub/{sub_id}' % i
+                 for i in range(size)]
+    return ', '.join(resources)
+
+
+def mapper_per_request(request, resource_list):
+    """The matching done before resources were compiled."""
+    map = Mapper()
+    for resource, data in resource_list.iteritems():
+        map.connect(None, resource, controller=','.join(data))
+    res = map.routematch(request.path)
+    if res is None:
+        return False
+    return request.method in res[0]['controller'].split(',')
+
+
+def run(size, number):
+    spec = build_spec(size)
+    routes_resources = rf.parse_resources(spec)
+    radix_resources = rf.parse_resources(spec, 'radix')
+    last = '/v2.0/widget%d/1234/sub/5678' % (size - 1)
+    req = webob.Request.blank(last, method='GET')
+    miss = webob.Request.blank('/v2.0/cog/1234', method='GET')
+
+    results = []
+    for label, func, resources in (
+            ('per-request mapper', mapper_per_request, routes_resources),
+            ('compiled routes', rf.matched_request, routes_resources),
+            ('compiled radix', rf.matched_request, radix_resources)):
+        for name, r in (('hit', req), ('miss', miss)):
+            elapsed = timeit.timeit(lambda: func(r, resources),
+                                    number=number)
+            results.append((label, name, elapsed / number * 1e6))
+    return results
+
+
+def main():
+    for size in SIZES:
+        number = max(10, 2000 // size)
+        for label, name, usec in run(size, number):
+            print('%4d resources  %-18s %-4s %10.1f usec/request' %
+                  (size, label, name, usec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Decides whether a response body is worth reading as JSON.
+
+Waffles that edit JSON bodies use this to pass other responses on without
+reading them: their app_iter is left as it is, so nothing is buffered.
+"""
+import itertools
+
+DEFAULT_JSON_TYPES = 'application/json'
+
+# Responses with these statuses never have a body
+_NO_BODY_STATUSES = frozenset([204, 304])
+
+
+def parse_content_types(content_types):
+    """Returns the content types of a space delimited list, lower cased."""
+    if content_types is None:
+        content_types = DEFAULT_JSON_TYPES
+    return frozenset(t.lower() for t in content_types.split())
+
+
+def is_json(content_type, content_types):
+    """Returns if the content type is one of them or ends with +json."""
+    if not content_type:
+        return False
+    content_type = content_type.lower()
+    return content_type in content_types or content_type.endswith('+json')
+
+
+def pass_reason(resp, content_types, max_size=0, method=None):
+    """Returns why the body should not be read, or None if it should be.
+
+    Only the headers, and the method of the request when given, are looked
+    at. A max_size of 0 is no limit.
+    """
+    if method == 'HEAD':
+        return 'response to HEAD'
+    if resp.status_code in _NO_BODY_STATUSES:
+        return 'status %d' % resp.status_code
+    if resp.content_length == 0:
+        return 'empty body'
+    if not is_json(resp.content_type, content_types):
+        return 'content type %s' % resp.content_type
+    if max_size and resp.content_length is not None:
+        if resp.content_length > max_size:
+            return 'content length %d' % resp.content_length
+    return None
+
+
+def read_limited(resp, max_size):
+    """Reads the body into resp unless it is larger than max_size.
+
+    Returns True if the body was read. Otherwise at most max_size bytes
+    were read and the app_iter is replaced by one that yields them and
+    then the rest, so the body is passed on as it was.
+    """
+    if not max_size or resp.content_length is not None:
+        return True
+    chunks = []
+    size = 0
+    app_iter = resp.app_iter
+    it = iter(app_iter)
+    for chunk in it:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > max_size:
+            resp.app_iter = ClosingIter(itertools.chain(chunks, it),
+                                        app_iter)
+            return False
+    resp.body = ''.join(chunks)
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
+    return True
+
+
+class ClosingIter(object):
+    """Iterates over it and closes the original app_iter when closed."""
+
+    def __init__(self, it, app_iter):
+        self.it = it
+        self.app_iter = app_iter
+
+    def __iter__(self):
+        return self.it
+
+    def close(self):
+        close = getattr(self.app_iter, 'close', None)
+        if close is not None:
+            close()
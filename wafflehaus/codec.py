@@ -0,0 +1,114 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""The JSON codec shared by the waffles that read and write bodies.
+
+The default backend is simplejson when its C speedups are built, the json
+module otherwise; both write floats exactly as Python does. ujson is only
+used when a waffle is configured with json_backend = ujson, since it may
+round floats and so change the bytes written. Bodies are decoded straight
+from the bytes read, without decoding them to text first, and written
+compactly. Every backend raises ValueError for a body that is not JSON.
+"""
+import json
+
+import simplejson
+
+try:
+    from simplejson import _speedups
+except ImportError:
+    _speedups = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+__all__ = ['BACKEND', 'CODECS', 'dumps', 'get', 'loads', 'raw_decode']
+
+_COMPACT = (',', ':')
+
+
+class Codec(object):
+    """Decodes and encodes JSON with one backend."""
+
+    def __init__(self, name, loads, dumps, decoder):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self._decoder = decoder
+
+    def raw_decode(self, data, idx=0):
+        """Returns the value starting at idx and the index it ends at."""
+        return self._decoder.raw_decode(data, idx)
+
+    def __repr__(self):
+        return 'Codec(%r)' % self.name
+
+
+def _json_codec():
+    encoder = json.JSONEncoder(separators=_COMPACT)
+    return Codec('json', json.loads, encoder.encode, json.JSONDecoder())
+
+
+def _simplejson_codec():
+    encoder = simplejson.JSONEncoder(separators=_COMPACT)
+    return Codec('simplejson', simplejson.loads, encoder.encode,
+                 simplejson.JSONDecoder())
+
+
+def _ujson_codec():
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=True,
+                           escape_forward_slashes=False)
+    # ujson can not decode part of a string, the json module does that
+    return Codec('ujson', ujson.loads, dumps, json.JSONDecoder())
+
+
+def _available():
+    codecs = []
+    if _speedups is not None:
+        codecs.append(_simplejson_codec())
+    codecs.append(_json_codec())
+    if ujson is not None:
+        codecs.append(_ujson_codec())
+    return codecs
+
+
+# Every backend available here, the default first
+CODECS = _available()
+
+_codec = CODECS[0]
+BACKEND = _codec.name
+loads = _codec.loads
+dumps = _codec.dumps
+raw_decode = _codec.raw_decode
+
+_BY_NAME = dict((c.name, c) for c in CODECS)
+# Without its speedups simplejson is slower than json, but it still works
+_BY_NAME.setdefault('simplejson', _simplejson_codec())
+
+
+def get(name=None):
+    """Returns the codec of the backend named, the default one for None.
+
+    Raises ValueError for a backend that is unknown or not installed.
+    """
+    if not name:
+        return _codec
+    found = _BY_NAME.get(name)
+    if found is None:
+        raise ValueError("JSON backend '%s' is not available, expected one "
+                         "of %s" % (name, ', '.join(sorted(_BY_NAME))))
+    return found
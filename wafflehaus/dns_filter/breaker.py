@@ -0,0 +1,128 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import collections
+import logging
+import threading
+import time
+
+__all__ = ['CircuitBreaker', 'CLOSED', 'HALF_OPEN', 'OPEN']
+
+LOG = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+    """Stops calling a dependency that keeps failing or answering slowly.
+
+    The outcome of every call in the last window seconds is kept; a call
+    that took slow_call seconds or more counts as failed. Once there are at
+    least min_calls and failure_rate of them failed, the breaker opens and
+    allow refuses calls. After reset_timeout seconds it lets probes calls
+    through, one at a time per probe, and closes when they all succeed or
+    opens again as soon as one fails.
+    """
+
+    def __init__(self, window=60, min_calls=10, failure_rate=0.5,
+                 slow_call=1.0, reset_timeout=30, probes=3, log=LOG):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.log = log
+        self.state = CLOSED
+        self.trips = 0
+        self.rejected = 0
+        self._calls = collections.deque()
+        self._failures = 0
+        self._opened = 0
+        self._probing = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns if a call may be made now."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.time() - self._opened < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probing >= self.probes - self._probe_successes:
+                    self.rejected += 1
+                    return False
+                self._probing += 1
+            return True
+
+    def cancel(self):
+        """Gives back a call that was allowed but not made."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = max(0, self._probing - 1)
+
+    def record(self, elapsed, failed=False):
+        """Records the outcome of a call that was allowed."""
+        failed = failed or elapsed >= self.slow_call
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = max(0, self._probing - 1)
+                if failed:
+                    self._transition(OPEN)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.probes:
+                    self._transition(CLOSED)
+                return
+            if self.state == OPEN:
+                return
+            now = time.time()
+            self._calls.append((now, failed))
+            if failed:
+                self._failures += 1
+            while self._calls and self._calls[0][0] <= now - self.window:
+                if self._calls.popleft()[1]:
+                    self._failures -= 1
+            calls = len(self._calls)
+            if calls >= self.min_calls:
+                if self._failures >= self.failure_rate * calls:
+                    self._transition(OPEN)
+
+    def _transition(self, state):
+        if state == OPEN:
+            self.trips += 1
+            self._opened = time.time()
+            self.log.warning("Circuit breaker opened, %d of %d calls failed" %
+                             (self._failures, len(self._calls)))
+        else:
+            self.log.info("Circuit breaker is now %s" % state)
+        self.state = state
+        self._calls.clear()
+        self._failures = 0
+        self._probing = 0
+        self._probe_successes = 0
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._calls)
+            return {'state': self.state, 'calls': calls,
+                    'failures': self._failures,
+                    'failure_rate': (float(self._failures) / calls
+                                     if calls else 0.0),
+                    'trips': self.trips, 'rejected': self.rejected}
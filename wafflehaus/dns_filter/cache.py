@@ -0,0 +1,114 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import collections
+import threading
+import time
+
+__all__ = ['TTLCache']
+
+
+class TTLCache(object):
+    """Size bounded LRU cache where every entry expires after its own TTL.
+
+    TTLs are clamped to [min_ttl, max_ttl]; an entry whose clamped TTL is not
+    positive is not stored. A size of 0 disables the cache. Expired entries
+    are kept for grace seconds and can still be read with get_stale.
+    """
+
+    def __init__(self, size=1000, min_ttl=0, max_ttl=3600, grace=0):
+        self.size = size
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.grace = grace
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clamp(self, ttl):
+        return max(self.min_ttl, min(self.max_ttl, ttl))
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            now = time.time()
+            if expires <= now:
+                if now < expires + self.grace:
+                    self._entries[key] = entry
+                self.misses += 1
+                return default
+            self._entries[key] = entry
+            self.hits += 1
+            return value
+
+    def get_stale(self, key, default=None, grace=None):
+        """Returns the value of an entry that expired less than grace ago.
+
+        A grace shorter than the one of the cache can be given.
+        """
+        if grace is None or grace > self.grace:
+            grace = self.grace
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires <= time.time() < expires + grace:
+                self.stale_hits += 1
+                return value
+            return default
+
+    def set(self, key, value, ttl):
+        ttl = self.clamp(ttl)
+        if self.size <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[key] = (value, time.time() + ttl)
+
+    def restore(self, key, value, expires):
+        """Stores an entry that expires at the given time unless it has."""
+        ttl = expires - time.time()
+        if ttl > 0:
+            self.set(key, value, ttl)
+
+    def items(self):
+        """Returns (key, value, expires) for every live entry."""
+        now = time.time()
+        with self._lock:
+            return [(key, value, expires)
+                    for key, (value, expires) in self._entries.items()
+                    if expires > now]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits,
+                'misses': self.misses, 'stale_hits': self.stale_hits,
+                'evictions': self.evictions}
@@ -0,0 +1,93 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import binascii
+import bisect
+import socket
+
+__all__ = ['CIDRSet']
+
+_BITS = {socket.AF_INET: 32, socket.AF_INET6: 128}
+_V4_MAPPED = 0xffff << 32
+
+
+def _to_int(address):
+    """Returns (family, integer) for an IPv4 or IPv6 address string."""
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            packed = socket.inet_pton(family, address)
+        except (socket.error, TypeError, ValueError):
+            continue
+        value = int(binascii.hexlify(packed), 16)
+        if family == socket.AF_INET6 and value >> 32 == _V4_MAPPED >> 32:
+            return socket.AF_INET, value & 0xffffffff
+        return family, value
+    raise ValueError("Not an IP address: %s" % address)
+
+
+def _to_range(cidr):
+    """Returns (family, first, last) for an address or network."""
+    address, _, prefix = cidr.partition('/')
+    family, value = _to_int(address)
+    bits = _BITS[family]
+    prefix = int(prefix) if prefix else bits
+    if not 0 <= prefix <= bits:
+        raise ValueError("Bad prefix length: %s" % cidr)
+    host_mask = (1 << (bits - prefix)) - 1
+    first = value & ~host_mask
+    return family, first, first | host_mask
+
+
+class CIDRSet(object):
+    """A set of networks that is checked with a binary search.
+
+    The networks are merged into sorted, non overlapping integer ranges for
+    each address family. Networks that do not parse are left out and listed
+    in invalid.
+    """
+
+    def __init__(self, cidrs=()):
+        self.invalid = []
+        ranges = dict((family, []) for family in _BITS)
+        for cidr in cidrs:
+            try:
+                family, first, last = _to_range(cidr)
+            except ValueError:
+                self.invalid.append(cidr)
+                continue
+            ranges[family].append((first, last))
+        self._starts = {}
+        self._ends = {}
+        for family, family_ranges in ranges.items():
+            starts = []
+            ends = []
+            for first, last in sorted(family_ranges):
+                if ends and first <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], last)
+                    continue
+                starts.append(first)
+                ends.append(last)
+            self._starts[family] = starts
+            self._ends[family] = ends
+
+    def __len__(self):
+        return sum(len(starts) for starts in self._starts.values())
+
+    def __contains__(self, address):
+        try:
+            family, value = _to_int(address)
+        except ValueError:
+            return False
+        index = bisect.bisect_right(self._starts[family], value) - 1
+        return index >= 0 and value <= self._ends[family][index]
@@ -0,0 +1,64 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+__all__ = ['DomainTrie']
+
+# Marks a node that ends a whitelisted domain. Labels are never None.
+_END = None
+
+
+def _labels(domain):
+    """Returns the labels of a domain from the top level down."""
+    labels = domain.lower().strip('.').split('.')
+    labels.reverse()
+    return labels
+
+
+class DomainTrie(object):
+    """A set of domains that also holds all of their subdomains.
+
+    The domains are stored as nested dicts keyed by their labels from the
+    top level down, so checking a name takes one step per label of the name
+    however many domains there are. Names only match on label boundaries:
+    www.example.com is in a trie of example.com but badexample.com is not.
+    """
+
+    def __init__(self, domains=()):
+        self._root = {}
+        self._len = 0
+        for domain in domains:
+            self.add(domain)
+
+    def __len__(self):
+        return self._len
+
+    def add(self, domain):
+        if not domain.strip('.'):
+            return
+        node = self._root
+        for label in _labels(domain):
+            node = node.setdefault(label, {})
+        if _END not in node:
+            node[_END] = True
+            self._len += 1
+
+    def __contains__(self, name):
+        node = self._root
+        for label in _labels(name):
+            node = node.get(label)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
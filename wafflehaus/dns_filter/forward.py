@@ -0,0 +1,84 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import logging
+import socket
+
+import dns.exception
+import dns.resolver
+
+__all__ = ['ForwardAllowlist']
+
+LOG = logging.getLogger(__name__)
+
+
+def normalize(address):
+    """Returns the canonical text of an IPv6 address, others unchanged."""
+    if ':' not in address:
+        return address
+    try:
+        return socket.inet_ntop(socket.AF_INET6,
+                                socket.inet_pton(socket.AF_INET6, address))
+    except (socket.error, ValueError):
+        return address
+
+
+class ForwardAllowlist(object):
+    """Addresses of a fixed set of hostnames, resolved ahead of time.
+
+    Each address maps to the hostname it was resolved from. A refresh builds
+    a new mapping and swaps it in, so lookups never see a partial one. A
+    hostname that fails to resolve keeps the addresses it had.
+    """
+
+    def __init__(self, hostnames, create_resolver, log=LOG):
+        self.hostnames = hostnames
+        self.create_resolver = create_resolver
+        self.log = log
+        self.addresses = {}
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def get(self, address):
+        """Returns the hostname the address belongs to or None."""
+        try:
+            return self.addresses.get(normalize(address))
+        except TypeError:
+            return None
+
+    def refresh(self):
+        res = self.create_resolver()
+        previous = {}
+        for address, hostname in self.addresses.items():
+            previous.setdefault(hostname, []).append(address)
+        addresses = {}
+        for hostname in self.hostnames:
+            found = []
+            failed = False
+            for rdtype in ('A', 'AAAA'):
+                try:
+                    found.extend(normalize(str(v))
+                                 for v in res.query(hostname, rdtype))
+                except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+                    continue
+                except dns.exception.DNSException as e:
+                    self.log.warning("Could not resolve %s: %s" %
+                                     (hostname, e))
+                    failed = True
+            if failed:
+                found.extend(previous.get(hostname, []))
+            for address in found:
+                addresses.setdefault(address, hostname)
+        self.addresses = addresses
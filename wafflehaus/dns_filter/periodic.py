@@ -0,0 +1,71 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import logging
+import os
+import threading
+
+__all__ = ['PeriodicTask']
+
+LOG = logging.getLogger(__name__)
+
+
+class PeriodicTask(object):
+    """Calls func every interval seconds until stopped.
+
+    The thread is started by start, once in each process: a worker forked
+    after the first start gets a thread of its own on its next start.
+    An exception raised by func is logged and does not stop the task.
+    """
+
+    def __init__(self, func, interval):
+        self.func = func
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def start(self):
+        """Starts the thread unless it already runs in this process."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid or self._stopped.is_set():
+                return
+            thread = threading.Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+            self._thread = thread
+            self._pid = pid
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.func()
+            except Exception:
+                LOG.exception("Periodic task failed")
+
+    def is_alive(self):
+        if self._pid != os.getpid() or self._thread is None:
+            return False
+        return self._thread.is_alive()
+
+    def join(self, timeout=None):
+        if self._pid == os.getpid() and self._thread is not None:
+            self._thread.join(timeout)
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,148 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Resolvers that do not block the caller while a nameserver answers.
+
+Work runs on green threads when eventlet has patched the socket module (so
+the hub keeps serving other requests), on threads otherwise.
+"""
+import os
+import Queue
+import threading
+import time
+
+import dns.exception
+import dns.resolver
+
+try:
+    import eventlet
+    import eventlet.queue
+except ImportError:
+    eventlet = None
+
+__all__ = ['RacingResolver', 'ThreadPool', 'create_pool', 'spawn_n']
+
+# A nameserver that gives one of these has answered, the name just does not
+# resolve, so there is no point waiting on the others
+_FINAL_ERRORS = (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer)
+
+
+def _green():
+    if eventlet is None:
+        return False
+    return eventlet.patcher.is_monkey_patched('socket')
+
+
+class ThreadPool(object):
+    """Fixed number of daemon threads running the functions spawned.
+
+    The threads are started by the first spawn in each process, so a worker
+    forked from the process that built the pool gets threads of its own.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._tasks = None
+
+    def _start(self, pid):
+        with self._lock:
+            if self._pid == pid:
+                return
+            tasks = Queue.Queue()
+            for i in range(self.size):
+                worker = threading.Thread(target=self._work, args=(tasks,))
+                worker.daemon = True
+                worker.start()
+            self._tasks = tasks
+            self._pid = pid
+
+    def _work(self, tasks):
+        while True:
+            func, args = tasks.get()
+            func(*args)
+
+    def spawn_n(self, func, *args):
+        pid = os.getpid()
+        if self._pid != pid:
+            self._start(pid)
+        self._tasks.put((func, args))
+
+
+def create_pool(size):
+    """Returns a green pool under eventlet, a thread pool otherwise."""
+    if _green():
+        return eventlet.GreenPool(size)
+    return ThreadPool(size)
+
+
+def spawn_n(func, *args):
+    """Runs func on a new green thread under eventlet, a thread otherwise."""
+    if _green():
+        eventlet.spawn_n(func, *args)
+        return
+    worker = threading.Thread(target=func, args=args)
+    worker.daemon = True
+    worker.start()
+
+
+class RacingResolver(object):
+    """Sends each query to every resolver and returns the first answer.
+
+    Only when every resolver fails is the last error raised, unless one of
+    them reports that the name does not exist, which is raised right away.
+    Every query gets threads of its own, so a nameserver that does not
+    answer never holds up the queries that come after it, and no resolver
+    keeps trying for longer than the racer's lifetime.
+    """
+
+    def __init__(self, resolvers, lifetime=None):
+        self.resolvers = resolvers
+        if lifetime is None:
+            lifetime = max(res.lifetime for res in resolvers)
+        self.lifetime = lifetime
+
+    def _results(self):
+        if _green():
+            return eventlet.queue.LightQueue(), eventlet.queue.Empty
+        return Queue.Queue(), Queue.Empty
+
+    def _query(self, res, qname, rdtype, results):
+        try:
+            results.put((True, res.query(qname, rdtype)))
+        except dns.exception.DNSException as e:
+            results.put((False, e))
+        except Exception as e:
+            results.put((False, dns.exception.DNSException(str(e))))
+
+    def query(self, qname, rdtype):
+        results, empty = self._results()
+        deadline = time.time() + self.lifetime
+        for res in self.resolvers:
+            res.lifetime = self.lifetime
+            spawn_n(self._query, res, qname, rdtype, results)
+        error = None
+        for i in range(len(self.resolvers)):
+            try:
+                ok, value = results.get(
+                    timeout=max(0, deadline - time.time()))
+            except empty:
+                break
+            if ok:
+                return value
+            if isinstance(value, _FINAL_ERRORS):
+                raise value
+            error = value
+        raise error or dns.exception.Timeout()
@@ -0,0 +1,118 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Verdicts shared by every worker process on a host through an mmap'd file.
+
+The file is a header followed by fixed size slots. An address always maps to
+the same slot, a newer verdict for another address simply replaces it. Each
+slot starts with a version that is odd while the slot is being written.
+Readers do not lock, they read the version before and after the slot and
+retry or give up if it was odd or changed in between. Writers lock the slot
+with fcntl so two workers never write the same slot at once, and with a
+thread lock since fcntl locks do not exclude threads of the same process.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+__all__ = ['SharedVerdictStore']
+
+_MAGIC = b'WHVS'
+_HEADER = struct.Struct('<4sII')
+# version, expires, allowed, key length, key
+_SLOT = struct.Struct('<IdBB64s')
+_MAX_KEY = 64
+
+
+class SharedVerdictStore(object):
+
+    def __init__(self, path, slots=4096):
+        self.path = path
+        self.slots = slots
+        self.size = _HEADER.size + slots * _SLOT.size
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            self._prepare()
+            self._map = mmap.mmap(self._fd, self.size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _prepare(self):
+        """Lays out an empty store unless a matching one already exists."""
+        header = os.read(self._fd, _HEADER.size)
+        if len(header) == _HEADER.size:
+            magic, version, slots = _HEADER.unpack(header)
+            if magic == _MAGIC and version == 1 and slots == self.slots:
+                return
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, self.size)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, _HEADER.pack(_MAGIC, 1, self.slots))
+
+    def _version(self, offset):
+        return struct.unpack_from('<I', self._map, offset)[0]
+
+    def _offset(self, key):
+        slot = (zlib.crc32(key) & 0xffffffff) % self.slots
+        return _HEADER.size + slot * _SLOT.size
+
+    def get(self, key, retries=3):
+        """Returns (allowed, seconds left) for the key or None."""
+        key = str(key)
+        offset = self._offset(key)
+        for i in range(retries):
+            before = self._version(offset)
+            if before % 2:
+                continue
+            (version, expires, allowed, length,
+             stored) = _SLOT.unpack_from(self._map, offset)
+            # A writer that landed while the slot was read changed the
+            # version, what was read may mix two verdicts
+            if version != before or self._version(offset) != before:
+                continue
+            if length == 0 or stored[:length] != key:
+                return None
+            remaining = expires - time.time()
+            if remaining <= 0:
+                return None
+            return bool(allowed), remaining
+        return None
+
+    def set(self, key, allowed, ttl):
+        key = str(key)
+        if ttl <= 0 or len(key) > _MAX_KEY:
+            return
+        offset = self._offset(key)
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _SLOT.size, offset)
+            try:
+                version = self._version(offset)
+                version += 2 - version % 2
+                struct.pack_into('<I', self._map, offset, version - 1)
+                _SLOT.pack_into(self._map, offset, version - 1,
+                                time.time() + ttl, int(allowed), len(key),
+                                key)
+                struct.pack_into('<I', self._map, offset, version)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _SLOT.size, offset)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
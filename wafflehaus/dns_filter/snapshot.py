@@ -0,0 +1,81 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""On-disk snapshots of the DNS whitelist caches for warm restarts.
+
+A snapshot is a compact JSON document holding the verdicts, tagged with the
+whitelist they were made for, and the answers as the text of their records.
+Expiry times are absolute so a snapshot can be loaded by a later process.
+"""
+import json
+import os
+import time
+
+__all__ = ['SnapshotAnswer', 'dump', 'load']
+
+_VERSION = 1
+
+
+class SnapshotAnswer(list):
+    """Stands in for a dns.resolver.Answer that was loaded from a snapshot.
+
+    Like an Answer it can be indexed and iterated for its records, and its
+    rrset holds the same records with the seconds they have left as the ttl.
+    """
+
+    def __init__(self, values, ttl=0):
+        super(SnapshotAnswer, self).__init__(values)
+        self.rrset = self
+        self.ttl = ttl
+
+
+def dump(path, tag, verdicts, records):
+    """Writes the cache items to path, replacing any earlier snapshot."""
+    snapshot = {'version': _VERSION, 'tag': tag,
+                'verdicts': [[key, allowed, expires]
+                             for key, allowed, expires in verdicts
+                             if isinstance(key, basestring)],
+                'records': [[name, rdtype,
+                             [str(v) for v in getattr(answer, 'rrset',
+                                                      answer)],
+                             expires]
+                            for (name, rdtype), answer, expires in records]}
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.rename(tmp_path, path)
+
+
+def load(path):
+    """Returns (tag, verdicts, records) from path.
+
+    Missing or unreadable snapshots load as empty.
+    """
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (IOError, ValueError):
+        return None, [], []
+    if not isinstance(snapshot, dict) or snapshot.get('version') != _VERSION:
+        return None, [], []
+    now = time.time()
+    verdicts = [(str(key), allowed, expires)
+                for key, allowed, expires in snapshot.get('verdicts', [])]
+    records = [((str(name), str(rdtype)),
+                SnapshotAnswer([str(v) for v in values],
+                               max(0, int(expires - now))),
+                expires)
+               for name, rdtype, values, expires
+               in snapshot.get('records', [])]
+    return snapshot.get('tag'), verdicts, records
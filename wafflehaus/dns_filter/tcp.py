@@ -0,0 +1,155 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""DNS over persistent TCP connections.
+
+Useful where UDP to the nameserver is filtered or the answers are too large
+for a datagram. Connections are kept open between queries and shared through
+a pool, so most queries skip the TCP handshake.
+"""
+import collections
+import socket
+import struct
+import threading
+import time
+
+import dns.exception
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+
+__all__ = ['ConnectionPool', 'TCPResolver']
+
+_LENGTH = struct.Struct('!H')
+
+
+def _recv(sock, count):
+    data = b''
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            raise EOFError()
+        data += chunk
+    return data
+
+
+class ConnectionPool(object):
+    """Idle TCP connections to nameservers, at most size for each one."""
+
+    def __init__(self, size=4):
+        self.size = size
+        self.connects = 0
+        self._idle = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    def get(self, address, timeout):
+        """Returns (sock, reused) with a connection to the address."""
+        with self._lock:
+            idle = self._idle[address]
+            sock = idle.pop() if idle else None
+        if sock is not None:
+            sock.settimeout(timeout)
+            return sock, True
+        family = socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(address)
+        except Exception:
+            sock.close()
+            raise
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connects += 1
+        return sock, False
+
+    def put(self, address, sock):
+        """Gives back a connection that is ready for another query."""
+        with self._lock:
+            idle = self._idle[address]
+            if len(idle) < self.size:
+                idle.append(sock)
+                return
+        sock.close()
+
+    def clear(self):
+        with self._lock:
+            for idle in self._idle.values():
+                while idle:
+                    idle.pop().close()
+
+
+class TCPResolver(object):
+    """Queries the nameservers in turn over pooled TCP connections.
+
+    It answers like dns.resolver.Resolver: an Answer, or NXDOMAIN, NoAnswer,
+    NoNameservers or Timeout when the lifetime runs out.
+    """
+
+    def __init__(self, nameservers, pool, port=53, lifetime=30.0):
+        self.nameservers = nameservers
+        self.pool = pool
+        self.port = port
+        self.lifetime = lifetime
+
+    def _exchange(self, address, wire, deadline):
+        # A pooled connection may have been closed by the nameserver while
+        # idle, so a failure on one is retried once on a new connection
+        while True:
+            sock, reused = self.pool.get(address,
+                                         max(0.001, deadline - time.time()))
+            try:
+                sock.sendall(_LENGTH.pack(len(wire)) + wire)
+                length, = _LENGTH.unpack(_recv(sock, _LENGTH.size))
+                data = _recv(sock, length)
+            except socket.timeout:
+                sock.close()
+                raise dns.exception.Timeout()
+            except (socket.error, EOFError):
+                sock.close()
+                if reused:
+                    continue
+                raise
+            self.pool.put(address, sock)
+            return data
+
+    def query(self, qname, rdtype=dns.rdatatype.A):
+        if not isinstance(qname, dns.name.Name):
+            qname = dns.name.from_text(qname)
+        if not isinstance(rdtype, int):
+            rdtype = dns.rdatatype.from_text(rdtype)
+        request = dns.message.make_query(qname, rdtype)
+        wire = request.to_wire()
+        deadline = time.time() + self.lifetime
+        for nameserver in self.nameservers:
+            if time.time() >= deadline:
+                raise dns.exception.Timeout()
+            try:
+                data = self._exchange((nameserver, self.port), wire,
+                                      deadline)
+                response = dns.message.from_wire(data)
+            except (socket.error, EOFError, dns.exception.FormError):
+                continue
+            if not request.is_response(response):
+                continue
+            rcode = response.rcode()
+            if rcode == dns.rcode.NXDOMAIN:
+                raise dns.resolver.NXDOMAIN()
+            if rcode != dns.rcode.NOERROR:
+                continue
+            return dns.resolver.Answer(qname, rdtype, dns.rdataclass.IN,
+                                       response)
+        raise dns.resolver.NoNameservers()
@@ -14,6 +14,12 @@
 #    under the License.
 """This middleware is intended to be used with paste.deploy."""
 
+import atexit
+import random
+import threading
+import time
+import zlib
+
 import dns.exception
 import dns.resolver
 import dns.reversename
@@ -21,6 +27,26 @@ import webob.dec
 import webob.exc
 
 import wafflehaus.base
+from wafflehaus.dns_filter import breaker
+from wafflehaus.dns_filter import cache
+from wafflehaus.dns_filter import cidr
+from wafflehaus.dns_filter import domains
+from wafflehaus.dns_filter import forward
+from wafflehaus.dns_filter import periodic
+from wafflehaus.dns_filter import resolvers
+from wafflehaus.dns_filter import shared
+from wafflehaus.dns_filter import snapshot
+from wafflehaus.dns_filter import tcp
+
+
+# The nameserver answered, the name just does not resolve
+_ANSWERED = (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer)
+
+
+def _answer_ttl(answer):
+    """Returns the TTL of an answer or 0 when it does not have one."""
+    rrset = getattr(answer, 'rrset', None)
+    return getattr(rrset, 'ttl', 0)
 
 
 # pylint: disable=R0903
@@ -37,15 +63,147 @@ class DNSWhitelist(wafflehaus.base.WafflehausBase):
         self.log.info('Starting wafflehaus dns whitelist middleware')
         self.ignore_forwarded = (conf.get('ignore_forwarded') in self.truths)
         self.whitelist = self._create_whitelist(conf.get('whitelist'))
+        self.whitelist_trie = domains.DomainTrie(self.whitelist or [])
+        self.trusted_cidrs = self._create_cidrs(conf.get('trusted_cidrs'))
+        self.denied_cidrs = self._create_cidrs(conf.get('denied_cidrs'))
+        self.resolution = conf.get('dns_resolution', 'serial')
+        if self.resolution not in ('serial', 'race'):
+            raise ValueError("Unknown dns_resolution '%s', expected serial "
+                             "or race" % self.resolution)
+        self.timeout = None
+        if conf.get('dns_timeout'):
+            self.timeout = float(conf.get('dns_timeout'))
+        self.breaker = None
+        self.breaker_policy = conf.get('dns_breaker_policy', 'cached')
+        if self.breaker_policy not in ('cached', 'closed'):
+            raise ValueError("Unknown dns_breaker_policy '%s', expected "
+                             "cached or closed" % self.breaker_policy)
+        self.breaker_stale = 0
+        if conf.get('dns_breaker') in self.truths:
+            if self.breaker_policy == 'cached':
+                self.breaker_stale = float(conf.get('dns_breaker_stale',
+                                                    3600))
+            self.breaker = breaker.CircuitBreaker(
+                window=float(conf.get('dns_breaker_window', 60)),
+                min_calls=int(conf.get('dns_breaker_min_calls', 10)),
+                failure_rate=float(conf.get('dns_breaker_failure_rate', 0.5)),
+                slow_call=float(conf.get('dns_breaker_slow_call', 1.0)),
+                reset_timeout=float(conf.get('dns_breaker_reset', 30)),
+                probes=int(conf.get('dns_breaker_probes', 3)),
+                log=self.log)
+        self.nameservers = None
+        if conf.get('nameserver'):
+            self.nameservers = conf.get('nameserver').split()
+        self.port = int(conf.get('nameserver_port', 53))
+        self.tcp_pool = None
+        transport = conf.get('dns_transport', 'udp')
+        if transport not in ('udp', 'tcp'):
+            raise ValueError("Unknown dns_transport '%s', expected udp or "
+                             "tcp" % transport)
+        if transport == 'tcp':
+            self.tcp_pool = tcp.ConnectionPool(
+                size=int(conf.get('dns_tcp_connections', 4)))
+        self._local = threading.local()
+        self.allowed_hosts = None
+        self.allowed_hosts_refresher = None
+        if conf.get('allowed_hosts'):
+            self.allowed_hosts = forward.ForwardAllowlist(
+                conf.get('allowed_hosts').split(), self._create_resolver,
+                log=self.log)
+            try:
+                self.allowed_hosts.refresh()
+            except Exception as e:
+                self.log.error("Could not resolve allowed hosts: %s" % e)
+            self.allowed_hosts_refresher = periodic.PeriodicTask(
+                self.allowed_hosts.refresh,
+                float(conf.get('allowed_hosts_refresh', 300)))
+        self.record_cache = cache.TTLCache(
+            size=int(conf.get('dns_cache_size', 1000)),
+            min_ttl=int(conf.get('dns_cache_min_ttl', 0)),
+            max_ttl=int(conf.get('dns_cache_max_ttl', 3600)))
+        self.stale_grace = float(conf.get('dns_stale_grace', 0))
+        self.verdict_cache = cache.TTLCache(
+            size=int(conf.get('dns_verdict_cache_size', 1000)),
+            min_ttl=self.record_cache.min_ttl,
+            max_ttl=self.record_cache.max_ttl,
+            grace=max(self.stale_grace, self.breaker_stale))
+        self.refresh_pool = None
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        if self.stale_grace > 0:
+            self.refresh_pool = resolvers.create_pool(
+                int(conf.get('dns_refresh_workers', 2)))
+        self.negative_ttl = float(conf.get('dns_negative_ttl', 30))
+        self.negative_jitter = float(conf.get('dns_negative_jitter', 0.1))
+        self.shared_store = None
+        if conf.get('dns_shared_store'):
+            self.shared_store = shared.SharedVerdictStore(
+                conf.get('dns_shared_store'),
+                slots=int(conf.get('dns_shared_slots', 4096)))
+        self.snapshot_path = conf.get('dns_snapshot')
+        self.snapshot_writer = None
+        if self.snapshot_path:
+            self.load_snapshot()
+            self.snapshot_writer = periodic.PeriodicTask(
+                self.write_snapshot,
+                float(conf.get('dns_snapshot_interval', 60)))
+            atexit.register(self.write_snapshot)
+
+    def _start_tasks(self):
+        """Starts the background tasks in the process serving requests."""
+        if self.allowed_hosts_refresher is not None:
+            self.allowed_hosts_refresher.start()
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.start()
 
     def _create_resolver(self):
-        """Creates the DNS resolver."""
-        nameserver = str(dns.resolver.Resolver().nameservers[0])
-        nameserver = self.conf.get('nameserver', nameserver)
-        res = dns.resolver.Resolver(configure=False)
-        res.nameservers = [nameserver]
+        """Returns the DNS resolver of this thread, creating it once."""
+        res = getattr(self._local, 'resolver', None)
+        if res is None:
+            res = self._local.resolver = self._build_resolver()
         return res
 
+    def _build_resolver(self):
+        if self.nameservers is None:
+            system = dns.resolver.Resolver()
+            self.nameservers = [str(system.nameservers[0])]
+        if self.resolution == 'race':
+            racers = [self._new_resolver([nameserver])
+                      for nameserver in self.nameservers]
+            return resolvers.RacingResolver(racers)
+        return self._new_resolver(self.nameservers)
+
+    def _new_resolver(self, nameservers):
+        if self.tcp_pool is not None:
+            res = tcp.TCPResolver(nameservers, self.tcp_pool)
+        else:
+            res = dns.resolver.Resolver(configure=False)
+            res.nameservers = nameservers
+        res.port = self.port
+        if self.timeout is not None:
+            res.lifetime = self.timeout
+        return res
+
+    def _query(self, res, name, rdtype, deadline=None, calls=None):
+        """Queries the resolver unless the answer is cached.
+
+        With a deadline the query is given what is left of the time budget.
+        Queries that reach the resolver are noted in calls.
+        """
+        key = (str(name), rdtype)
+        answer = self.record_cache.get(key)
+        if answer is None:
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise dns.exception.Timeout()
+                res.lifetime = remaining
+            if calls is not None:
+                calls.append(key)
+            answer = res.query(name, rdtype)
+            self.record_cache.set(key, answer, _answer_ttl(answer))
+        return answer
+
     def _create_whitelist(self, whitelist):
         """Creates the whitelist from configuration or testing whitelists."""
         result = None
@@ -56,6 +214,13 @@ class DNSWhitelist(wafflehaus.base.WafflehausBase):
             result = whitelist.split(" ")
         return result
 
+    def _create_cidrs(self, cidrs):
+        """Compiles a space delimited list of networks."""
+        result = cidr.CIDRSet((cidrs or '').split())
+        for invalid in result.invalid:
+            self.log.error("Ignoring invalid CIDR: %s" % invalid)
+        return result
+
     def check_reverse_dns(self, ip_address, a_record_rrset):
         """Checks to ensure IP is within a set of IPs from an A query set."""
         match = any(ip_address == str(val) for val in a_record_rrset)
@@ -63,13 +228,154 @@ class DNSWhitelist(wafflehaus.base.WafflehausBase):
 
     def check_domain_to_whitelist(self, domain):
         self.log.info("Checking " + str(domain))
-        if domain.endswith('.'):
-            domain = domain[:-1]
-        for ok_host in self.whitelist:
-            if domain.endswith(ok_host):
+        return domain in self.whitelist_trie
+
+    def check_address(self, remote_addr):
+        """Returns if the address is allowed and for how long that holds."""
+        try:
+            return self._resolve_address(remote_addr)
+        except dns.exception.DNSException:
+            return False, self._negative_ttl()
+
+    def _resolve_address(self, remote_addr):
+        """Like check_address but raises when DNS did not give an answer.
+
+        A name that does not exist or has no records is an answer, and
+        denies the address.
+        """
+        start = time.time()
+        calls = []
+        try:
+            allowed, ttl = self._lookup_address(remote_addr, start, calls)
+        except dns.exception.DNSException as e:
+            answered = isinstance(e, _ANSWERED)
+            self._record(start, calls, not answered)
+            msg = "Missing DNS entries?"
+            self.log.error("DNS Error during query: " + msg)
+            if not answered:
+                raise
+            return False, self._negative_ttl()
+        except Exception:
+            self._record(start, calls, True)
+            raise
+        self._record(start, calls, False)
+        return allowed, ttl
+
+    def _record(self, start, calls, failed):
+        """Tells the breaker how the lookup went if it reached DNS."""
+        if self.breaker is None:
+            return
+        if not calls:
+            # Answered from the record cache, DNS was not called
+            self.breaker.cancel()
+            return
+        self.breaker.record(time.time() - start, failed)
+
+    def _lookup_address(self, remote_addr, start, calls=None):
+        """Checks the address against DNS within the time budget."""
+        res = self._create_resolver()
+        deadline = None
+        if self.timeout is not None:
+            deadline = start + self.timeout
+
+        name = dns.reversename.from_address(remote_addr)
+        ptr_answer = self._query(res, name, "PTR", deadline, calls)
+        ptr = ptr_answer[0]
+
+        if not self.check_domain_to_whitelist(str(name)):
+            self.log.warning("DNS whitelist matching failure")
+            return False, _answer_ttl(ptr_answer)
+
+        a_record = self._query(res, str(ptr), "A", deadline, calls)
+        ttl = min(_answer_ttl(ptr_answer), _answer_ttl(a_record))
+        if not self.check_reverse_dns(remote_addr, a_record.rrset):
+            self.log.warning("Reverse DNS check failed")
+            return False, ttl
+        return True, ttl
+
+    def _whitelist_tag(self):
+        """Identifies the whitelist that verdicts are made for."""
+        tag = zlib.crc32(' '.join(self.whitelist or [])) & 0xffffffff
+        return '%08x' % tag
+
+    def _shared_key(self, remote_addr):
+        """Tags the address with the whitelist the verdict was made for."""
+        return '%s %s' % (remote_addr, self._whitelist_tag())
+
+    def load_snapshot(self):
+        """Warms the caches with the unexpired entries of the snapshot."""
+        tag, verdicts, records = snapshot.load(self.snapshot_path)
+        for key, answer, expires in records:
+            self.record_cache.restore(key, answer, expires)
+        if tag != self._whitelist_tag():
+            return
+        for remote_addr, allowed, expires in verdicts:
+            self.verdict_cache.restore(remote_addr, allowed, expires)
+        self.log.info("Loaded %d DNS verdicts from %s" %
+                      (len(self.verdict_cache), self.snapshot_path))
+
+    def write_snapshot(self):
+        try:
+            snapshot.dump(self.snapshot_path, self._whitelist_tag(),
+                          self.verdict_cache.items(),
+                          self.record_cache.items())
+        except (IOError, OSError) as e:
+            self.log.error("Could not write DNS snapshot: %s" % e)
+
+    def get_verdict(self, remote_addr):
+        """Returns the remembered verdict for the address or None."""
+        allowed = self.verdict_cache.get(remote_addr)
+        if allowed is None and self.shared_store is not None:
+            found = self.shared_store.get(self._shared_key(remote_addr))
+            if found is not None:
+                allowed, ttl = found
+                self.verdict_cache.set(remote_addr, allowed, ttl)
+        return allowed
+
+    def set_verdict(self, remote_addr, allowed, ttl):
+        self.verdict_cache.set(remote_addr, allowed, ttl)
+        if self.shared_store is not None:
+            self.shared_store.set(self._shared_key(remote_addr), allowed,
+                                  self.verdict_cache.clamp(ttl))
+
+    def refresh_verdict(self, remote_addr):
+        """Resolves the address again in the background, once at a time."""
+        with self._refreshing_lock:
+            if remote_addr in self._refreshing:
+                if self.breaker is not None:
+                    self.breaker.cancel()
+                return
+            self._refreshing.add(remote_addr)
+        self.refresh_pool.spawn_n(self._refresh, remote_addr)
+
+    def _refresh(self, remote_addr):
+        try:
+            allowed, ttl = self._resolve_address(remote_addr)
+            self.set_verdict(remote_addr, allowed, ttl)
+        except dns.exception.DNSException as e:
+            # The stale verdict is kept until its grace runs out
+            self.log.warning("Could not refresh DNS verdict for %s: %s" %
+                             (remote_addr, e))
+        except Exception as e:
+            self.log.error("Failed to refresh DNS verdict: %s" % e)
+        finally:
+            with self._refreshing_lock:
+                self._refreshing.discard(remote_addr)
+
+    def _breaker_verdict(self, remote_addr):
+        """Decides on an address while DNS is not being asked."""
+        if self.breaker_policy == 'cached':
+            if self.verdict_cache.get_stale(remote_addr):
+                self.log.warning("DNS circuit open, using the expired "
+                                 "verdict for %s" % remote_addr)
                 return True
+        self.log.warning("DNS circuit open, refusing %s" % remote_addr)
         return False
 
+    def _negative_ttl(self):
+        jitter = self.negative_ttl * self.negative_jitter
+        return self.negative_ttl + random.uniform(-jitter, jitter)
+
     def get_remote_addr(self, request):
         return request.remote_addr
 
@@ -77,7 +383,11 @@ class DNSWhitelist(wafflehaus.base.WafflehausBase):
         super(DNSWhitelist, self)._override(req)
         new_whitelist = self._reconf(req, 'str', 'whitelist', None)
         if new_whitelist is not None:
-            self.whitelist = self._create_whitelist(new_whitelist)
+            new_whitelist = self._create_whitelist(new_whitelist)
+            if new_whitelist != self.whitelist:
+                self.verdict_cache.clear()
+                self.whitelist_trie = domains.DomainTrie(new_whitelist)
+            self.whitelist = new_whitelist
         self.ignore_forwarded = self._reconf(req, 'bool', 'ignore_forwarded',
                                              self.ignore_forwarded)
 
@@ -94,8 +404,9 @@ class DNSWhitelist(wafflehaus.base.WafflehausBase):
         super(DNSWhitelist, self).__call__(req)
         if not self.enabled:
             return self.app
+        self._start_tasks()
 
-        if not self.whitelist:
+        if not self.whitelist and self.allowed_hosts is None:
             self.log.error("Whitelist not set")
             return webob.exc.HTTPInternalServerError()
 
@@ -110,34 +421,41 @@ class DNSWhitelist(wafflehaus.base.WafflehausBase):
         if self.testing:
             remote_addr = self.conf.get('testing_remote_addr', remote_addr)
 
-        res = self._create_resolver()
-
-        try:
-            name = dns.reversename.from_address(remote_addr)
-            ptr = res.query(name, "PTR")[0]
+        if remote_addr in self.denied_cidrs:
+            self.log.warning("Remote address is in a denied CIDR")
+            if not self.testing:
+                return webob.exc.HTTPForbidden()
+            return self.app
+        if remote_addr in self.trusted_cidrs:
+            return self.app
 
-            if not self.check_domain_to_whitelist(str(name)):
-                self.log.warning("DNS whitelist matching failure")
+        if self.allowed_hosts is not None:
+            hostname = self.allowed_hosts.get(remote_addr)
+            if hostname is not None:
+                self.log.debug("%s is allowed as %s" % (remote_addr,
+                                                        hostname))
+                return self.app
+            if not self.whitelist:
+                self.log.warning("%s is not an allowed host" % remote_addr)
                 if not self.testing:
                     return webob.exc.HTTPForbidden()
-                else:
-                    return self.app
-
-            a_record = res.query(str(ptr), "A")
-        except dns.exception.DNSException:
-            msg = "Missing DNS entries?"
-            self.log.error("DNS Error during query: " + msg)
-            if not self.testing:
-                return webob.exc.HTTPForbidden()
-            else:
                 return self.app
 
-        if not self.check_reverse_dns(remote_addr, a_record.rrset):
-            if self.testing:
-                self.log.warning("Reverse DNS check failed")
-            else:
-                self.log.warning("Reverse DNS check failed")
-                return webob.exc.HTTPForbidden()
+        allowed = self.get_verdict(remote_addr)
+        if allowed is None and self.breaker is not None:
+            if not self.breaker.allow():
+                allowed = self._breaker_verdict(remote_addr)
+        if allowed is None and self.refresh_pool is not None:
+            if self.verdict_cache.get_stale(remote_addr,
+                                            grace=self.stale_grace):
+                self.refresh_verdict(remote_addr)
+                allowed = True
+        if allowed is None:
+            allowed, ttl = self.check_address(remote_addr)
+            self.set_verdict(remote_addr, allowed, ttl)
+
+        if not allowed and not self.testing:
+            return webob.exc.HTTPForbidden()
         return self.app
 
 
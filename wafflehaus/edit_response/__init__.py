@@ -13,12 +13,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import json
-from simplejson import JSONDecodeError
+import collections
+import logging
 
 from webob.dec import wsgify
 
 from wafflehaus.base import WafflehausBase
+from wafflehaus import body
+from wafflehaus import codec
+from wafflehaus.edit_response import predicates
+from wafflehaus.edit_response import stream
 import wafflehaus.resource_filter as rf
 
 
@@ -27,7 +31,14 @@ class EditResponse(WafflehausBase):
         super(EditResponse, self).__init__(app, conf)
         self.log.name = conf.get('log_name', __name__)
         self.log.info('Starting wafflehaus edit_response middleware')
-        self.resources = {}
+        self.resources = collections.OrderedDict()
+        self.streaming = conf.get('streaming') in self.truths
+        self.stream_chunk_size = int(conf.get('stream_chunk_size', 65536))
+        self.json_content_types = body.parse_content_types(
+            conf.get('json_content_types'))
+        self.max_body_size = int(conf.get('max_body_size', 0))
+        self.codec = codec.get(conf.get('json_backend'))
+        resource_matcher = conf.get('resource_matcher')
         filters = conf.get('filters')
         if filters is None:
             self.log.warning("EditResponse waffle could not find any filters"
@@ -37,11 +48,27 @@ class EditResponse(WafflehausBase):
             if resource_filter in self.resources.keys():
                 self.log.warning("EditResponse waffle found two filter names "
                                  "with the same name (first now overridden")
+            key = conf.get("%s_key" % resource_filter)
+            value = conf.get("%s_value" % resource_filter)
             self.resources[resource_filter] = {
                 "resource": rf.parse_resources(
-                    conf.get("%s_resource" % resource_filter)),
-                "key": conf.get("%s_key" % resource_filter),
-                "value": conf.get("%s_value" % resource_filter)}
+                    conf.get("%s_resource" % resource_filter),
+                    resource_matcher),
+                "key": key,
+                "value": value}
+            if value is None:
+                continue
+            if key is None:
+                raise ValueError("EditResponse filter '%s' has a value but "
+                                 "no %s_key" % (resource_filter,
+                                                resource_filter))
+            if 'http_status_code' in key and value.startswith('replace_if'):
+                (status_chk, status_repl) = value.split(':')[1:3]
+                self.resources[resource_filter]["status"] = (
+                    status_chk, int(status_repl))
+            elif value.startswith('foreach:'):
+                self.resources[resource_filter]["foreach"] = (
+                    predicates.compile_foreach(value))
         return
 
     def _replace_lookup(self, replace_str):
@@ -53,96 +80,274 @@ class EditResponse(WafflehausBase):
             return {}
         return replace_str
 
-    def _foreach(self, conditional, data):
+    def _foreach(self, foreach, data):
         if not isinstance(data, list):
             return data
         if not all(isinstance(item, dict) for item in data):
             return data
-        new_data = []
-        splits = conditional.split(":", 2)
-        action = splits[1]
-        conditionals = splits[2].split(',')
-        for item in data:
-            do_action = False
-            for cond in conditionals:
-                # TODO(jlh): Probably should support more than '='
-                (target, value) = cond.split("=")
-                if target not in item:
-                    continue
-                if item.get(target) == value:
-                    do_action = True
-            if do_action:
-                if action == 'keep_if':
-                    new_data.append(item)
-            if not do_action:
-                if action == 'drop_if':
-                    new_data.append(item)
-        self.log.debug('Replacing "{0}" with :"{1}"'.format(data, new_data))
+        new_data = foreach.filter(data)
+        self.log.debug('Replacing "%s" with :"%s"', data, new_data)
         return new_data
 
-    def _change_attribs(self, req, resp, resource):
-        # Not sure recursion is the way here...
-        def walk_keys(data):
-            if isinstance(data, dict):
-                for key, value in data.items():
-                    if key == resource['key']:
-                        val = resource.get('value', None)
-                        if val is None:
-                            del(data[key])
-                            self.log.debug('Deleting "{0}":"{1}" from the '
-                                           'response'.format(key, value))
-                        elif val.startswith('foreach:'):
-                            data[key] = self._foreach(val, data[key])
-                        else:
-                            replace = self._replace_lookup(resource['value'])
-                            self.log.debug('Replacing "{0}":"{1}" with "{0}"'
-                                           ':"{2}"'.format(key, value,
-                                                           resource['value']))
-                            data[key] = replace
-                    else:
-                        if isinstance(value, dict) or isinstance(value, list):
-                            data[key] = walk_keys(value)
-            elif isinstance(data, list):
-                data = [walk_keys(part) for part in data]
-            return data
+    def _actions(self, plan):
+        """Returns a table of the edits of the plan for each key.
+
+        The edits for a key are (kind, value) in the order of the plan.
+        """
+        actions = {}
+        for resource in plan:
+            val = resource.get('value', None)
+            if val is None:
+                action = ('delete', None)
+            elif 'foreach' in resource:
+                action = ('foreach', resource['foreach'])
+            else:
+                action = ('replace', val)
+            actions.setdefault(resource['key'], []).append(action)
+        return actions
+
+    def _edit_key(self, data, key, edits, debug):
+        for kind, val in edits:
+            if kind == 'delete':
+                if debug:
+                    self.log.debug('Deleting "%s":"%s" from the response',
+                                   key, data[key])
+                del(data[key])
+                return
+            elif kind == 'foreach':
+                data[key] = self._foreach(val, data[key])
+            else:
+                if debug:
+                    self.log.debug('Replacing "%s":"%s" with "%s":"%s"',
+                                   key, data[key], key, val)
+                data[key] = self._replace_lookup(val)
+
+    def _edit_body(self, data, actions):
+        """Makes every edit of the table in a single pass over data.
+
+        The body is walked with a stack rather than recursion, so deeply
+        nested bodies are safe, and it is changed in place. The edits for a
+        key run in the order they are configured, and the walk goes on into
+        the edited value.
+        """
+        # Formatting the debug messages costs more than the edits on large
+        # bodies, so it is only done when they will be logged
+        debug = self.log.isEnabledFor(logging.DEBUG)
+        keys = list(actions)
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                for key in keys:
+                    if key in node:
+                        self._edit_key(node, key, actions[key], debug)
+                children = node.itervalues()
+            elif isinstance(node, list):
+                children = node
+            else:
+                continue
+            for child in children:
+                if isinstance(child, (dict, list)):
+                    stack.append(child)
+        return data
+
+    def _edit_status(self, resp, resource):
+        (status_chk, status_repl) = resource['status']
+        if str(resp.status_code) == status_chk:
+            self.log.debug('Replacing http status code "{0}" with '
+                           '"{1}"'.format(status_chk, status_repl))
+            resp.status_code = status_repl
 
+    def _plan(self, req):
+        """Returns the filters matching the request in configured order."""
+        return [resource for resource in self.resources.values()
+                if rf.matched_request(req, resource["resource"])]
+
+    def _split_plan(self, plan):
+        """Returns the status rewrites and the body edits of the plan."""
+        status_plan = []
+        body_plan = []
+        for resource in plan:
+            if 'status' in resource:
+                status_plan.append(resource)
+            else:
+                body_plan.append(resource)
+        return status_plan, body_plan
+
+    def _apply_plan(self, resp, plan):
+        """Applies every filter of the plan with one parse and one dump.
+
+        A body that can not be decoded or encoded again, such as one nested
+        deeper than the codec can recurse, is passed on unchanged.
+        """
         try:
-            new_body = resp.json
-            new_body = walk_keys(new_body)
-            if 'http_status_code' in resource['key']:
-                resource_val = resource['value']
-                if resource_val.startswith('replace_if'):
-                    (status_chk, status_repl) = resource_val.split(':')[1:3]
-                    if str(resp.status_code) == status_chk:
-                        self.log.debug('Replacing http status code "{0}" with '
-                                       '"{1}"'.format(status_chk, status_repl))
-                        resp.status_code = int(status_repl)
-            resp.body = json.dumps(new_body)
-        except JSONDecodeError:
-            pass
+            new_body = self.codec.loads(resp.body)
+        except (ValueError, RuntimeError) as e:
+            self.log.warning("Not editing a response body that could not "
+                             "be decoded: %s" % e)
+            return resp
+        new_body = self._edit_body(new_body, self._actions(plan))
+        try:
+            resp.body = self.codec.dumps(new_body)
+        except (ValueError, RuntimeError) as e:
+            self.log.warning("Not editing a response body that could not "
+                             "be encoded: %s" % e)
+        return resp
 
+    def _stream_plan(self, resp, plan):
+        """Applies the plan while the body is passed on chunk by chunk."""
+        app_iter = resp.app_iter
+        reader = stream.JSONReader(app_iter,
+                                   held_limit=self.stream_chunk_size)
+        if reader.first() not in ('{', '['):
+            resp.app_iter = body.ClosingIter(reader.rest(), app_iter)
+            return resp
+        resp.app_iter = body.ClosingIter(
+            self._edit_stream(reader, self._actions(plan)), app_iter)
+        resp.content_length = None
         return resp
 
+    def _edit_stream(self, reader, actions):
+        """Yields the edited body in chunks of about stream_chunk_size.
+
+        When the body turns out to be malformed, what was read since the
+        last chunk was yielded is passed on as it is instead of its edits,
+        followed by the rest of the body. A malformed body smaller than a
+        chunk is passed on unchanged. At most about a chunk of the body is
+        held for this: past that the edits made so far are passed on
+        followed by the body from where it turned out to be malformed.
+        """
+        out = []
+        size = 0
+        malformed = False
+        try:
+            for piece in self._edit_pieces(reader, actions):
+                out.append(piece)
+                size += len(piece)
+                if size >= self.stream_chunk_size:
+                    yield ''.join(out)
+                    reader.mark()
+                    out = []
+                    size = 0
+        except (ValueError, RuntimeError) as e:
+            self.log.warning("Passing on the rest of a malformed response "
+                             "body: %s" % e)
+            malformed = True
+        if malformed and reader.held is not None:
+            # The text the edits were made from is passed on instead
+            out = []
+        if out:
+            yield ''.join(out)
+        if malformed:
+            for chunk in reader.rest():
+                yield chunk
+
+    def _edit_pieces(self, reader, actions):
+        """Yields the pieces of the edited body as the body is read.
+
+        Members that are not edited are copied token by token, so only one
+        token is held at once. An edited member is read whole and edited as
+        in the default mode.
+        """
+        # One [closer, members read, members written] for each open object
+        # or list
+        frames = []
+        expect_value = True
+        while True:
+            if expect_value:
+                expect_value = False
+                c = reader.peek()
+                if c == '{' or c == '[':
+                    yield reader.take(c)
+                    frames.append(['}' if c == '{' else ']', 0, 0])
+                else:
+                    yield reader.value(collect=True)
+                continue
+            if not frames:
+                break
+            frame = frames[-1]
+            if reader.peek() == frame[0]:
+                yield reader.take(frame[0])
+                frames.pop()
+                continue
+            if frame[1]:
+                reader.take(',')
+            frame[1] += 1
+            sep = ',' if frame[2] else ''
+            if frame[0] == ']':
+                yield sep
+                frame[2] += 1
+                expect_value = True
+                continue
+            raw_key = reader.string()
+            reader.take(':')
+            key = self.codec.loads(raw_key)
+            if key not in actions:
+                yield sep + raw_key + ':'
+                frame[2] += 1
+                expect_value = True
+                continue
+            written = False
+            for piece in self._edit_member(reader, key, actions,
+                                           sep + raw_key + ':'):
+                written = True
+                yield piece
+            if written:
+                frame[2] += 1
+        if reader.peek() != '':
+            raise ValueError("Unexpected data after the body")
+
+    def _edit_member(self, reader, key, actions, prefix):
+        """Yields the edited member of an object, or nothing if deleted."""
+        edits = actions[key]
+        kind = edits[0][0]
+        if kind == 'delete':
+            reader.value()
+            return
+        if kind == 'replace':
+            reader.value()
+            data = {key: None}
+        else:
+            data = {key: self.codec.loads(reader.value(collect=True))}
+        self._edit_key(data, key, edits,
+                       self.log.isEnabledFor(logging.DEBUG))
+        if key in data:
+            edited = self._edit_body(data[key], actions)
+            yield prefix + self.codec.dumps(edited)
+
+    def _passes_through(self, req, resp):
+        """Returns if the response is passed on without reading it."""
+        max_size = 0 if self.streaming else self.max_body_size
+        reason = body.pass_reason(resp, self.json_content_types, max_size,
+                                  req.method)
+        if reason is None and not body.read_limited(resp, max_size):
+            reason = 'body larger than %d' % max_size
+        if reason is not None:
+            self.log.debug('Not editing the response, %s', reason)
+            return True
+        return False
+
     @wsgify
     def __call__(self, req):
         """Returns a response if processed or an app if skipped."""
         super(EditResponse, self).__call__(req)
-        resp = None
 
         if not self.enabled:
             return self.app
-        if hasattr(self, "resources"):
-            for resource_filter in self.resources.keys():
-                if rf.matched_request(
-                        req, self.resources[resource_filter]["resource"]):
-                    if resp is None:
-                        resp = req.get_response(self.app)
-                    resp = self._change_attribs(
-                        req, resp, self.resources[resource_filter])
-        if resp is None:
+        plan = self._plan(req)
+        if not plan:
             return self.app
-        else:
+        status_plan, body_plan = self._split_plan(plan)
+        resp = req.get_response(self.app)
+        # Status rewrites only need the headers, so the body is not read
+        # unless some filter edits it
+        for resource in status_plan:
+            self._edit_status(resp, resource)
+        if not body_plan or self._passes_through(req, resp):
             return resp
+        if self.streaming:
+            return self._stream_plan(resp, body_plan)
+        return self._apply_plan(resp, body_plan)
 
 
 def filter_factory(global_conf, **local_conf):
@@ -0,0 +1,170 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import collections
+import operator
+import re
+
+__all__ = ['Foreach', 'compile_foreach']
+
+# The operators are tried in this order, so the longer ones come first
+_CONDITION = re.compile(r'^(?P<target>.+?)\s*'
+                        r'(?P<op>!=|\^=|<=|>=|=|<|>|\s+in\s+)\s*'
+                        r'(?P<value>.*)$')
+
+_NUMERIC = {'<': operator.lt, '<=': operator.le,
+            '>': operator.gt, '>=': operator.ge}
+
+_MISSING = object()
+
+
+def _number(value):
+    """Returns value as a float, or None if it is not a number."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, long, float)):
+        return float(value)
+    if isinstance(value, basestring):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+class Condition(object):
+    """A test of one key of an item against a value.
+
+    An item without the key never matches.
+    """
+
+    def __init__(self, target, op, value):
+        self.target = target
+        self.op = op
+        self.value = value
+        self.compare = _NUMERIC.get(op)
+        # Pick the test once so matching an item does not dispatch on op
+        self.test = {'=': self._equal, '!=': self._not_equal,
+                     '^=': self._prefix, 'in': self._in}.get(op,
+                                                             self._numeric)
+
+    def __call__(self, item):
+        return self.test(item)
+
+    def _equal(self, item):
+        found = item.get(self.target, _MISSING)
+        return found is not _MISSING and found == self.value
+
+    def _not_equal(self, item):
+        found = item.get(self.target, _MISSING)
+        return found is not _MISSING and found != self.value
+
+    def _prefix(self, item):
+        found = item.get(self.target)
+        if not isinstance(found, basestring):
+            return False
+        return found.startswith(self.value)
+
+    def _in(self, item):
+        found = item.get(self.target, _MISSING)
+        if found is _MISSING:
+            return False
+        try:
+            return found in self.value
+        except TypeError:
+            return False
+
+    def _numeric(self, item):
+        number = _number(item.get(self.target))
+        return number is not None and self.compare(number, self.value)
+
+    def __repr__(self):
+        return 'Condition(%r, %r, %r)' % (self.target, self.op, self.value)
+
+
+class Foreach(object):
+    """A compiled foreach:<action>:<conditions> expression.
+
+    An item matches when any of the conditions does. Equality and `in`
+    conditions on the same key are merged into one set lookup, and the
+    conditions are tried in order, stopping at the first match.
+    """
+
+    def __init__(self, action, conditions):
+        self.action = action
+        self.conditions = conditions
+        self.tests = [condition.test for condition in conditions]
+
+    def matches(self, item):
+        for test in self.tests:
+            if test(item):
+                return True
+        return False
+
+    def keep(self, item):
+        matched = self.matches(item)
+        if matched:
+            return self.action == 'keep_if'
+        return self.action == 'drop_if'
+
+    def filter(self, data):
+        """Returns the items of data that are kept."""
+        keep = self.keep
+        return [item for item in data if keep(item)]
+
+
+def compile_condition(text):
+    match = _CONDITION.match(text)
+    if match is None:
+        raise ValueError("Could not parse foreach condition '%s'" % text)
+    target, op, value = match.group('target', 'op', 'value')
+    op = op.strip()
+    if op == 'in':
+        value = frozenset(value.split('|'))
+    elif op in _NUMERIC:
+        number = _number(value)
+        if number is None:
+            raise ValueError("'%s' does not compare with a number" % text)
+        value = number
+    return Condition(target, op, value)
+
+
+def compile_foreach(expression):
+    """Returns a Foreach for a foreach:<action>:<conditions> expression."""
+    splits = expression.split(':', 2)
+    if len(splits) != 3:
+        raise ValueError("Could not parse foreach expression '%s'"
+                         % expression)
+    conditions = [compile_condition(cond) for cond in splits[2].split(',')]
+    # Index the equality conditions by key so several values of one key
+    # cost a single lookup
+    values = collections.OrderedDict()
+    for condition in conditions:
+        if condition.op == '=':
+            values.setdefault(condition.target, set()).add(condition.value)
+        elif condition.op == 'in':
+            values.setdefault(condition.target, set()).update(
+                condition.value)
+    compiled = []
+    for condition in conditions:
+        if condition.op not in ('=', 'in'):
+            compiled.append(condition)
+        elif condition.target in values:
+            target = condition.target
+            found = values.pop(target)
+            if len(found) == 1 and condition.op == '=':
+                compiled.append(condition)
+            else:
+                compiled.append(Condition(target, 'in', frozenset(found)))
+    return Foreach(splits[1], compiled)
@@ -0,0 +1,188 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Reads JSON tokens from a body that arrives in chunks."""
+import re
+
+__all__ = ['JSONReader']
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# What follows the opening quote of a string up to its closing quote, or to
+# the end of the text read so far
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+_SCALAR = re.compile(r'-?[0-9][0-9.eE+-]*|true|false|null')
+# The longest of true, false and null
+_LONGEST_WORD = len('false')
+
+
+class JSONReader(object):
+    """Tokenizes JSON from an iterable of chunks, reading them as needed.
+
+    Only the unread part of the current chunk, the token being read and the
+    text read since the last mark are held, the latter only up to about
+    held_limit characters when it is set. Tokens are returned as their JSON
+    text; malformed JSON raises ValueError.
+    """
+
+    def __init__(self, chunks, held_limit=None):
+        self.chunks = iter(chunks)
+        self.held_limit = float('inf') if held_limit is None else held_limit
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        # The text read since the last mark, that is no longer in buf, or
+        # None once more than held_limit was read
+        self.held = []
+        self.held_size = 0
+        self.marked = 0
+
+    def _fill(self):
+        """Reads another chunk, returns False at the end of the body."""
+        for chunk in self.chunks:
+            if chunk:
+                if self.held is not None and self.marked < self.pos:
+                    self.held.append(self.buf[self.marked:self.pos])
+                    self.held_size += self.pos - self.marked
+                    if self.held_size > self.held_limit:
+                        self.held = None
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+                self.marked = 0
+                return True
+        self.eof = True
+        return False
+
+    def first(self):
+        """Returns the first character that is not whitespace, reading none.
+
+        Returns an empty string for a body that is empty or all whitespace.
+        The whitespace is skipped, but is still passed on by rest.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def peek(self):
+        """Skips whitespace and returns the next character."""
+        return self.first()
+
+    def take(self, expected):
+        if self.peek() != expected:
+            raise ValueError("Expected %s at %r" % (
+                expected, self.buf[self.pos:self.pos + 20]))
+        self.pos += 1
+        return expected
+
+    def string(self, collect=True):
+        """Reads a string, scanning each character of it once.
+
+        Returns its text unless collect is unset.
+        """
+        if self.peek() != '"':
+            raise ValueError("Expected a string")
+        pieces = []
+        start = self.pos
+        end = start + 1
+        while True:
+            end = _STRING_BODY.match(self.buf, end).end()
+            if end < len(self.buf) and self.buf[end] == '"':
+                self.pos = end + 1
+                if not collect:
+                    return None
+                pieces.append(self.buf[start:end + 1])
+                return ''.join(pieces)
+            # The chunk ends in the string, maybe in the middle of an
+            # escape which is then left to be read with the next chunk
+            if collect:
+                pieces.append(self.buf[start:end])
+            self.pos = end
+            if not self._fill():
+                raise ValueError("Unterminated string")
+            start = end = 0
+
+    def scalar(self):
+        """Reads a number, true, false or null."""
+        self.peek()
+        while True:
+            match = _SCALAR.match(self.buf, self.pos)
+            if match is not None:
+                if match.end() < len(self.buf) or self.eof:
+                    self.pos = match.end()
+                    return match.group()
+            elif self.eof or len(self.buf) - self.pos >= _LONGEST_WORD:
+                raise ValueError("Unexpected %r" %
+                                 self.buf[self.pos:self.pos + 20])
+            self._fill()
+
+    def value(self, collect=False):
+        """Reads a whole value, returning its text if collect is set."""
+        pieces = []
+        closers = []
+        while True:
+            c = self.peek()
+            if c == '':
+                raise ValueError("Unexpected end of body")
+            elif c in '{[':
+                self.pos += 1
+                piece = c
+                closers.append('}' if c == '{' else ']')
+            elif c in '}]':
+                if not closers or closers.pop() != c:
+                    raise ValueError("Unexpected %s" % c)
+                self.pos += 1
+                piece = c
+            elif c in ',:':
+                if not closers:
+                    raise ValueError("Unexpected %s" % c)
+                self.pos += 1
+                piece = c
+            elif c == '"':
+                piece = self.string(collect)
+            else:
+                piece = self.scalar()
+            if collect:
+                pieces.append(piece)
+            if not closers:
+                return ''.join(pieces) if collect else None
+
+    def mark(self):
+        """Forgets the text read so far, rest starts from here."""
+        self.held = []
+        self.held_size = 0
+        self.marked = self.pos
+
+    def rest(self):
+        """Yields the body from the last mark on as it is.
+
+        When the text read since the mark was more than held_limit, the body
+        is yielded from where the reading stopped instead.
+        """
+        if self.held is None:
+            held, start = [], self.pos
+        else:
+            held, start = self.held, self.marked
+        self.held = []
+        self.held_size = 0
+        if start < len(self.buf):
+            held.append(self.buf[start:])
+        self.buf = ''
+        self.pos = 0
+        self.marked = 0
+        if held:
+            yield ''.join(held)
+        for chunk in self.chunks:
+            yield chunk
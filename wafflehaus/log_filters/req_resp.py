@@ -20,6 +20,7 @@ import webob.dec
 import webob.exc
 
 import wafflehaus.base
+from wafflehaus.log_filters import writer
 
 
 FAKE_REQ_ID = 'req-XXXXXXXX-XXXX-XXXX-XXXX-XXXXXXXXXXXX'
@@ -50,16 +51,55 @@ class RequestResponseLogger(wafflehaus.base.WafflehausBase):
         default_format = '%(message)s' + self.separator + '%(asctime)s'
         log_format = default_format
         log_file = conf.get('log_file')
+        self.async_log = conf.get('async_log') in self.truths
+        self.writer = None
+        self.dwriter = None
 
-        if log_file is not None:
-            self.log = self._get_new_log(self.log.name, log_file, log_format)
-            self.log.info('Starting wafflehaus request/response logger')
-            if self.do_detail_logs:
-                dlog_file = "%s.detail.log" % log_file.replace('.log', '')
-                name = "%s.details"
-                self.dlog = self._get_new_log(name, dlog_file, '%(message)s')
-        else:
+        if log_file is None:
             self.enabled = False
+            return
+        dlog_file = "%s.detail.log" % log_file.replace('.log', '')
+        if self.async_log:
+            # The records are formatted on the request thread and written
+            # by the writers, so requests never wait on the file
+            self.formatter = logging.Formatter(log_format)
+            options = {
+                'queue_size': int(conf.get('log_queue_size', 10000)),
+                'overflow': conf.get('log_overflow', writer.DROP),
+                'batch_size': int(conf.get('log_batch_size', 256)),
+                'log': self.log}
+            self.writer = writer.AsyncWriter(log_file, **options)
+            self._write_line('Starting wafflehaus request/response logger')
+            if self.do_detail_logs:
+                self.dwriter = writer.AsyncWriter(dlog_file, **options)
+            return
+        self.log = self._get_new_log(self.log.name, log_file, log_format)
+        self.log.info('Starting wafflehaus request/response logger')
+        if self.do_detail_logs:
+            name = "%s.details"
+            self.dlog = self._get_new_log(name, dlog_file, '%(message)s')
+
+    def _write_line(self, line):
+        if self.writer is None:
+            self.log.info(line)
+            return
+        record = logging.LogRecord(self.log.name, logging.INFO, __file__, 0,
+                                   line, None, None)
+        self.writer.write(self.formatter.format(record) + '\n')
+
+    def _write_detail(self, lines):
+        if self.dwriter is None:
+            for line in lines:
+                self.dlog.info(line)
+            return
+        lines.append('')
+        self.dwriter.write('\n'.join(lines))
+
+    def close(self):
+        """Writes out the queued records of the async writers."""
+        for log_writer in (self.writer, self.dwriter):
+            if log_writer is not None:
+                log_writer.close()
 
     def _log_simple_request(self, req, resp, delta, log_time):
         contents = []
@@ -91,7 +131,7 @@ class RequestResponseLogger(wafflehaus.base.WafflehausBase):
         string_contents = [str(c) for c in contents]
 
         log_str = self.separator.join(string_contents)
-        self.log.info(log_str)
+        self._write_line(log_str)
         if resp.status_int >= self.detail_level and self.do_detail_logs:
             self._log_detail_request(id, req, resp, delta, log_time)
 
@@ -105,28 +145,30 @@ class RequestResponseLogger(wafflehaus.base.WafflehausBase):
         qs = ""
         if len(req.query_string) > 0:
             qs = "?%s" % req.query_string
-        self.dlog.info("%s | ---" % id)
-        self.dlog.info("%s | REQTIME: %s" % (id, log_time))
-        self.dlog.info("%s | REQDIFF: %f seconds" % (id, delta))
-        self.dlog.info("%s | REQCALL: %s %s%s" % (id, req.method, req.path,
-                                                  qs))
+        lines = []
+        lines.append("%s | ---" % id)
+        lines.append("%s | REQTIME: %s" % (id, log_time))
+        lines.append("%s | REQDIFF: %f seconds" % (id, delta))
+        lines.append("%s | REQCALL: %s %s%s" % (id, req.method,
+                                                req.path, qs))
 
         if req.body and len(req.body) > 0:
             body_list = req.body.split('\n')
             for line in body_list:
-                self.dlog.info("%s | REQBODY: %s" % (id, line))
+                lines.append("%s | REQBODY: %s" % (id, line))
 
         for header, value in req.headers.iteritems():
-            self.dlog.info("%s | REQHEAD: %s:%s" % (id, header, value))
-        self.dlog.info("%s | REQADDR: %s" % (id, req.remote_addr))
+            lines.append("%s | REQHEAD: %s:%s" % (id, header, value))
+        lines.append("%s | REQADDR: %s" % (id, req.remote_addr))
 
-        self.dlog.info("%s | RESTEXT: %s" % (id, resp.status))
-        self.dlog.info("%s | RESCODE: %s" % (id, resp.status_int))
+        lines.append("%s | RESTEXT: %s" % (id, resp.status))
+        lines.append("%s | RESCODE: %s" % (id, resp.status_int))
 
         if resp.body and len(resp.body) > 0:
             body_list = resp.body.split('\n')
             for line in body_list:
-                self.dlog.info("%s | RESBODY: %s" % (id, line))
+                lines.append("%s | RESBODY: %s" % (id, line))
+        self._write_detail(lines)
 
     @webob.dec.wsgify
     def __call__(self, req):
@@ -0,0 +1,179 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import atexit
+import logging
+import os
+import Queue
+import threading
+
+__all__ = ['AsyncWriter']
+
+LOG = logging.getLogger(__name__)
+
+DROP = 'drop'
+BLOCK = 'block'
+
+# Tells the writer thread to stop once the records before it are written
+_STOP = object()
+
+
+class AsyncWriter(object):
+    """Appends records to a file from a background thread.
+
+    Records are preformatted strings put in a bounded queue. The thread
+    takes up to batch_size of them at a time and writes them with a single
+    write. When the queue is full a record is dropped and counted, or with
+    the block policy the caller waits for room. The queue is written out
+    when the writer is closed, which happens at exit at the latest.
+
+    The thread is started by the first write in each process, so a worker
+    forked after the writer was created gets a queue and a thread of its
+    own instead of one nothing drains.
+    """
+
+    def __init__(self, path, queue_size=10000, overflow=DROP,
+                 batch_size=256, log=LOG):
+        if overflow not in (DROP, BLOCK):
+            raise ValueError("Unknown overflow policy '%s'" % overflow)
+        self.path = path
+        self.overflow = overflow
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.log = log
+        self.queue = Queue.Queue(queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.closed = False
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._file = open(path, 'a')
+        self._file_pid = os.getpid()
+        self._pid = None
+        self._thread = None
+        atexit.register(self.close)
+
+    def _start(self, pid):
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            if self._file_pid != pid:
+                self._file = open(self.path, 'a')
+                self._file_pid = pid
+            self.queue = Queue.Queue(self.queue_size)
+            self._thread = threading.Thread(target=self._run,
+                                            args=(self.queue,))
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = pid
+
+    def _drop(self, count=1):
+        with self._lock:
+            self.dropped += count
+
+    def write(self, record):
+        """Queues the record, returns False if it was dropped."""
+        if self.closed:
+            self._drop()
+            return False
+        pid = os.getpid()
+        if self._pid != pid:
+            self._start(pid)
+        if self.overflow == BLOCK:
+            self.queue.put(record)
+            return True
+        try:
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            self._drop()
+            return False
+        return True
+
+    def _take_batch(self, queue):
+        batch = [queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(queue.get_nowait())
+            except Queue.Empty:
+                break
+        return batch
+
+    def _run(self, queue):
+        stopped = False
+        while not stopped:
+            batch = self._take_batch(queue)
+            if _STOP in batch:
+                stopped = True
+                batch = [record for record in batch if record is not _STOP]
+            try:
+                if batch:
+                    self._write_batch(batch)
+            finally:
+                for i in range(len(batch) + (1 if stopped else 0)):
+                    queue.task_done()
+        self._file.close()
+
+    def _write_batch(self, batch):
+        """Writes the batch, dropping only the records that fail.
+
+        Nothing a record does stops the thread, or every record after it
+        would be lost, and writers blocked on a full queue would hang.
+        """
+        try:
+            self._file.write(''.join(batch))
+            self._file.flush()
+            self.written += len(batch)
+            return
+        except (IOError, OSError) as e:
+            self.log.error("Could not write to %s: %s" % (self.path, e))
+            self._drop(len(batch))
+            return
+        except Exception:
+            pass
+        # Some record could not be written, find it and write the others
+        for record in batch:
+            try:
+                self._file.write(record)
+            except Exception as e:
+                self.log.error("Could not write a record to %s: %s" %
+                               (self.path, e))
+                self._drop()
+            else:
+                self.written += 1
+        try:
+            self._file.flush()
+        except Exception as e:
+            self.log.error("Could not write to %s: %s" % (self.path, e))
+
+    def flush(self):
+        """Waits until every record queued so far is written."""
+        if self._pid == os.getpid():
+            self.queue.join()
+
+    def close(self):
+        """Writes out the queued records and stops the thread."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._pid != os.getpid():
+            # Nothing was written by this process
+            self._file.close()
+            return
+        self.queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self):
+        return {'queued': self.queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped}
@@ -13,12 +13,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import re
 from urlparse import urlparse
 from urlparse import urlunparse
 
 from webob.dec import wsgify
 
 from wafflehaus.base import WafflehausBase
+from wafflehaus import body
+from wafflehaus import codec
+
+# The key of a links member up to the start of its list
+_LINKS_KEY = re.compile(r'"[A-Za-z0-9_]*_links"\s*:\s*\[')
+_LEADING_KEY = re.compile(r'\s*\{\s*"[A-Za-z0-9_]*_links"\s*:\s*\[')
+_MEMBER_END = re.compile(r'\s*[,}]')
 
 
 class Pagination(WafflehausBase):
@@ -27,34 +35,41 @@ class Pagination(WafflehausBase):
         self.log.name = conf.get('log_name', __name__)
         self.log.info('Starting wafflehaus pagination middleware')
         self.pagination_url = conf.get('pagination_url')
+        self.json_content_types = body.parse_content_types(
+            conf.get('json_content_types'))
+        self.max_body_size = int(conf.get('max_body_size', 0))
+        rewrite_mode = conf.get('rewrite_mode', 'json')
+        if rewrite_mode not in ('json', 'bytes'):
+            raise ValueError("Unknown rewrite_mode '%s', expected json or "
+                             "bytes" % rewrite_mode)
+        self.rewrite_bytes = rewrite_mode == 'bytes'
+        self.codec = codec.get(conf.get('json_backend'))
         # Disable if pagination_url is not found in api-paste.ini
         if not self.pagination_url:
             self.log.error(
                 'wafflehaus pagination_url is missing in api-paste.ini')
             self.enabled = False
-
-    @wsgify
-    def __call__(self, req):
-        """This returns an app if ignored or a response if processed."""
-        super(Pagination, self).__call__(req)
-
-        # The waffle must be enabled
-        if not self.enabled:
-            return self.app
-
-        # If the app throws we log it and return
+            return
+        new_url = urlparse(self.pagination_url)
+        self.scheme = new_url.scheme
+        self.netloc = new_url.netloc
+
+    def _rewrite_link(self, link):
+        passed_url = urlparse(link['href'])
+        url = passed_url._replace(netloc=self.netloc, scheme=self.scheme)
+        link['href'] = urlunparse(url)
+
+    def _rewrite_json(self, resp):
+        """Rewrites the links of the decoded body and encodes it again."""
         try:
-            resp = req.get_response(self.app)
-        except Exception as e:
-            self.log.debug(('pagination wafflehaus error in get_response:'
-                           '{}'.format(e)))
-            return self.app
-
-        if not resp:
-            return self.app
+            data = self.codec.loads(resp.body)
+        except ValueError:
+            self.log.debug('pagination wafflehaus: JSON decoding failed')
+            return resp
 
-        if resp.status_code != 200:
-            return self.app
+        # Only an object can hold links
+        if not isinstance(data, dict):
+            return resp
 
         # Build a list of possible pagination keywords.
         # This will look for things such as:
@@ -63,37 +78,143 @@ class Pagination(WafflehausBase):
         #   - security_groups_links;
         #   - ports_links;
         #   - subnetpools_links.
-        try:
-            link_type_list = filter(lambda kw: '_links' in kw, resp.json)
-        except ValueError:
-            self.log.debug('pagination wafflehaus: JSON decoding failed')
-            return self.app
+        link_type_list = filter(lambda kw: '_links' in kw, data)
 
         # If the list is empty, we have nothing to process.
         if len(link_type_list) == 0:
-            return self.app
+            return resp
 
         # List is not empty, take the first element.
         link_type = link_type_list[0]
 
-        # init the json that we will return from the passed response
-        pagination_json = resp.json
-        pagination_json[link_type] = []
-
         # Replace all href url occurrences with the ones from the config file.
-        for link in resp.json[link_type]:
-            passed_url = urlparse(link['href'])
-            new_url = urlparse(self.pagination_url)
-            url = passed_url._replace(netloc=new_url.netloc,
-                                      scheme=new_url.scheme)
-            link['href'] = urlunparse(url)
-            pagination_json[link_type].append(link)
+        if not isinstance(data[link_type], list):
+            return resp
+        for link in data[link_type]:
+            if isinstance(link, dict):
+                if isinstance(link.get('href'), basestring):
+                    self._rewrite_link(link)
 
         # Replace the json with the new containing fixed links
-        resp.json = pagination_json
-
+        resp.body = self.codec.dumps(data)
         return resp
 
+    def _splice_links(self, raw, list_start):
+        """Returns the rewritten links of the list at list_start.
+
+        The links are returned encoded along with the end of the list, or
+        None if the list does not hold only links.
+        """
+        try:
+            links, list_end = self.codec.raw_decode(raw, list_start)
+        except ValueError:
+            return None
+        if not isinstance(links, list):
+            return None
+        for link in links:
+            if not isinstance(link, dict):
+                return None
+            if not isinstance(link.get('href'), basestring):
+                return None
+            self._rewrite_link(link)
+        return self.codec.dumps(links), list_end
+
+    def _leading_links(self, raw):
+        """Returns where the links list of the first member starts."""
+        found = _LEADING_KEY.match(raw)
+        return found.end() - 1 if found else None
+
+    def _trailing_links(self, raw):
+        """Returns where the links list of the last member starts."""
+        end = len(raw.rstrip())
+        if not raw.endswith('}', 0, end):
+            return None
+        # The list must end right before the closing brace of the body, so
+        # it is in the outermost object
+        close = raw.rfind(']', 0, end - 1)
+        if close < 0 or raw[close + 1:end - 1].strip():
+            return None
+        key = raw.rfind('_links"', 0, close)
+        if key < 0:
+            return None
+        start = raw.rfind('"', 0, key)
+        bracket = raw.find('[', key)
+        if bracket < 0:
+            return None
+        found = _LINKS_KEY.match(raw, start, bracket + 1)
+        if found is None or found.end() != bracket + 1:
+            return None
+        return bracket
+
+    def _rewrite_bytes(self, raw):
+        """Returns raw with the hrefs of its links rewritten, or None.
+
+        Only a body whose first or last member is a *_links list of links
+        is rewritten, by decoding that list alone and splicing it back in
+        so the rest of the body is not decoded.
+        """
+        list_start = self._leading_links(raw)
+        if list_start is not None:
+            spliced = self._splice_links(raw, list_start)
+            if spliced is None:
+                return None
+            if not _MEMBER_END.match(raw, spliced[1]):
+                return None
+        else:
+            list_start = self._trailing_links(raw)
+            if list_start is None:
+                return None
+            spliced = self._splice_links(raw, list_start)
+            if spliced is None:
+                return None
+            if raw[spliced[1]:].strip() != '}':
+                return None
+        links, list_end = spliced
+        return ''.join((raw[:list_start], links, raw[list_end:]))
+
+    @wsgify
+    def __call__(self, req):
+        """This returns an app if disabled or the response otherwise.
+
+        Once the app has been called its response is always returned, so
+        the request is never handled twice downstream.
+        """
+        super(Pagination, self).__call__(req)
+
+        # The waffle must be enabled
+        if not self.enabled:
+            return self.app
+
+        # If the app throws we log it and let it propagate, calling it again
+        # would repeat the request
+        try:
+            resp = req.get_response(self.app)
+        except Exception as e:
+            self.log.debug(('pagination wafflehaus error in get_response:'
+                           '{}'.format(e)))
+            raise
+
+        if resp.status_code != 200:
+            return resp
+
+        # Responses that cannot hold links are passed on without reading
+        reason = body.pass_reason(resp, self.json_content_types,
+                                  self.max_body_size, req.method)
+        if reason is None and not body.read_limited(resp, self.max_body_size):
+            reason = 'body larger than %d' % self.max_body_size
+        if reason is not None:
+            self.log.debug('pagination wafflehaus: skipping, %s', reason)
+            return resp
+
+        if self.rewrite_bytes:
+            new_body = self._rewrite_bytes(resp.body)
+            if new_body is not None:
+                resp.body = new_body
+                return resp
+            self.log.debug('pagination wafflehaus: links not found at either '
+                           'end, decoding the whole body')
+        return self._rewrite_json(resp)
+
 
 def filter_factory(global_conf, **local_conf):
     """Returns a WSGI filter app for use with paste.deploy."""
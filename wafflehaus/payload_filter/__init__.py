@@ -13,41 +13,75 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import json
+from wafflehaus import codec
 
 __all__ = ['set_default_payload', 'get_defaults']
 
+# Marks the value of a node that is a default. Keys are never None.
+_VALUE = None
 
-def _walk_json_payload(payload, value, path, depth=0):
-    key = path[depth]
-    if len(path) - 1 == depth:
-        if key not in payload:
-            if value == 'null':
-                value = None
-            payload[key] = value
-        return
-    if key not in payload:
-        return
-    ptr = payload[key]
-    if isinstance(ptr, list) and not isinstance(ptr, str):
-        for child in ptr:
-            _walk_json_payload(child, value, path, depth=depth + 1)
-    else:
-        _walk_json_payload(ptr, value, path, depth=depth + 1)
-
-
-def json_set_unset_keys(payload, defaults):
+
+def _has_children(tree):
+    return len(tree) > (1 if _VALUE in tree else 0)
+
+
+def set_unset_keys(payload, defaults):
+    """Sets every key of the defaults tree missing from payload in place.
+
+    The payload is walked once for all of the defaults, with a stack so
+    deep trees are safe. A list found on a path gets the defaults below it
+    set in each of its objects. Returns the number of keys set.
+    """
+    changed = 0
+    if not isinstance(payload, dict):
+        return changed
+    stack = [(defaults, payload)]
+    while stack:
+        tree, node = stack.pop()
+        for key, subtree in tree.iteritems():
+            if key is _VALUE:
+                continue
+            if key not in node:
+                if _VALUE in subtree:
+                    node[key] = subtree[_VALUE]
+                    changed += 1
+                continue
+            if not _has_children(subtree):
+                continue
+            child = node[key]
+            if isinstance(child, dict):
+                stack.append((subtree, child))
+            elif isinstance(child, list):
+                stack.extend((subtree, item) for item in child
+                             if isinstance(item, dict))
+    return changed
+
+
+def json_set_unset_keys(payload, defaults, json_codec=None):
+    """Returns payload with the defaults set, or unchanged if none was.
+
+    The payload is decoded and encoded with json_codec, by default the
+    default codec.
+    """
+    if json_codec is None:
+        json_codec = codec.get()
     try:
-        payload_json = json.loads(payload)
+        payload_json = json_codec.loads(payload)
     except ValueError:
         return payload
-    for default in defaults:
-        _walk_json_payload(payload_json, default['value'], default['path'])
-    return json.dumps(payload_json)
+    if not set_unset_keys(payload_json, defaults):
+        return payload
+    return json_codec.dumps(payload_json)
 
 
 def get_defaults(defaults):
-    result = []
+    """Returns the tree of the defaults configured by path=value pairs.
+
+    Each level of the tree is a dict keyed by the keys of the path, and the
+    node at the end of a path holds its value, already parsed, under
+    _VALUE. The first of two defaults with the same path wins.
+    """
+    result = {}
     if not defaults:
         return result
     work_list = [s.strip() for s in defaults.split(',')]
@@ -55,8 +89,10 @@ def get_defaults(defaults):
         parts = [s.strip() for s in working.split('=')]
         path = [s.strip() for s in parts[0].split(':')]
         value = parts[1]
-        element = {}
-        element['path'] = path
-        element['value'] = value
-        result.append(element)
+        if value == 'null':
+            value = None
+        node = result
+        for key in path:
+            node = node.setdefault(key, {})
+        node.setdefault(_VALUE, value)
     return result
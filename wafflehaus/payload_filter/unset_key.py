@@ -16,6 +16,8 @@ import webob.dec
 import webob.exc
 
 import wafflehaus.base
+import wafflehaus.body as body
+import wafflehaus.codec as codec
 import wafflehaus.payload_filter as pf
 import wafflehaus.resource_filter as rf
 
@@ -26,18 +28,40 @@ class DefaultPayload(wafflehaus.base.WafflehausBase):
         super(DefaultPayload, self).__init__(app, conf)
         self.log.name = conf.get('log_name', __name__)
         self.log.info('Starting wafflehaus default payload middleware')
-        self.resources = rf.parse_resources(conf.get('resource'))
+        self.resource_matcher = conf.get('resource_matcher')
+        self.resources = rf.parse_resources(conf.get('resource'),
+                                            self.resource_matcher)
         self.defaults = pf.get_defaults(conf.get('defaults'))
+        self.json_content_types = body.parse_content_types(
+            conf.get('json_content_types'))
+        self.codec = codec.get(conf.get('json_backend'))
 
     def _override(self, req):
         super(DefaultPayload, self)._override(req)
         new_resource = self._reconf(req, 'str', 'resource')
         if new_resource is not None:
-            self.resources = rf.parse_resources(new_resource)
+            self.resources = rf.parse_resources(new_resource,
+                                                self.resource_matcher)
         new_defaults = self._reconf(req, 'str', 'defaults')
         if new_defaults is not None:
             self.defaults = pf.get_defaults(new_defaults)
 
+    def _has_payload(self, req):
+        """Returns if the request may carry a JSON body to default.
+
+        Only the method and headers are looked at. A request without a
+        Content-Type is still read, as clients often leave it out.
+        """
+        if req.method in ('GET', 'HEAD'):
+            return False
+        if not req.is_body_readable:
+            return False
+        if req.content_length == 0:
+            return False
+        if req.content_type:
+            return body.is_json(req.content_type, self.json_content_types)
+        return True
+
     @webob.dec.wsgify
     def __call__(self, req):
         super(DefaultPayload, self).__call__(req)
@@ -46,9 +70,15 @@ class DefaultPayload(wafflehaus.base.WafflehausBase):
 
         if not self.defaults:
             return self.app
+        if not self._has_payload(req):
+            return self.app
         if rf.matched_request(req, self.resources):
-            self.body = pf.json_set_unset_keys(req.body, self.defaults)
-            req.body = self.body
+            payload = req.body
+            new_payload = pf.json_set_unset_keys(payload, self.defaults,
+                                                 self.codec)
+            # An unchanged body is left as it is, byte for byte
+            if new_payload is not payload:
+                req.body = new_payload
         return self.app
 
 
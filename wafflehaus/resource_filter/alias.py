@@ -25,7 +25,9 @@ class AliasResource(wafflehaus.base.WafflehausBase):
         super(AliasResource, self).__init__(app, conf)
         self.log.name = conf.get('log_name', __name__)
         self.log.info('Starting wafflehaus resource alias middleware')
-        self.resources = rf.parse_resources(conf.get('resource'))
+        self.resource_matcher = conf.get('resource_matcher')
+        self.resources = rf.parse_resources(conf.get('resource'),
+                                            self.resource_matcher)
         if 'addslash' in conf.get('action'):
             self.action = ['addslash', '']
         elif ':' not in conf.get('action', ''):
@@ -39,7 +41,8 @@ class AliasResource(wafflehaus.base.WafflehausBase):
         super(AliasResource, self)._override(req)
         new_resource = self._reconf(req, 'str', 'resource')
         if new_resource is not None:
-            self.resources = rf.parse_resources(new_resource)
+            self.resources = rf.parse_resources(new_resource,
+                                                self.resource_matcher)
 
     def _perform_action(self, req):
         if self.code == 'subrequest':
@@ -25,13 +25,16 @@ class BlockResource(wafflehaus.base.WafflehausBase):
         super(BlockResource, self).__init__(app, conf)
         self.log.name = conf.get('log_name', __name__)
         self.log.info('Starting wafflehaus resource blocker middleware')
-        self.resources = rf.parse_resources(conf.get('resource'))
+        self.resource_matcher = conf.get('resource_matcher')
+        self.resources = rf.parse_resources(conf.get('resource'),
+                                            self.resource_matcher)
 
     def _override(self, req):
         super(BlockResource, self)._override(req)
         new_resource = self._reconf(req, 'str', 'resource')
         if new_resource is not None:
-            self.resources = rf.parse_resources(new_resource)
+            self.resources = rf.parse_resources(new_resource,
+                                                self.resource_matcher)
 
     @webob.dec.wsgify
     def __call__(self, req):
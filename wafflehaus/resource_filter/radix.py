@@ -0,0 +1,193 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Segment trie used to match request paths against routes templates.
+
+Templates are parsed with the routes parser and split on '/'. Segments
+without variables become static edges and segments with variables become
+regex edges that are anchored to the segment. A template with a variable
+that could match a '/' can not be split and is matched with routes instead.
+"""
+import re
+
+from routes import Mapper
+from routes.route import Route
+
+__all__ = ['PathTrie']
+
+# Escapes that can never match a '/'
+_SAFE_ESCAPES = frozenset('dwsbBAZ.-_+*?|(){}[]^$,:=!<>#@&%~\'"')
+
+
+def _segment_safe(regex):
+    """Returns True when the regex can not match a '/'.
+
+    This errs on the side of caution; a regex that is not understood is
+    treated as unsafe and its template is matched with routes instead.
+    """
+    in_class = False
+    prev = None
+    i = 0
+    while i < len(regex):
+        c = regex[i]
+        if c == '\\':
+            escaped = regex[i + 1:i + 2]
+            if escaped not in _SAFE_ESCAPES:
+                return False
+            prev = None
+            i += 2
+            continue
+        if c == '/':
+            return False
+        if in_class:
+            if c == ']':
+                in_class = False
+            elif c == '-' and prev is not None and regex[i + 1:i + 2]:
+                end = regex[i + 1]
+                if end == '\\' or ord(prev) <= ord('/') <= ord(end):
+                    return False
+            prev = c
+        elif c == '[':
+            if regex[i + 1:i + 2] == '^':
+                return False
+            in_class = True
+            prev = None
+        elif c == '.':
+            return False
+        i += 1
+    return True
+
+
+class _Node(object):
+    __slots__ = ('static', 'dynamic', 'index', 'first')
+
+    def __init__(self):
+        self.static = {}
+        self.dynamic = []
+        self.index = None
+        self.first = None
+
+
+class PathTrie(object):
+    """Finds the first template, in insertion order, that matches a path.
+
+    A lookup follows one edge per path segment. Regex edges are only tried
+    when they can lead to a template inserted before the best match found so
+    far, so a lookup stays close to the depth of the path.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._fallback = Mapper(register=False)
+        self._fallback_index = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _segments(self, template):
+        route = Route(None, template, _explicit=True)
+        segments = [[]]
+        for part in route.routelist:
+            if isinstance(part, dict):
+                if part['type'] == '*':
+                    return None
+                req = route.reqs.get(part['name'])
+                if req is not None and not _segment_safe(req):
+                    return None
+                segments[-1].append((part['type'], req))
+                continue
+            pieces = part.split('/')
+            segments[-1].append(pieces[0])
+            for piece in pieces[1:]:
+                segments.append([piece])
+        return [self._compile_segment(s) for s in segments]
+
+    def _compile_segment(self, parts):
+        if all(not isinstance(p, tuple) for p in parts):
+            return ''.join(parts)
+        regparts = []
+        for part in parts:
+            if not isinstance(part, tuple):
+                regparts.append(re.escape(part))
+                continue
+            var_type, req = part
+            if var_type == '.':
+                regparts.append(r'(?:\.(?:%s))??' % (req or '[^/.]+?'))
+            else:
+                regparts.append('(?:%s)' % (req or '[^/]+?'))
+        return re.compile('^%s$' % ''.join(regparts))
+
+    def insert(self, template):
+        """Adds a template and returns its index."""
+        index = self._size
+        self._size += 1
+        segments = self._segments(template)
+        if segments is None:
+            self._fallback.connect(None, template)
+            self._fallback_index[self._fallback.matchlist[-1]] = index
+            self._fallback.create_regs()
+            return index
+        node = self._root
+        if node.first is None:
+            node.first = index
+        for segment in segments:
+            if isinstance(segment, basestring):
+                child = node.static.get(segment)
+                if child is None:
+                    child = node.static[segment] = _Node()
+            else:
+                child = None
+                for pattern, existing in node.dynamic:
+                    if pattern.pattern == segment.pattern:
+                        child = existing
+                        break
+                if child is None:
+                    child = _Node()
+                    node.dynamic.append((segment, child))
+            if child.first is None:
+                child.first = index
+            node = child
+        if node.index is None:
+            node.index = index
+        return index
+
+    def lookup(self, path):
+        """Returns the index of the first matching template or None."""
+        best = None
+        if self._fallback_index:
+            res = self._fallback.routematch(path)
+            if res is not None:
+                best = self._fallback_index[res[1]]
+        segments = path.split('/')
+        depth = len(segments)
+        stack = [(self._root, 0)]
+        while stack:
+            node, pos = stack.pop()
+            if node.first is None or (best is not None and node.first >= best):
+                continue
+            if pos == depth:
+                if node.index is None:
+                    continue
+                if best is None or node.index < best:
+                    best = node.index
+                continue
+            segment = segments[pos]
+            for pattern, child in node.dynamic:
+                if pattern.match(segment):
+                    stack.append((child, pos + 1))
+            child = node.static.get(segment)
+            if child is not None:
+                stack.append((child, pos + 1))
+        return best
@@ -37,3 +37,68 @@ class TestCase(unittest2.TestCase):
         thing = patcher.start()
         self.addCleanup(patcher.stop)
         return thing
+
+
+class FakeRRset(list):
+
+    def __init__(self, values, ttl):
+        super(FakeRRset, self).__init__(values)
+        self.ttl = ttl
+
+
+class FakeAnswer(list):
+    """An answer that carries its TTL like dns.resolver.Answer."""
+
+    def __init__(self, values, ttl=300):
+        super(FakeAnswer, self).__init__(values)
+        self.rrset = FakeRRset(values, ttl)
+
+
+class CountingBody(object):
+    """An app_iter that counts the bytes read from it."""
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.read += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def body_app(app_iter, content_type='application/json', length=None,
+             status='200 OK'):
+    """Returns a WSGI app that responds with app_iter as the body."""
+    def app(environ, start_response):
+        headers = [('Content-Type', content_type)]
+        if length is not None:
+            headers.append(('Content-Length', str(length)))
+        start_response(status, headers)
+        return app_iter
+    return app
+
+
+class CountingApp(object):
+    """A WSGI app that counts how many times it is called.
+
+    It responds with status, body and content_type, or raises error.
+    """
+    def __init__(self, status='200 OK', body='{}',
+                 content_type='application/json', error=None):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, environ, start_response):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        start_response(self.status, [('Content-Type', self.content_type),
+                                     ('Content-Length', str(len(self.body)))])
+        return [self.body]
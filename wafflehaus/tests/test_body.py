@@ -0,0 +1,151 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import json
+
+import webob
+
+from wafflehaus import body
+from wafflehaus.edit_response import EditResponse
+from wafflehaus.pagination.pagination import Pagination
+from wafflehaus import tests
+
+LINKS = {"networks": [],
+         "networks_links": [{"href": "http://localhost:9696/v2.0/networks",
+                             "rel": "next"}]}
+
+
+class TestBody(tests.TestCase):
+
+    def setUp(self):
+        super(TestBody, self).setUp()
+        self.types = body.parse_content_types(None)
+
+    def _response(self, content_type, length=None):
+        resp = webob.Response(content_type=content_type)
+        resp.content_length = length
+        return resp
+
+    def test_json_types(self):
+        self.assertTrue(body.is_json('application/json', self.types))
+        self.assertTrue(body.is_json('Application/JSON', self.types))
+        self.assertTrue(body.is_json('application/vnd.api+json', self.types))
+        self.assertFalse(body.is_json('text/html', self.types))
+        self.assertFalse(body.is_json(None, self.types))
+        types = body.parse_content_types('text/plain')
+        self.assertTrue(body.is_json('text/plain', types))
+        self.assertFalse(body.is_json('application/json', types))
+
+    def test_pass_reason(self):
+        self.assertIsNone(body.pass_reason(
+            self._response('application/json', 10), self.types, 10))
+        self.assertIsNone(body.pass_reason(
+            self._response('application/json'), self.types, 10))
+        self.assertIsNotNone(body.pass_reason(
+            self._response('application/json', 11), self.types, 10))
+        self.assertIsNotNone(body.pass_reason(
+            self._response('image/png', 1), self.types))
+        self.assertIsNotNone(body.pass_reason(
+            self._response('application/json', 0), self.types))
+        self.assertIsNotNone(body.pass_reason(
+            self._response('application/json', 10), self.types, 0, 'HEAD'))
+
+    def test_read_limited(self):
+        app_iter = tests.CountingBody(['12345'] * 10)
+        resp = webob.Response(app_iter=app_iter)
+        self.assertFalse(body.read_limited(resp, 12))
+        self.assertEqual(15, app_iter.read)
+        self.assertEqual('12345' * 10, ''.join(resp.app_iter))
+        resp.app_iter.close()
+        self.assertTrue(app_iter.closed)
+
+        app_iter = tests.CountingBody(['12345'] * 2)
+        resp = webob.Response(app_iter=app_iter)
+        self.assertTrue(body.read_limited(resp, 12))
+        self.assertEqual('12345' * 2, resp.body)
+        self.assertTrue(app_iter.closed)
+
+
+class TestPassThrough(tests.TestCase):
+    """Responses that are passed through are not read at all."""
+
+    def setUp(self):
+        super(TestPassThrough, self).setUp()
+        self.edit_conf = {"enabled": "true",
+                          "filters": "links",
+                          "links_resource": "GET HEAD DELETE /networks",
+                          "links_key": "networks",
+                          "max_body_size": "100"}
+        self.pagination_conf = {"enabled": "true",
+                                "pagination_url": "https://example.com",
+                                "max_body_size": "100"}
+
+    def _call(self, waffle_class, conf, app_iter, method="GET", **kwargs):
+        waffle = waffle_class(tests.body_app(app_iter, **kwargs), conf)
+        return waffle(webob.Request.blank("/networks", method=method))
+
+    def _check_untouched(self, waffle_class, conf, chunks=None, **kwargs):
+        if chunks is None:
+            chunks = ['x' * 64] * 4
+        app_iter = tests.CountingBody(chunks)
+        resp = self._call(waffle_class, conf, app_iter, **kwargs)
+        self.assertIs(app_iter, resp.app_iter)
+        self.assertEqual(0, app_iter.read)
+
+    def test_other_content_types_not_read(self):
+        for waffle_class, conf in ((EditResponse, self.edit_conf),
+                                   (Pagination, self.pagination_conf)):
+            self._check_untouched(waffle_class, conf,
+                                  content_type='application/octet-stream')
+            self._check_untouched(waffle_class, conf,
+                                  content_type='text/html')
+
+    def test_large_content_length_not_read(self):
+        for waffle_class, conf in ((EditResponse, self.edit_conf),
+                                   (Pagination, self.pagination_conf)):
+            self._check_untouched(waffle_class, conf, length=256)
+
+    def test_empty_body_not_read(self):
+        for waffle_class, conf in ((EditResponse, self.edit_conf),
+                                   (Pagination, self.pagination_conf)):
+            self._check_untouched(waffle_class, conf, chunks=[], length=0)
+
+    def test_no_content_not_read(self):
+        for status in ('204 No Content', '304 Not Modified'):
+            self._check_untouched(EditResponse, self.edit_conf, chunks=[],
+                                  method="DELETE", status=status)
+
+    def test_head_not_read(self):
+        for waffle_class, conf in ((EditResponse, self.edit_conf),
+                                   (Pagination, self.pagination_conf)):
+            self._check_untouched(waffle_class, conf, chunks=['{}'],
+                                  method="HEAD", length=2)
+
+    def test_unknown_length_read_up_to_limit(self):
+        for waffle_class, conf in ((EditResponse, self.edit_conf),
+                                   (Pagination, self.pagination_conf)):
+            app_iter = tests.CountingBody(['x' * 64] * 4)
+            resp = self._call(waffle_class, conf, app_iter)
+            self.assertEqual(128, app_iter.read)
+            self.assertEqual('x' * 256, resp.body)
+
+    def test_json_still_edited(self):
+        app_iter = tests.CountingBody([json.dumps(LINKS)])
+        resp = self._call(EditResponse, self.edit_conf, app_iter)
+        self.assertEqual({"networks_links": LINKS["networks_links"]},
+                         resp.json)
+        app_iter = tests.CountingBody([json.dumps(LINKS)])
+        resp = self._call(Pagination, self.pagination_conf, app_iter)
+        self.assertEqual("https://example.com/v2.0/networks",
+                         resp.json["networks_links"][0]["href"])
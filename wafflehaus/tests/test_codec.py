@@ -0,0 +1,71 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import json
+
+from wafflehaus import codec
+from wafflehaus import tests
+
+PORT = {"port": {"name": u"caf\u00e9", "admin_state_up": True,
+                 "fixed_ips": [{"ip_address": "10.0.0.1"}], "mtu": 1500,
+                 "href": "http://localhost:9696/v2.0/ports", "qos": None}}
+
+
+class TestCodec(tests.TestCase):
+
+    def test_default(self):
+        self.assertEqual(codec.CODECS[0].name, codec.BACKEND)
+        self.assertIn(codec.BACKEND, ('simplejson', 'json'))
+        self.assertIs(codec.CODECS[0].loads, codec.loads)
+        self.assertIs(codec.CODECS[0], codec.get())
+
+    def test_get_by_name(self):
+        for name in ('json', 'simplejson'):
+            self.assertEqual(name, codec.get(name).name)
+        self.assertRaises(ValueError, codec.get, 'yaml')
+
+    def test_ujson_only_when_asked(self):
+        if codec.ujson is None:
+            self.assertRaises(ValueError, codec.get, 'ujson')
+        else:
+            self.assertEqual('ujson', codec.get('ujson').name)
+        self.assertNotEqual('ujson', codec.BACKEND)
+
+    def test_backends_agree(self):
+        raw = json.dumps(PORT)
+        for backend in codec.CODECS:
+            self.assertEqual(PORT, backend.loads(raw), backend)
+            dumped = backend.dumps(PORT)
+            self.assertIsInstance(dumped, str)
+            self.assertEqual(PORT, json.loads(dumped), backend)
+            self.assertNotIn(', ', dumped)
+            self.assertIn('"http://localhost:9696/v2.0/ports"', dumped)
+
+    def test_bytes_decoded(self):
+        raw = '{"name": "caf\xc3\xa9"}'
+        for backend in codec.CODECS:
+            self.assertEqual({"name": u"caf\u00e9"}, backend.loads(raw))
+
+    def test_errors_are_value_errors(self):
+        for backend in codec.CODECS:
+            for raw in ('', '{"a": ', 'garbage', '[1, 2'):
+                self.assertRaises(ValueError, backend.loads, raw)
+
+    def test_raw_decode(self):
+        raw = '{"links": [{"href": "x"}], "ports": []}'
+        start = raw.index('[')
+        for backend in codec.CODECS:
+            links, end = backend.raw_decode(raw, start)
+            self.assertEqual([{"href": "x"}], links)
+            self.assertEqual(', "ports": []}', raw[end:])
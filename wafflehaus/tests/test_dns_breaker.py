@@ -0,0 +1,238 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import dns.exception
+import dns.resolver
+import webob.exc
+
+from wafflehaus.dns_filter import breaker
+from wafflehaus.dns_filter import whitelist
+from wafflehaus import tests
+
+
+class FailingResolver(object):
+
+    def __init__(self):
+        self.error = None
+        self.queries = 0
+        self.lifetimes = []
+
+    def query(self, value, record_type):
+        self.queries += 1
+        self.lifetimes.append(getattr(self, 'lifetime', None))
+        if self.error is not None:
+            raise self.error
+        if record_type == 'PTR':
+            return ['derp.widget.com']
+        return FakeARecord()
+
+
+class FakeARecord(list):
+
+    def __init__(self):
+        super(FakeARecord, self).__init__(['192.168.1.1'])
+        self.rrset = self
+
+
+class TestCircuitBreaker(tests.TestCase):
+
+    def setUp(self):
+        super(TestCircuitBreaker, self).setUp()
+        self.m_time = self.create_patch('wafflehaus.dns_filter.breaker.time')
+        self.m_time.time.return_value = 1000.0
+        self.breaker = breaker.CircuitBreaker(window=60, min_calls=4,
+                                              failure_rate=0.5, slow_call=1.0,
+                                              reset_timeout=30, probes=2)
+
+    def _trip(self):
+        for failed in (False, False, True, True):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(0.1, failed)
+        self.assertEqual(breaker.OPEN, self.breaker.state)
+
+    def test_opens_on_failure_rate(self):
+        for i in range(3):
+            self.breaker.record(0.1, True)
+        self.assertEqual(breaker.CLOSED, self.breaker.state)
+        self.breaker.record(0.1)
+        self.assertEqual(breaker.OPEN, self.breaker.state)
+        self.assertFalse(self.breaker.allow())
+        stats = self.breaker.stats()
+        self.assertEqual(1, stats['trips'])
+        self.assertEqual(1, stats['rejected'])
+
+    def test_slow_calls_fail(self):
+        for i in range(4):
+            self.breaker.record(1.5)
+        self.assertEqual(breaker.OPEN, self.breaker.state)
+
+    def test_old_calls_leave_window(self):
+        self.breaker.record(0.1, True)
+        self.breaker.record(0.1, True)
+        self.m_time.time.return_value = 1100.0
+        for i in range(3):
+            self.breaker.record(0.1)
+        self.breaker.record(0.1, True)
+        self.assertEqual(breaker.CLOSED, self.breaker.state)
+        self.assertEqual(0.25, self.breaker.stats()['failure_rate'])
+
+    def test_probes_close(self):
+        self._trip()
+        self.m_time.time.return_value = 1031.0
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(breaker.HALF_OPEN, self.breaker.state)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(0.1)
+        self.breaker.cancel()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(0.1)
+        self.assertEqual(breaker.CLOSED, self.breaker.state)
+
+    def test_failed_probe_opens(self):
+        self._trip()
+        self.m_time.time.return_value = 1031.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(0.1, True)
+        self.assertEqual(breaker.OPEN, self.breaker.state)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(2, self.breaker.stats()['trips'])
+
+
+class TestDNSWhitelistBreaker(tests.TestCase):
+
+    def setUp(self):
+        super(TestDNSWhitelistBreaker, self).setUp()
+        self.resolver = FailingResolver()
+        m_create = self.create_patch(
+            'wafflehaus.dns_filter.whitelist.DNSWhitelist._create_resolver')
+        m_create.return_value = self.resolver
+        m_reverse = self.create_patch('dns.reversename.from_address')
+        m_reverse.return_value = 'omg.widget.com'
+        m_addr = self.create_patch(
+            'wafflehaus.dns_filter.whitelist.DNSWhitelist.get_remote_addr')
+        m_addr.return_value = '192.168.1.1'
+        self.m_time = self.create_patch('wafflehaus.dns_filter.cache.time')
+        self.m_time.time.return_value = 1000.0
+        self.conf = {'whitelist': 'widget.com', 'enabled': 'true',
+                     'dns_breaker': 'true', 'dns_breaker_min_calls': '2',
+                     'dns_breaker_reset': '3600'}
+
+    def _request(self, result):
+        return result.__call__.request('/widget', method='POST')
+
+    def _trip(self, result):
+        self.resolver.error = dns.exception.Timeout()
+        for i in range(2):
+            result.verdict_cache.clear()
+            self.assertTrue(isinstance(self._request(result),
+                                       webob.exc.HTTPForbidden))
+        self.assertEqual(breaker.OPEN, result.breaker.state)
+        queries = self.resolver.queries
+        self.resolver.error = None
+        return queries
+
+    def test_budget_limits_queries(self):
+        conf = dict(self.conf, dns_timeout='2')
+        result = whitelist.filter_factory(conf)(self.app)
+        m_time = self.create_patch('wafflehaus.dns_filter.whitelist.time')
+        m_time.time.side_effect = [100.0, 100.5, 101.0, 101.0]
+        resp = self._request(result)
+        self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual([1.5, 1.0], self.resolver.lifetimes)
+
+    def test_budget_exhausted(self):
+        conf = dict(self.conf, dns_timeout='2', dns_verdict_cache_size='0')
+        result = whitelist.filter_factory(conf)(self.app)
+        m_time = self.create_patch('wafflehaus.dns_filter.whitelist.time')
+        m_time.time.side_effect = [100.0, 100.5, 102.5, 102.5]
+        resp = self._request(result)
+        self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(1, self.resolver.queries)
+
+    def test_missing_names_do_not_trip(self):
+        result = whitelist.filter_factory(self.conf)(self.app)
+        self.resolver.error = dns.resolver.NXDOMAIN()
+        for i in range(4):
+            result.verdict_cache.clear()
+            self._request(result)
+        self.assertEqual(breaker.CLOSED, result.breaker.state)
+
+    def test_open_serves_expired_verdicts(self):
+        result = whitelist.filter_factory(self.conf)(self.app)
+        queries = self._trip(result)
+        result.set_verdict('192.168.1.1', True, 300)
+        self.m_time.time.return_value = 1400.0
+        resp = self._request(result)
+        self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(queries, self.resolver.queries)
+
+        result.verdict_cache.clear()
+        resp = self._request(result)
+        self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(queries, self.resolver.queries)
+
+    def test_open_fails_closed(self):
+        conf = dict(self.conf, dns_breaker_policy='closed')
+        result = whitelist.filter_factory(conf)(self.app)
+        queries = self._trip(result)
+        result.set_verdict('192.168.1.1', True, 300)
+        self.m_time.time.return_value = 1400.0
+        resp = self._request(result)
+        self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(queries, self.resolver.queries)
+
+    def test_probe_closes_breaker(self):
+        conf = dict(self.conf, dns_breaker_probes='1')
+        result = whitelist.filter_factory(conf)(self.app)
+        queries = self._trip(result)
+        result.breaker.reset_timeout = 0
+        result.verdict_cache.clear()
+        resp = self._request(result)
+        self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(queries + 2, self.resolver.queries)
+        self.assertEqual(breaker.CLOSED, result.breaker.state)
+
+    def _cache_records(self, result):
+        result.record_cache.set(('omg.widget.com', 'PTR'),
+                                tests.FakeAnswer(['derp.widget.com']), 300)
+        result.record_cache.set(('derp.widget.com', 'A'),
+                                tests.FakeAnswer(['192.168.1.1']), 300)
+
+    def test_cached_records_not_recorded(self):
+        result = whitelist.filter_factory(self.conf)(self.app)
+        self._cache_records(result)
+        for i in range(4):
+            result.verdict_cache.clear()
+            self._request(result)
+        self.assertEqual(0, self.resolver.queries)
+        self.assertEqual(0, result.breaker.stats()['calls'])
+
+    def test_probe_answered_from_cache_does_not_close(self):
+        conf = dict(self.conf, dns_breaker_probes='1')
+        result = whitelist.filter_factory(conf)(self.app)
+        queries = self._trip(result)
+        result.breaker.reset_timeout = 0
+        self._cache_records(result)
+        result.verdict_cache.clear()
+        resp = self._request(result)
+        self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(queries, self.resolver.queries)
+        self.assertEqual(breaker.HALF_OPEN, result.breaker.state)
+        self.assertTrue(result.breaker.allow())
+
+    def test_unknown_policy(self):
+        conf = dict(self.conf, dns_breaker_policy='open')
+        self.assertRaises(ValueError, whitelist.filter_factory(conf),
+                          self.app)
@@ -0,0 +1,99 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from wafflehaus.dns_filter import cache
+from wafflehaus import tests
+
+
+class TestTTLCache(tests.TestCase):
+
+    def setUp(self):
+        super(TestTTLCache, self).setUp()
+        self.m_time = self.create_patch('wafflehaus.dns_filter.cache.time')
+        self.m_time.time.return_value = 1000.0
+
+    def test_get_set(self):
+        c = cache.TTLCache(size=10)
+        self.assertIsNone(c.get('a'))
+        c.set('a', 'A', 60)
+        self.assertEqual('A', c.get('a'))
+        self.assertEqual({'size': 1, 'hits': 1, 'misses': 1,
+                          'stale_hits': 0, 'evictions': 0}, c.stats())
+
+    def test_expires_after_ttl(self):
+        c = cache.TTLCache(size=10)
+        c.set('a', 'A', 60)
+        self.m_time.time.return_value = 1059.0
+        self.assertEqual('A', c.get('a'))
+        self.m_time.time.return_value = 1060.0
+        self.assertIsNone(c.get('a'))
+        self.assertEqual(0, len(c))
+
+    def test_ttl_clamps(self):
+        c = cache.TTLCache(size=10, min_ttl=30, max_ttl=120)
+        c.set('short', 'S', 1)
+        c.set('long', 'L', 86400)
+        self.m_time.time.return_value = 1029.0
+        self.assertEqual('S', c.get('short'))
+        self.m_time.time.return_value = 1119.0
+        self.assertIsNone(c.get('short'))
+        self.assertEqual('L', c.get('long'))
+        self.m_time.time.return_value = 1120.0
+        self.assertIsNone(c.get('long'))
+
+    def test_zero_ttl_not_stored(self):
+        c = cache.TTLCache(size=10)
+        c.set('a', 'A', 0)
+        self.assertEqual(0, len(c))
+
+    def test_disabled_with_zero_size(self):
+        c = cache.TTLCache(size=0)
+        c.set('a', 'A', 60)
+        self.assertIsNone(c.get('a'))
+
+    def test_evicts_least_recently_used(self):
+        c = cache.TTLCache(size=2)
+        c.set('a', 'A', 60)
+        c.set('b', 'B', 60)
+        self.assertEqual('A', c.get('a'))
+        c.set('c', 'C', 60)
+        self.assertIsNone(c.get('b'))
+        self.assertEqual('A', c.get('a'))
+        self.assertEqual('C', c.get('c'))
+        self.assertEqual(1, c.evictions)
+
+    def test_clear(self):
+        c = cache.TTLCache(size=2)
+        c.set('a', 'A', 60)
+        c.clear()
+        self.assertIsNone(c.get('a'))
+
+    def test_stale_within_grace(self):
+        c = cache.TTLCache(size=10, grace=30)
+        c.set('a', 'A', 60)
+        self.assertIsNone(c.get_stale('a'))
+        self.m_time.time.return_value = 1070.0
+        self.assertIsNone(c.get('a'))
+        self.assertEqual('A', c.get_stale('a'))
+        self.m_time.time.return_value = 1090.0
+        self.assertIsNone(c.get('a'))
+        self.assertIsNone(c.get_stale('a'))
+        self.assertEqual(0, len(c))
+        self.assertEqual(1, c.stale_hits)
+
+    def test_no_stale_without_grace(self):
+        c = cache.TTLCache(size=10)
+        c.set('a', 'A', 60)
+        self.m_time.time.return_value = 1060.0
+        self.assertIsNone(c.get_stale('a'))
@@ -0,0 +1,108 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import dns.exception
+import webob.exc
+
+from wafflehaus.dns_filter import cidr
+from wafflehaus.dns_filter import whitelist
+from wafflehaus import tests
+
+
+class TestCIDRSet(tests.TestCase):
+
+    def test_ipv4(self):
+        cidrs = cidr.CIDRSet(['10.0.0.0/8', '192.168.1.0/24', '172.16.0.1'])
+        self.assertTrue('10.1.2.3' in cidrs)
+        self.assertTrue('192.168.1.255' in cidrs)
+        self.assertTrue('172.16.0.1' in cidrs)
+        self.assertFalse('172.16.0.2' in cidrs)
+        self.assertFalse('192.168.2.0' in cidrs)
+        self.assertFalse('9.255.255.255' in cidrs)
+        self.assertFalse('11.0.0.0' in cidrs)
+
+    def test_ipv6(self):
+        cidrs = cidr.CIDRSet(['2001:db8::/32', '::1'])
+        self.assertTrue('2001:db8:1::5' in cidrs)
+        self.assertTrue('::1' in cidrs)
+        self.assertFalse('2001:db9::' in cidrs)
+        self.assertFalse('10.0.0.1' in cidrs)
+
+    def test_ipv4_mapped_ipv6(self):
+        cidrs = cidr.CIDRSet(['10.0.0.0/8'])
+        self.assertTrue('::ffff:10.0.0.1' in cidrs)
+
+    def test_host_bits_masked(self):
+        cidrs = cidr.CIDRSet(['10.0.0.5/24'])
+        self.assertTrue('10.0.0.200' in cidrs)
+
+    def test_overlapping_ranges_merged(self):
+        cidrs = cidr.CIDRSet(['10.0.0.0/24', '10.0.0.0/16', '10.0.1.0/24',
+                              '10.1.0.0/16'])
+        self.assertEqual(1, len(cidrs))
+        self.assertTrue('10.0.200.1' in cidrs)
+        self.assertTrue('10.1.255.255' in cidrs)
+        self.assertFalse('10.2.0.0' in cidrs)
+
+    def test_invalid(self):
+        cidrs = cidr.CIDRSet(['10.0.0.0/33', 'derp', '10.0.0.0/8'])
+        self.assertEqual(['10.0.0.0/33', 'derp'], cidrs.invalid)
+        self.assertFalse('derp' in cidrs)
+        self.assertFalse(None in cidrs)
+        self.assertTrue('10.0.0.1' in cidrs)
+
+    def test_empty(self):
+        self.assertFalse('10.0.0.1' in cidr.CIDRSet())
+
+
+class TestDNSFilterCIDRs(tests.TestCase):
+
+    def setUp(self):
+        super(TestDNSFilterCIDRs, self).setUp()
+        self.conf = {'whitelist': 'widget.com', 'enabled': 'true',
+                     'trusted_cidrs': '10.0.0.0/8 fd00::/8',
+                     'denied_cidrs': '10.66.0.0/16'}
+        self.m_resolver = self.create_patch(
+            'wafflehaus.dns_filter.whitelist.DNSWhitelist._create_resolver')
+        self.m_reverse = self.create_patch('dns.reversename.from_address')
+
+    def _request(self, conf, remote_addr):
+        result = whitelist.filter_factory(conf)(self.app)
+        return result.__call__.request('/widget', method='POST',
+                                       remote_addr=remote_addr)
+
+    def test_trusted_skips_dns(self):
+        resp = self._request(self.conf, '10.1.2.3')
+        self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+        resp = self._request(self.conf, 'fd00::1')
+        self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(0, self.m_resolver.call_count)
+        self.assertEqual(0, self.m_reverse.call_count)
+
+    def test_denied_skips_dns(self):
+        resp = self._request(self.conf, '10.66.1.1')
+        self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(0, self.m_resolver.call_count)
+
+    def test_denied_passes_while_testing(self):
+        conf = dict(self.conf, testing='true')
+        resp = self._request(conf, '10.66.1.1')
+        self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(0, self.m_resolver.call_count)
+
+    def test_other_addresses_use_dns(self):
+        self.m_reverse.side_effect = dns.exception.DNSException
+        resp = self._request(self.conf, '192.168.1.1')
+        self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(1, self.m_reverse.call_count)
@@ -0,0 +1,60 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import webob
+
+from wafflehaus.dns_filter import domains
+from wafflehaus.dns_filter import whitelist
+from wafflehaus import tests
+
+
+class TestDomainTrie(tests.TestCase):
+
+    def setUp(self):
+        super(TestDomainTrie, self).setUp()
+        self.trie = domains.DomainTrie(['rackspace.com', 'widget.co.uk',
+                                        'Example.ORG.'])
+
+    def test_domain_and_subdomains(self):
+        self.assertIn('rackspace.com', self.trie)
+        self.assertIn('rackspace.com.', self.trie)
+        self.assertIn('a.b.rackspace.com', self.trie)
+        self.assertIn('omg.widget.co.uk', self.trie)
+
+    def test_label_boundaries(self):
+        self.assertNotIn('evilrackspace.com', self.trie)
+        self.assertNotIn('rackspace.com.evil.net', self.trie)
+        self.assertNotIn('co.uk', self.trie)
+        self.assertNotIn('com', self.trie)
+
+    def test_case_insensitive(self):
+        self.assertIn('WWW.RackSpace.Com', self.trie)
+        self.assertIn('www.example.org', self.trie)
+
+    def test_empty_entries_ignored(self):
+        trie = domains.DomainTrie(['', '.', 'widget.com', 'widget.com'])
+        self.assertEqual(1, len(trie))
+        self.assertNotIn('other.com', trie)
+        self.assertNotIn('', trie)
+
+    def test_whitelist_override_recompiles(self):
+        conf = {'whitelist': 'widget.com', 'enabled': 'true',
+                'testing': 'true'}
+        result = whitelist.filter_factory(conf)(self.app)
+        self.assertTrue(result.check_domain_to_whitelist('omg.widget.com'))
+        self.assertFalse(result.check_domain_to_whitelist('omgwidget.com'))
+        headers = {'X_WAFFLEHAUS_DNSWHITELIST_WHITELIST': 'gadget.com'}
+        result._override(webob.Request.blank('/widget', headers=headers))
+        self.assertFalse(result.check_domain_to_whitelist('omg.widget.com'))
+        self.assertTrue(result.check_domain_to_whitelist('omg.gadget.com.'))
@@ -14,6 +14,7 @@
 #    under the License.
 import contextlib
 import dns.exception
+import dns.resolver
 import mock
 import webob.exc
 
@@ -63,6 +64,34 @@ class FakeResolver(object):
                 return FakeARecord(good=False)
 
 
+class CountingResolver(object):
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.queries = []
+
+    def query(self, value, record_type):
+        self.queries.append((str(value), record_type))
+        if record_type == 'PTR':
+            return tests.FakeAnswer(['derp.widget.com'], self.ttl)
+        return tests.FakeAnswer(['192.168.1.1'], self.ttl)
+
+
+class DeferredPool(object):
+    """Holds spawned work until the test runs it."""
+
+    def __init__(self):
+        self.spawned = []
+
+    def spawn_n(self, func, *args):
+        self.spawned.append((func, args))
+
+    def run(self):
+        spawned, self.spawned = self.spawned, []
+        for func, args in spawned:
+            func(*args)
+
+
 class TestDNSFilter(tests.TestCase):
 
     def setUp(self):
@@ -292,3 +321,220 @@ class TestDNSFilter(tests.TestCase):
             self.assertEqual(0, m_resolver_path.call_count)
             self.assertFalse(isinstance(resp,
                                         webob.exc.HTTPInternalServerError))
+
+    def test_records_cached_by_ttl(self):
+        conf = dict(self.conf, dns_verdict_cache_size='0')
+        result = whitelist.filter_factory(conf)(self.app)
+        resolver = CountingResolver()
+        m_time = self.create_patch('wafflehaus.dns_filter.cache.time')
+        m_time.time.return_value = 1000.0
+        with self._stubs(self.good_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_resolver_path.return_value = resolver
+            m_dns_reverse.return_value = 'omg.widget.com'
+            for i in range(3):
+                resp = result.__call__.request('/widget', method='POST')
+                self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+            self.assertEqual([('omg.widget.com', 'PTR'),
+                              ('derp.widget.com', 'A')], resolver.queries)
+            self.assertEqual(4, result.record_cache.hits)
+            m_time.time.return_value = 1300.0
+            resp = result.__call__.request('/widget', method='POST')
+            self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+            self.assertEqual(4, len(resolver.queries))
+
+    def test_records_not_cached_when_disabled(self):
+        conf = dict(self.conf, dns_cache_size='0',
+                    dns_verdict_cache_size='0')
+        result = whitelist.filter_factory(conf)(self.app)
+        resolver = CountingResolver()
+        with self._stubs(self.good_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_resolver_path.return_value = resolver
+            m_dns_reverse.return_value = 'omg.widget.com'
+            result.__call__.request('/widget', method='POST')
+            result.__call__.request('/widget', method='POST')
+            self.assertEqual(4, len(resolver.queries))
+
+    def test_record_ttl_clamped(self):
+        conf = dict(self.conf, dns_cache_max_ttl='10',
+                    dns_verdict_cache_size='0')
+        result = whitelist.filter_factory(conf)(self.app)
+        resolver = CountingResolver(ttl=300)
+        m_time = self.create_patch('wafflehaus.dns_filter.cache.time')
+        m_time.time.return_value = 1000.0
+        with self._stubs(self.good_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_resolver_path.return_value = resolver
+            m_dns_reverse.return_value = 'omg.widget.com'
+            result.__call__.request('/widget', method='POST')
+            m_time.time.return_value = 1010.0
+            result.__call__.request('/widget', method='POST')
+            self.assertEqual(4, len(resolver.queries))
+
+    def test_verdict_cached(self):
+        result = whitelist.filter_factory(self.conf)(self.app)
+        resolver = CountingResolver()
+        with self._stubs(self.good_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_resolver_path.return_value = resolver
+            m_dns_reverse.return_value = 'omg.widget.com'
+            for i in range(3):
+                resp = result.__call__.request('/widget', method='POST')
+                self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+            self.assertEqual(1, m_dns_reverse.call_count)
+            self.assertEqual(1, m_resolver_path.call_count)
+            self.assertEqual(2, len(resolver.queries))
+            self.assertEqual(2, result.verdict_cache.hits)
+
+    def test_denied_verdict_cached(self):
+        result = whitelist.filter_factory(self.conf)(self.app)
+        resolver = CountingResolver()
+        with self._stubs(self.bad_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_resolver_path.return_value = resolver
+            m_dns_reverse.return_value = 'omg.widget.com'
+            for i in range(2):
+                resp = result.__call__.request('/widget', method='POST')
+                self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+            self.assertEqual(1, m_dns_reverse.call_count)
+
+    def test_dns_failure_negatively_cached(self):
+        conf = dict(self.conf, dns_negative_ttl='20',
+                    dns_negative_jitter='0.5')
+        result = whitelist.filter_factory(conf)(self.app)
+        m_time = self.create_patch('wafflehaus.dns_filter.cache.time')
+        m_time.time.return_value = 1000.0
+        m_uniform = self.create_patch(
+            'wafflehaus.dns_filter.whitelist.random.uniform')
+        m_uniform.return_value = -4.0
+        with self._stubs(self.good_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_dns_reverse.side_effect = dns.exception.DNSException
+            resp = result.__call__.request('/widget', method='POST')
+            self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+            m_uniform.assert_called_once_with(-10.0, 10.0)
+            m_time.time.return_value = 1015.0
+            resp = result.__call__.request('/widget', method='POST')
+            self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+            self.assertEqual(1, m_dns_reverse.call_count)
+            m_time.time.return_value = 1016.0
+            result.__call__.request('/widget', method='POST')
+            self.assertEqual(2, m_dns_reverse.call_count)
+
+    def test_verdicts_cleared_on_whitelist_override(self):
+        self.set_reconfigure()
+        result = whitelist.filter_factory(self.conf)(self.app)
+        resolver = CountingResolver()
+        with self._stubs(self.good_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_resolver_path.return_value = resolver
+            m_dns_reverse.return_value = 'omg.widget.com'
+            result.__call__.request('/widget', method='POST')
+            self.assertEqual(1, len(result.verdict_cache))
+            headers = {'X_WAFFLEHAUS_DNSWHITELIST_WHITELIST': 'widget.com'}
+            result.__call__.request('/widget', method='POST',
+                                    headers=headers)
+            self.assertEqual(1, m_dns_reverse.call_count)
+            headers = {'X_WAFFLEHAUS_DNSWHITELIST_WHITELIST': 'other.com'}
+            resp = result.__call__.request('/widget', method='POST',
+                                           headers=headers)
+            self.assertEqual(2, m_dns_reverse.call_count)
+            self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+
+    def test_stale_verdict_served_while_refreshing(self):
+        conf = dict(self.conf, dns_stale_grace='60')
+        result = whitelist.filter_factory(conf)(self.app)
+        pool = result.refresh_pool = DeferredPool()
+        resolver = CountingResolver(ttl=300)
+        m_time = self.create_patch('wafflehaus.dns_filter.cache.time')
+        m_time.time.return_value = 1000.0
+        with self._stubs(self.good_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_resolver_path.return_value = resolver
+            m_dns_reverse.return_value = 'omg.widget.com'
+            result.__call__.request('/widget', method='POST')
+            self.assertEqual(2, len(resolver.queries))
+
+            m_time.time.return_value = 1310.0
+            for i in range(3):
+                resp = result.__call__.request('/widget', method='POST')
+                self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+            self.assertEqual(2, len(resolver.queries))
+            self.assertEqual(1, len(pool.spawned))
+
+            pool.run()
+            self.assertEqual(4, len(resolver.queries))
+            self.assertEqual(0, len(result._refreshing))
+            result.__call__.request('/widget', method='POST')
+            self.assertEqual(0, len(pool.spawned))
+            self.assertEqual(4, len(resolver.queries))
+
+    def _stale_refresh(self, error):
+        """Serves a stale verdict and refreshes it with a failing resolver.
+
+        Returns the response to the request after the refresh.
+        """
+        conf = dict(self.conf, dns_stale_grace='60')
+        result = whitelist.filter_factory(conf)(self.app)
+        pool = result.refresh_pool = DeferredPool()
+        m_time = self.create_patch('wafflehaus.dns_filter.cache.time')
+        m_time.time.return_value = 1000.0
+        with self._stubs(self.good_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_resolver_path.return_value = CountingResolver(ttl=300)
+            m_dns_reverse.return_value = 'omg.widget.com'
+            result.__call__.request('/widget', method='POST')
+
+            m_time.time.return_value = 1310.0
+            resolver = m_resolver_path.return_value = mock.Mock()
+            resolver.query.side_effect = error
+            resp = result.__call__.request('/widget', method='POST')
+            self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+            pool.run()
+            self.assertEqual(1, resolver.query.call_count)
+            return result.__call__.request('/widget', method='POST')
+
+    def test_stale_verdict_kept_when_refresh_fails(self):
+        for error in (dns.exception.Timeout(),
+                      dns.resolver.NoNameservers()):
+            resp = self._stale_refresh(error)
+            self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+
+    def test_stale_verdict_replaced_when_name_gone(self):
+        resp = self._stale_refresh(dns.resolver.NXDOMAIN())
+        self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+
+    def test_stale_verdict_not_served_after_grace(self):
+        conf = dict(self.conf, dns_stale_grace='60')
+        result = whitelist.filter_factory(conf)(self.app)
+        pool = result.refresh_pool = DeferredPool()
+        resolver = CountingResolver(ttl=300)
+        m_time = self.create_patch('wafflehaus.dns_filter.cache.time')
+        m_time.time.return_value = 1000.0
+        with self._stubs(self.good_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_resolver_path.return_value = resolver
+            m_dns_reverse.return_value = 'omg.widget.com'
+            result.__call__.request('/widget', method='POST')
+            m_time.time.return_value = 1360.0
+            result.__call__.request('/widget', method='POST')
+            self.assertEqual(4, len(resolver.queries))
+            self.assertEqual(0, len(pool.spawned))
+
+    def test_stale_denial_resolved_in_request(self):
+        conf = dict(self.conf, dns_stale_grace='60')
+        result = whitelist.filter_factory(conf)(self.app)
+        pool = result.refresh_pool = DeferredPool()
+        m_time = self.create_patch('wafflehaus.dns_filter.cache.time')
+        m_time.time.return_value = 1000.0
+        result.set_verdict(self.good_ip, False, 30)
+        m_time.time.return_value = 1040.0
+        with self._stubs(self.good_ip, None, None) as (
+                m_address_path, m_resolver_path, m_dns_reverse):
+            m_resolver_path.return_value = CountingResolver()
+            m_dns_reverse.return_value = 'omg.widget.com'
+            resp = result.__call__.request('/widget', method='POST')
+            self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+            self.assertEqual(1, m_dns_reverse.call_count)
+            self.assertEqual(0, len(pool.spawned))
@@ -0,0 +1,128 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import dns.exception
+import dns.resolver
+import webob.exc
+
+from wafflehaus.dns_filter import forward
+from wafflehaus.dns_filter import whitelist
+from wafflehaus import tests
+
+
+class HostResolver(object):
+
+    def __init__(self, hosts):
+        self.hosts = hosts
+        self.queries = 0
+
+    def query(self, hostname, rdtype):
+        self.queries += 1
+        answer = self.hosts.get((hostname, rdtype))
+        if isinstance(answer, Exception):
+            raise answer
+        if answer is None:
+            raise dns.resolver.NoAnswer()
+        return answer
+
+
+class TestForwardAllowlist(tests.TestCase):
+
+    def setUp(self):
+        super(TestForwardAllowlist, self).setUp()
+        self.hosts = {('api.widget.com', 'A'): ['10.0.0.1', '10.0.0.2'],
+                      ('api.widget.com', 'AAAA'): ['2001:DB8:0:0::1'],
+                      ('db.widget.com', 'A'): ['10.0.0.3']}
+        self.resolver = HostResolver(self.hosts)
+
+    def _allowlist(self):
+        allowlist = forward.ForwardAllowlist(
+            ['api.widget.com', 'db.widget.com', 'gone.widget.com'],
+            lambda: self.resolver)
+        allowlist.refresh()
+        return allowlist
+
+    def test_expands_hostnames(self):
+        allowlist = self._allowlist()
+        self.assertEqual(4, len(allowlist))
+        self.assertEqual('api.widget.com', allowlist.get('10.0.0.2'))
+        self.assertEqual('api.widget.com', allowlist.get('2001:db8::1'))
+        self.assertEqual('db.widget.com', allowlist.get('10.0.0.3'))
+        self.assertIsNone(allowlist.get('10.0.0.4'))
+        self.assertIsNone(allowlist.get(None))
+
+    def test_refresh_replaces_addresses(self):
+        allowlist = self._allowlist()
+        self.hosts[('db.widget.com', 'A')] = ['10.0.0.9']
+        allowlist.refresh()
+        self.assertIsNone(allowlist.get('10.0.0.3'))
+        self.assertEqual('db.widget.com', allowlist.get('10.0.0.9'))
+
+    def test_failed_hostname_keeps_addresses(self):
+        allowlist = self._allowlist()
+        self.hosts[('db.widget.com', 'A')] = dns.exception.Timeout()
+        allowlist.refresh()
+        self.assertEqual('db.widget.com', allowlist.get('10.0.0.3'))
+
+    def test_missing_hostname_dropped(self):
+        allowlist = self._allowlist()
+        self.hosts[('db.widget.com', 'A')] = dns.resolver.NXDOMAIN()
+        allowlist.refresh()
+        self.assertIsNone(allowlist.get('10.0.0.3'))
+
+
+class TestDNSFilterAllowedHosts(tests.TestCase):
+
+    def setUp(self):
+        super(TestDNSFilterAllowedHosts, self).setUp()
+        self.resolver = HostResolver({('api.widget.com', 'A'): ['10.0.0.1']})
+        m_create = self.create_patch(
+            'wafflehaus.dns_filter.whitelist.DNSWhitelist._create_resolver')
+        m_create.return_value = self.resolver
+        self.m_reverse = self.create_patch('dns.reversename.from_address')
+        self.m_reverse.side_effect = dns.exception.DNSException
+        self.conf = {'enabled': 'true', 'allowed_hosts': 'api.widget.com',
+                     'allowed_hosts_refresh': '3600'}
+
+    def _request(self, conf, remote_addr):
+        result = whitelist.filter_factory(conf)(self.app)
+        self.addCleanup(result.allowed_hosts_refresher.stop)
+        resp = result.__call__.request('/widget', method='POST',
+                                       remote_addr=remote_addr)
+        return result, resp
+
+    def test_allowed_host_passes_without_lookups(self):
+        result, resp = self._request(self.conf, '10.0.0.1')
+        self.assertFalse(isinstance(resp, webob.exc.HTTPException))
+        self.assertEqual(2, self.resolver.queries)
+        self.assertEqual(0, self.m_reverse.call_count)
+
+    def test_refresher_started_by_request(self):
+        result = whitelist.filter_factory(self.conf)(self.app)
+        self.addCleanup(result.allowed_hosts_refresher.stop)
+        self.assertFalse(result.allowed_hosts_refresher.is_alive())
+        result.__call__.request('/widget', method='POST',
+                                remote_addr='10.0.0.1')
+        self.assertTrue(result.allowed_hosts_refresher.is_alive())
+
+    def test_other_hosts_refused_without_whitelist(self):
+        result, resp = self._request(self.conf, '10.0.0.2')
+        self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(0, self.m_reverse.call_count)
+
+    def test_other_hosts_use_whitelist(self):
+        conf = dict(self.conf, whitelist='widget.com')
+        result, resp = self._request(conf, '10.0.0.2')
+        self.assertTrue(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(1, self.m_reverse.call_count)
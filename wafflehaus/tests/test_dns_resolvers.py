@@ -0,0 +1,163 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import threading
+import time
+
+import dns.exception
+import dns.resolver
+import mock
+
+from wafflehaus.dns_filter import resolvers
+from wafflehaus.dns_filter import whitelist
+from wafflehaus import tests
+
+
+class SlowResolver(object):
+
+    def __init__(self, answer=None, error=None, delay=0, lifetime=5.0):
+        self.answer = answer
+        self.error = error
+        self.delay = delay
+        self.lifetime = lifetime
+        self.released = threading.Event()
+
+    def query(self, qname, rdtype):
+        if self.delay:
+            self.released.wait(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.answer
+
+
+class TestRacingResolver(tests.TestCase):
+
+    def test_first_answer_wins(self):
+        slow = SlowResolver(answer='slow', delay=10)
+        self.addCleanup(slow.released.set)
+        fast = SlowResolver(answer='fast')
+        racer = resolvers.RacingResolver([slow, fast])
+        start = time.time()
+        self.assertEqual('fast', racer.query('name', 'PTR'))
+        self.assertTrue(time.time() - start < 5)
+
+    def test_failures_wait_for_an_answer(self):
+        broken = SlowResolver(error=dns.exception.Timeout())
+        late = SlowResolver(answer='late', delay=0.05)
+        racer = resolvers.RacingResolver([broken, late])
+        self.assertEqual('late', racer.query('name', 'PTR'))
+
+    def test_all_fail(self):
+        racer = resolvers.RacingResolver(
+            [SlowResolver(error=dns.exception.Timeout()),
+             SlowResolver(error=dns.resolver.NoNameservers())])
+        self.assertRaises(dns.exception.DNSException, racer.query,
+                          'name', 'PTR')
+
+    def test_nxdomain_is_final(self):
+        slow = SlowResolver(answer='slow', delay=10)
+        self.addCleanup(slow.released.set)
+        racer = resolvers.RacingResolver(
+            [slow, SlowResolver(error=dns.resolver.NXDOMAIN())])
+        self.assertRaises(dns.resolver.NXDOMAIN, racer.query, 'name', 'PTR')
+
+    def test_times_out(self):
+        slow = SlowResolver(answer='slow', delay=10)
+        self.addCleanup(slow.released.set)
+        racer = resolvers.RacingResolver([slow], lifetime=0.05)
+        self.assertRaises(dns.exception.Timeout, racer.query, 'name', 'PTR')
+
+    def test_unexpected_errors_become_dns_errors(self):
+        racer = resolvers.RacingResolver([SlowResolver(error=IOError())])
+        self.assertRaises(dns.exception.DNSException, racer.query,
+                          'name', 'PTR')
+
+    def test_slow_nameserver_does_not_hold_later_queries(self):
+        slow = SlowResolver(answer='slow', delay=10)
+        self.addCleanup(slow.released.set)
+        racer = resolvers.RacingResolver([slow, SlowResolver(answer='fast')])
+        for i in range(8):
+            start = time.time()
+            self.assertEqual('fast', racer.query('name', 'PTR'))
+            self.assertTrue(time.time() - start < 1)
+
+    def test_resolvers_limited_to_lifetime(self):
+        slow = SlowResolver(answer='slow', delay=10, lifetime=30.0)
+        self.addCleanup(slow.released.set)
+        fast = SlowResolver(answer='fast', lifetime=30.0)
+        racer = resolvers.RacingResolver([slow, fast])
+        racer.lifetime = 0.5
+        self.assertEqual('fast', racer.query('name', 'PTR'))
+        self.assertEqual([0.5, 0.5], [slow.lifetime, fast.lifetime])
+
+    def test_spawns_green_thread_when_patched(self):
+        m_eventlet = mock.Mock()
+        m_eventlet.patcher.is_monkey_patched.return_value = True
+        func = mock.Mock()
+        with mock.patch.object(resolvers, 'eventlet', m_eventlet):
+            resolvers.spawn_n(func, 'arg')
+        m_eventlet.spawn_n.assert_called_once_with(func, 'arg')
+        self.assertFalse(func.called)
+
+    def test_thread_pool_without_eventlet(self):
+        with mock.patch.object(resolvers, 'eventlet', None):
+            self.assertTrue(isinstance(resolvers.create_pool(1),
+                                       resolvers.ThreadPool))
+
+    def test_thread_pool_started_per_process(self):
+        m_os = self.create_patch('wafflehaus.dns_filter.resolvers.os')
+        m_os.getpid.return_value = 100
+        pool = resolvers.ThreadPool(1)
+        self.assertIsNone(pool._tasks)
+        done = threading.Event()
+        pool.spawn_n(done.set)
+        self.assertTrue(done.wait(5))
+        first = pool._tasks
+
+        m_os.getpid.return_value = 101
+        done.clear()
+        pool.spawn_n(done.set)
+        self.assertTrue(done.wait(5))
+        self.assertIsNot(first, pool._tasks)
+
+    def test_green_pool_when_patched(self):
+        m_eventlet = mock.Mock()
+        m_eventlet.patcher.is_monkey_patched.return_value = True
+        with mock.patch.object(resolvers, 'eventlet', m_eventlet):
+            pool = resolvers.create_pool(8)
+        self.assertEqual(m_eventlet.GreenPool.return_value, pool)
+        m_eventlet.GreenPool.assert_called_once_with(8)
+
+    def test_whitelist_races_nameservers(self):
+        conf = {'whitelist': 'widget.com', 'enabled': 'true',
+                'dns_resolution': 'race',
+                'nameserver': '10.0.0.53 10.0.1.53'}
+        result = whitelist.filter_factory(conf)(self.app)
+        res = result._create_resolver()
+        self.assertTrue(isinstance(res, resolvers.RacingResolver))
+        self.assertEqual([['10.0.0.53'], ['10.0.1.53']],
+                         [r.nameservers for r in res.resolvers])
+
+    def test_whitelist_serial_nameservers(self):
+        conf = {'whitelist': 'widget.com', 'enabled': 'true',
+                'nameserver': '10.0.0.53 10.0.1.53'}
+        result = whitelist.filter_factory(conf)(self.app)
+        res = result._create_resolver()
+        self.assertEqual(['10.0.0.53', '10.0.1.53'], res.nameservers)
+
+    def test_whitelist_unknown_resolution(self):
+        conf = {'whitelist': 'widget.com', 'enabled': 'true',
+                'dns_resolution': 'racing'}
+        self.assertRaises(ValueError, whitelist.filter_factory(conf),
+                          self.app)
@@ -0,0 +1,162 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+
+import mock
+import webob.exc
+
+from wafflehaus.dns_filter import shared
+from wafflehaus.dns_filter import whitelist
+from wafflehaus import tests
+
+
+class SharedCountingResolver(object):
+    """Counts queries in memory shared with the parent process."""
+
+    def __init__(self, counter):
+        self.counter = counter
+
+    def query(self, value, record_type):
+        with self.counter.get_lock():
+            self.counter.value += 1
+        if record_type == 'PTR':
+            return tests.FakeAnswer(['derp.widget.com'])
+        return tests.FakeAnswer(['192.168.1.1'])
+
+
+def _worker(conf, counter, results, index):
+    result = whitelist.filter_factory(conf)(mock.Mock())
+    result._create_resolver = lambda: SharedCountingResolver(counter)
+    result.get_remote_addr = lambda req: '192.168.1.1'
+    resp = result.__call__.request('/widget', method='POST')
+    results[index] = 0 if isinstance(resp, webob.exc.HTTPForbidden) else 1
+
+
+class TestSharedVerdictStore(tests.TestCase):
+
+    def setUp(self):
+        super(TestSharedVerdictStore, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'verdicts')
+
+    def _store(self, slots=16):
+        store = shared.SharedVerdictStore(self.path, slots=slots)
+        self.addCleanup(store.close)
+        return store
+
+    def test_get_set(self):
+        store = self._store()
+        self.assertIsNone(store.get('10.0.0.1'))
+        store.set('10.0.0.1', True, 60)
+        store.set('10.0.0.2', False, 60)
+        allowed, remaining = store.get('10.0.0.1')
+        self.assertTrue(allowed)
+        self.assertTrue(0 < remaining <= 60)
+        self.assertFalse(store.get('10.0.0.2')[0])
+
+    def test_expired(self):
+        store = self._store()
+        m_time = self.create_patch('wafflehaus.dns_filter.shared.time')
+        m_time.time.return_value = 1000.0
+        store.set('10.0.0.1', True, 60)
+        m_time.time.return_value = 1060.0
+        self.assertIsNone(store.get('10.0.0.1'))
+
+    def test_slot_collision_replaces(self):
+        store = self._store(slots=1)
+        store.set('10.0.0.1', True, 60)
+        store.set('10.0.0.2', True, 60)
+        self.assertIsNone(store.get('10.0.0.1'))
+        self.assertTrue(store.get('10.0.0.2')[0])
+
+    def test_slot_being_written_is_a_miss(self):
+        store = self._store()
+        store.set('10.0.0.1', True, 60)
+        offset = store._offset('10.0.0.1')
+        version = struct.unpack_from('<I', store._map, offset)[0]
+        self.assertEqual(0, version % 2)
+        struct.pack_into('<I', store._map, offset, version + 1)
+        self.assertIsNone(store.get('10.0.0.1'))
+
+    def test_slot_written_while_read_is_a_miss(self):
+        store = self._store()
+        store.set('10.0.0.1', True, 60)
+        real = shared._SLOT
+
+        class Racing(object):
+            """Lands a write for another key while the slot is read."""
+            size = real.size
+
+            def unpack_from(self, buf, offset):
+                values = real.unpack_from(buf, offset)
+                struct.pack_into('<I', buf, offset, values[0] + 2)
+                return values
+
+        with mock.patch.object(shared, '_SLOT', Racing()):
+            self.assertIsNone(store.get('10.0.0.1'))
+        self.assertTrue(store.get('10.0.0.1')[0])
+
+    def test_shared_between_opens(self):
+        self._store().set('10.0.0.1', True, 60)
+        self.assertTrue(self._store().get('10.0.0.1')[0])
+
+    def test_reset_when_layout_changes(self):
+        self._store(slots=16).set('10.0.0.1', True, 60)
+        store = self._store(slots=32)
+        self.assertIsNone(store.get('10.0.0.1'))
+        self.assertEqual(store.size, os.path.getsize(self.path))
+
+    def test_long_keys_not_stored(self):
+        store = self._store()
+        store.set('x' * 65, True, 60)
+        self.assertIsNone(store.get('x' * 65))
+
+    def test_one_resolution_serves_all_workers(self):
+        conf = {'whitelist': 'widget.com', 'enabled': 'true',
+                'dns_shared_store': self.path}
+        counter = multiprocessing.Value('i', 0)
+        results = multiprocessing.Array('i', [0] * 4)
+        with mock.patch('dns.reversename.from_address') as m_reverse:
+            m_reverse.return_value = 'omg.widget.com'
+            first = multiprocessing.Process(
+                target=_worker, args=(conf, counter, results, 0))
+            first.start()
+            first.join()
+            workers = [multiprocessing.Process(
+                target=_worker, args=(conf, counter, results, i))
+                for i in range(1, 4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(2, counter.value)
+        self.assertEqual([1, 1, 1, 1], list(results))
+
+    def test_verdict_not_shared_across_whitelists(self):
+        conf = {'whitelist': 'widget.com', 'enabled': 'true',
+                'dns_shared_store': self.path}
+        first = whitelist.filter_factory(conf)(mock.Mock())
+        first.set_verdict('192.168.1.1', True, 60)
+        conf = dict(conf, whitelist='other.com')
+        second = whitelist.filter_factory(conf)(mock.Mock())
+        self.assertIsNone(second.get_verdict('192.168.1.1'))
+        conf = dict(conf, whitelist='widget.com')
+        third = whitelist.filter_factory(conf)(mock.Mock())
+        self.assertTrue(third.get_verdict('192.168.1.1'))
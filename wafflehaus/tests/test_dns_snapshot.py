@@ -0,0 +1,161 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+import shutil
+import tempfile
+import threading
+
+import mock
+import webob.exc
+
+from wafflehaus.dns_filter import periodic
+from wafflehaus.dns_filter import snapshot
+from wafflehaus.dns_filter import whitelist
+from wafflehaus import tests
+
+
+class TestSnapshot(tests.TestCase):
+
+    def setUp(self):
+        super(TestSnapshot, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'dns.snapshot')
+        self.conf = {'whitelist': 'widget.com', 'enabled': 'true',
+                     'dns_snapshot': self.path,
+                     'dns_snapshot_interval': '3600'}
+        self.m_time = self.create_patch('wafflehaus.dns_filter.cache.time')
+        self.m_time.time.return_value = 1000.0
+        m_snapshot_time = self.create_patch(
+            'wafflehaus.dns_filter.snapshot.time')
+        m_snapshot_time.time = self.m_time.time
+
+    def _filter(self, conf=None):
+        result = whitelist.filter_factory(conf or self.conf)(self.app)
+        self.addCleanup(result.snapshot_writer.stop)
+        return result
+
+    def test_dump_load(self):
+        answer = snapshot.SnapshotAnswer(['192.168.1.1'])
+        snapshot.dump(self.path, 'tag', [('192.168.1.1', True, 1300.0)],
+                      [(('derp.widget.com', 'A'), answer, 1300.0)])
+        tag, verdicts, records = snapshot.load(self.path)
+        self.assertEqual('tag', tag)
+        self.assertEqual([('192.168.1.1', True, 1300.0)], verdicts)
+        (key, loaded, expires), = records
+        self.assertEqual(('derp.widget.com', 'A'), key)
+        self.assertEqual(['192.168.1.1'], list(loaded.rrset))
+        self.assertEqual(300, loaded.rrset.ttl)
+        self.assertEqual(1300.0, expires)
+
+    def test_load_missing_or_corrupt(self):
+        self.assertEqual((None, [], []), snapshot.load(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{"version":')
+        self.assertEqual((None, [], []), snapshot.load(self.path))
+
+    def test_warm_start(self):
+        first = self._filter()
+        first.set_verdict('192.168.1.1', True, 300)
+        first.set_verdict('10.0.0.1', False, 100)
+        first.record_cache.set(('derp.widget.com', 'A'),
+                               snapshot.SnapshotAnswer(['192.168.1.1']), 300)
+        first.write_snapshot()
+
+        self.m_time.time.return_value = 1200.0
+        second = self._filter()
+        self.assertEqual(1, len(second.verdict_cache))
+        self.assertEqual(1, len(second.record_cache))
+        m_resolver = self.create_patch(
+            'wafflehaus.dns_filter.whitelist.DNSWhitelist._create_resolver')
+        m_addr = self.create_patch(
+            'wafflehaus.dns_filter.whitelist.DNSWhitelist.get_remote_addr')
+        m_addr.return_value = '192.168.1.1'
+        resp = second.__call__.request('/widget', method='POST')
+        self.assertFalse(isinstance(resp, webob.exc.HTTPForbidden))
+        self.assertEqual(0, m_resolver.call_count)
+
+        self.m_time.time.return_value = 1300.0
+        third = self._filter()
+        self.assertEqual(0, len(third.verdict_cache))
+        self.assertEqual(0, len(third.record_cache))
+
+    def test_verdict_from_snapshot_records_is_cached(self):
+        first = self._filter()
+        first.record_cache.set(('omg.widget.com', 'PTR'),
+                               snapshot.SnapshotAnswer(['derp.widget.com']),
+                               300)
+        first.record_cache.set(('derp.widget.com', 'A'),
+                               snapshot.SnapshotAnswer(['192.168.1.1']), 300)
+        first.write_snapshot()
+
+        self.m_time.time.return_value = 1200.0
+        second = self._filter()
+        self.assertEqual(0, len(second.verdict_cache))
+        m_resolver = self.create_patch(
+            'wafflehaus.dns_filter.whitelist.DNSWhitelist._create_resolver')
+        m_reverse = self.create_patch('dns.reversename.from_address')
+        m_reverse.return_value = 'omg.widget.com'
+        self.assertEqual((True, 100), second.check_address('192.168.1.1'))
+        self.assertEqual(0, m_resolver.return_value.query.call_count)
+
+    def test_verdicts_dropped_for_other_whitelist(self):
+        first = self._filter()
+        first.set_verdict('192.168.1.1', True, 300)
+        first.record_cache.set(('derp.widget.com', 'A'),
+                               snapshot.SnapshotAnswer(['192.168.1.1']), 300)
+        first.write_snapshot()
+        second = self._filter(dict(self.conf, whitelist='other.com'))
+        self.assertEqual(0, len(second.verdict_cache))
+        self.assertEqual(1, len(second.record_cache))
+
+    def test_write_failure_logged(self):
+        conf = dict(self.conf,
+                    dns_snapshot=os.path.join(self.tmpdir, 'no', 'snap'))
+        result = self._filter(conf)
+        with mock.patch.object(result, 'log') as m_log:
+            result.write_snapshot()
+            self.assertEqual(1, m_log.error.call_count)
+
+    def test_writer_runs_periodically(self):
+        written = threading.Event()
+        writer = periodic.PeriodicTask(written.set, 0.01)
+        writer.start()
+        self.assertTrue(written.wait(5))
+        writer.stop()
+        writer.join(5)
+        self.assertFalse(writer.is_alive())
+
+    def test_writer_started_by_request(self):
+        result = self._filter()
+        result.set_verdict('10.0.0.1', True, 300)
+        self.assertFalse(result.snapshot_writer.is_alive())
+        result.__call__.request('/widget', method='POST',
+                                remote_addr='10.0.0.1')
+        self.assertTrue(result.snapshot_writer.is_alive())
+
+    def test_writer_started_again_after_fork(self):
+        writer = periodic.PeriodicTask(lambda: None, 3600)
+        self.addCleanup(writer.stop)
+        m_getpid = self.create_patch('wafflehaus.dns_filter.periodic.os')
+        m_getpid.getpid.return_value = 100
+        writer.start()
+        first = writer._thread
+        writer.start()
+        self.assertIs(first, writer._thread)
+        m_getpid.getpid.return_value = 101
+        writer.start()
+        self.assertIsNot(first, writer._thread)
+        self.assertTrue(writer.is_alive())
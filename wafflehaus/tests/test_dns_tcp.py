@@ -0,0 +1,154 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import socket
+import struct
+import threading
+
+import dns.exception
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.resolver
+import dns.rrset
+
+from wafflehaus.dns_filter import tcp
+from wafflehaus.dns_filter import whitelist
+from wafflehaus import tests
+
+
+class TCPNameserver(object):
+    """Answers DNS queries over TCP from a dict of records."""
+
+    def __init__(self, records, close_after_answer=False):
+        self.records = records
+        self.close_after_answer = close_after_answer
+        self.hang_up = False
+        self.connections = 0
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(8)
+        self.port = self.sock.getsockname()[1]
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.error:
+                return
+            self.connections += 1
+            thread = threading.Thread(target=self._serve, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, conn):
+        try:
+            while not self.hang_up:
+                header = conn.recv(2)
+                if len(header) < 2:
+                    return
+                length, = struct.unpack('!H', header)
+                query = dns.message.from_wire(tcp._recv(conn, length))
+                self.queries += 1
+                wire = self._answer(query).to_wire()
+                conn.sendall(struct.pack('!H', len(wire)) + wire)
+                if self.close_after_answer:
+                    return
+        except (socket.error, EOFError):
+            return
+        finally:
+            conn.close()
+
+    def _answer(self, query):
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        key = (question.name.to_text(), dns.rdatatype.to_text(question.rdtype))
+        values = self.records.get(key)
+        if values is None:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        else:
+            response.answer.append(dns.rrset.from_text(
+                question.name, 300, 'IN', question.rdtype, *values))
+        return response
+
+    def close(self):
+        self.sock.close()
+
+
+class TestTCPResolver(tests.TestCase):
+
+    def setUp(self):
+        super(TestTCPResolver, self).setUp()
+        self.records = {('derp.widget.com.', 'A'): ['192.168.1.1'],
+                        ('1.1.168.192.in-addr.arpa.', 'PTR'):
+                        ['derp.widget.com.']}
+        self.server = TCPNameserver(self.records)
+        self.addCleanup(self.server.close)
+        self.pool = tcp.ConnectionPool(size=2)
+        self.addCleanup(self.pool.clear)
+        self.resolver = tcp.TCPResolver(['127.0.0.1'], self.pool,
+                                        port=self.server.port, lifetime=5)
+
+    def test_answers(self):
+        answer = self.resolver.query('derp.widget.com', 'A')
+        self.assertEqual(['192.168.1.1'], [str(v) for v in answer])
+        self.assertEqual(300, answer.rrset.ttl)
+
+    def test_connection_reused(self):
+        for i in range(5):
+            self.resolver.query('derp.widget.com', 'A')
+        self.assertEqual(5, self.server.queries)
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(1, self.pool.connects)
+
+    def test_closed_connection_retried(self):
+        self.server.close_after_answer = True
+        for i in range(3):
+            answer = self.resolver.query('derp.widget.com', 'A')
+            self.assertEqual(['192.168.1.1'], [str(v) for v in answer])
+        self.assertEqual(3, self.server.connections)
+
+    def test_nxdomain(self):
+        self.assertRaises(dns.resolver.NXDOMAIN, self.resolver.query,
+                          'nope.widget.com', 'A')
+
+    def test_no_nameservers(self):
+        self.server.hang_up = True
+        self.assertRaises(dns.resolver.NoNameservers, self.resolver.query,
+                          'derp.widget.com', 'A')
+
+    def test_whitelist_over_tcp(self):
+        # The whitelist is matched against the reverse name
+        conf = {'whitelist': '168.192.in-addr.arpa', 'enabled': 'true',
+                'nameserver': '127.0.0.1', 'dns_transport': 'tcp',
+                'nameserver_port': str(self.server.port),
+                'dns_verdict_cache_size': '0', 'dns_cache_size': '0'}
+        result = whitelist.filter_factory(conf)(self.app)
+        self.assertEqual((True, 300), result.check_address('192.168.1.1'))
+        self.assertEqual(True, result.check_address('192.168.1.1')[0])
+        self.assertEqual(4, self.server.queries)
+        self.assertEqual(1, self.server.connections)
+        self.assertTrue(result._create_resolver() is
+                        result._create_resolver())
+
+    def test_whitelist_unknown_transport(self):
+        conf = {'whitelist': 'widget.com', 'enabled': 'true',
+                'dns_transport': 'TCP'}
+        self.assertRaises(ValueError, whitelist.filter_factory(conf),
+                          self.app)
@@ -0,0 +1,126 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import json
+import shutil
+import tempfile
+
+import webob
+
+from wafflehaus.dns_filter import whitelist
+from wafflehaus import edit_response
+from wafflehaus.log_filters import req_resp
+from wafflehaus.pagination import pagination
+from wafflehaus.payload_filter import unset_key
+from wafflehaus.resource_filter import alias
+from wafflehaus.resource_filter import block_resource
+from wafflehaus import tests
+from wafflehaus.try_context import context_filter
+
+LINKS = json.dumps(
+    {"networks": [{"id": "net"}],
+     "networks_links": [{"href": "http://localhost:9696/v2.0/networks",
+                         "rel": "next"}]})
+
+RESPONSES = {
+    "links": dict(body=LINKS),
+    "no links": dict(body='{"network": {"id": "net"}}'),
+    "list": dict(body='[1, 2, 3]'),
+    "not found": dict(status='404 Not Found', body='{"error": "gone"}'),
+    "server error": dict(status='500 Internal Server Error', body=LINKS),
+    "not json": dict(body='<html></html>', content_type='text/html'),
+    "bad json": dict(body='{"networks": [', content_type='application/json'),
+    "empty": dict(body=''),
+}
+
+
+class TestDownstreamCalls(tests.TestCase):
+    """Every waffle calls the app it wraps at most once per request."""
+
+    def setUp(self):
+        super(TestDownstreamCalls, self).setUp()
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        self.factories = {
+            "edit_response": edit_response.filter_factory(
+                {"enabled": "true",
+                 "filters": "status name",
+                 "status_resource": "GET /v2.0/networks",
+                 "status_key": "http_status_code",
+                 "status_value": "replace_if:404:200",
+                 "name_resource": "GET /v2.0/networks",
+                 "name_key": "id",
+                 "name_value": "hidden"}),
+            "edit_response streaming": edit_response.filter_factory(
+                {"enabled": "true",
+                 "streaming": "true",
+                 "filters": "name",
+                 "name_resource": "GET /v2.0/networks",
+                 "name_key": "id"}),
+            "pagination": pagination.filter_factory(
+                {"enabled": "true",
+                 "pagination_url": "https://example.com"}),
+            "default_payload": unset_key.filter_factory(
+                {"enabled": "true",
+                 "resource": "GET /v2.0/networks",
+                 "defaults": "network:admin_state_up=true"}),
+            "alias": alias.filter_factory(
+                {"enabled": "true",
+                 "resource": "GET /v2.0/other",
+                 "action": "addslash"}),
+            "block_resource": block_resource.filter_factory(
+                {"enabled": "true",
+                 "resource": "GET /v2.0/other"}),
+            "context": context_filter.filter_factory(
+                {"enabled": "true",
+                 "context_key": "context"}),
+            "dns_whitelist": whitelist.filter_factory(
+                {"enabled": "true",
+                 "whitelist": "example.com",
+                 "trusted_cidrs": "127.0.0.0/8"}),
+            "req_resp_logger": req_resp.filter_factory(
+                {"enabled": "true",
+                 "log_file": "%s/requests.log" % log_dir}),
+        }
+
+    def _request(self):
+        req = webob.Request.blank("/v2.0/networks", method="GET")
+        req.remote_addr = "127.0.0.1"
+        return req
+
+    def test_app_called_once(self):
+        for name, factory in self.factories.items():
+            for kind, response in RESPONSES.items():
+                app = tests.CountingApp(**response)
+                resp = self._request().get_response(factory(app))
+                resp.body
+                self.assertEqual(1, app.calls, "%s called the app %d times "
+                                 "for %s" % (name, app.calls, kind))
+
+    def test_app_error_called_once(self):
+        for name, factory in self.factories.items():
+            app = tests.CountingApp(error=ValueError("app failed"))
+            self.assertRaises(ValueError, self._request().get_response,
+                              factory(app))
+            self.assertEqual(1, app.calls, "%s called the app %d times" %
+                             (name, app.calls))
+
+    def test_blocked_request_not_called(self):
+        for factory in (alias.filter_factory, block_resource.filter_factory):
+            app = tests.CountingApp()
+            waffle = factory({"enabled": "true",
+                              "resource": "GET /v2.0/networks",
+                              "action": "addslash"})(app)
+            self._request().get_response(waffle)
+            self.assertEqual(0, app.calls)
@@ -15,6 +15,7 @@
 
 import json
 
+import mock
 import webob
 
 from wafflehaus import edit_response
@@ -76,7 +77,8 @@ class TestEditResponse(tests.TestCase):
     def _fake_app(self, req, body=None):
         if body is None:
             body = self.body
-        return webob.Response(body=json.dumps(body), status=200)
+        return webob.Response(body=json.dumps(body), status=200,
+                              content_type="application/json")
 
     def test_filter_creation(self):
         test_filter = edit_response.filter_factory(self.combo_conf)(self.app)
@@ -94,7 +96,8 @@ class TestEditResponse(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(app_body), status=200)
+            return webob.Response(body=json.dumps(app_body), status=200,
+                                  content_type="application/json")
         test_filter = edit_response.filter_factory(self.keep_if)(app)
         req = webob.Request.blank('/sauce', method='GET')
         resp = test_filter.__call__(req)
@@ -110,7 +113,8 @@ class TestEditResponse(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(app_body), status=200)
+            return webob.Response(body=json.dumps(app_body), status=200,
+                                  content_type="application/json")
         test_filter = edit_response.filter_factory(self.drop_if)(app)
         resp = test_filter(webob.Request.blank("/sauce", method="GET"))
         # comparing with the saved static response
@@ -220,7 +224,8 @@ class TestEditResponse(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(app_body), status=200)
+            return webob.Response(body=json.dumps(app_body), status=200,
+                                  content_type="application/json")
 
         test_filter = edit_response.filter_factory(self.combo_conf)(app)
         req = webob.Request.blank("/data", method="POST")
@@ -244,7 +249,8 @@ class TestEditResponse(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(app_body), status=200)
+            return webob.Response(body=json.dumps(app_body), status=200,
+                                  content_type="application/json")
 
         test_filter = edit_response.filter_factory(self.combo_conf)(app)
         req = webob.Request.blank("/data", method="POST")
@@ -275,7 +281,8 @@ class TestEditResponse(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(app_body), status=200)
+            return webob.Response(body=json.dumps(app_body), status=200,
+                                  content_type="application/json")
         test_filter = edit_response.filter_factory(test_status)(app)
 
         resp = test_filter(webob.Request.blank("/sauce", method="GET"))
@@ -294,7 +301,8 @@ class TestEditResponse(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(app_body), status=200)
+            return webob.Response(body=json.dumps(app_body), status=200,
+                                  content_type="application/json")
         test_filter = edit_response.filter_factory(test_status)(app)
 
         resp = test_filter(webob.Request.blank("/sauce", method="POST"))
@@ -313,7 +321,8 @@ class TestEditResponse(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(app_body), status=200)
+            return webob.Response(body=json.dumps(app_body), status=200,
+                                  content_type="application/json")
         test_filter = edit_response.filter_factory(test_status)(app)
 
         resp = test_filter(webob.Request.blank("/sauce/id", method="PUT"))
@@ -333,7 +342,146 @@ class TestEditResponse(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(app_body), status=200)
+            return webob.Response(body=json.dumps(app_body), status=200,
+                                  content_type="application/json")
         test_filter = edit_response.filter_factory(test_status)(app)
         resp = test_filter(webob.Request.blank("/sauce/id", method="DELETE"))
         self.assertEqual(resp.status_code, 201, resp)
+
+    def test_http_status_only_does_not_read_body(self):
+        conf = {"enabled": "true",
+                "filters": "missing",
+                "missing_resource": "GET /sauce",
+                "missing_key": "http_status_code",
+                "missing_value": "replace_if:404:200"}
+        for content_type in ("application/json", "text/html"):
+            app_iter = tests.CountingBody(['{"not": "found"}'])
+
+            def app(environ, start_response):
+                start_response('404 Not Found',
+                               [('Content-Type', content_type)])
+                return app_iter
+            test_filter = edit_response.filter_factory(conf)(app)
+            resp = test_filter(webob.Request.blank("/sauce", method="GET"))
+            self.assertEqual(200, resp.status_code)
+            self.assertIs(app_iter, resp.app_iter)
+            self.assertEqual(0, app_iter.read)
+
+    def test_http_status_with_body_edits(self):
+        conf = {"enabled": "true",
+                "filters": "status result",
+                "status_resource": "GET /sauce",
+                "status_key": "http_status_code",
+                "status_value": "replace_if:200:201",
+                "result_resource": "GET /sauce",
+                "result_key": "result"}
+        self.body = {"result": "gone", "http_status_code": 200}
+        test_filter = edit_response.filter_factory(conf)(self._fake_app)
+        resp = test_filter(webob.Request.blank("/sauce", method="GET"))
+        self.assertEqual(201, resp.status_code)
+        self.assertEqual({"http_status_code": 200}, resp.json)
+
+    def test_filters_applied_in_configured_order(self):
+        conf = {"enabled": "true",
+                "filters": "zulu alpha mike",
+                "zulu_resource": "GET /sauce",
+                "zulu_key": "recipe",
+                "zulu_value": "zulu",
+                "alpha_resource": "GET /sauce",
+                "alpha_key": "recipe",
+                "alpha_value": "alpha",
+                "mike_resource": "GET /elsewhere",
+                "mike_key": "recipe"}
+        test_filter = edit_response.filter_factory(conf)(self.app)
+        resp = test_filter(webob.Request.blank("/sauce", method="GET"))
+        self.assertEqual("alpha", resp.json["result"]["recipe"])
+
+        conf["filters"] = "alpha zulu mike"
+        test_filter = edit_response.filter_factory(conf)(self.app)
+        resp = test_filter(webob.Request.blank("/sauce", method="GET"))
+        self.assertEqual("zulu", resp.json["result"]["recipe"])
+
+    def test_body_parsed_and_dumped_once(self):
+        conf = {"enabled": "true",
+                "filters": "safe secret recipe",
+                "safe_resource": "POST /data",
+                "safe_key": "combination",
+                "safe_value": "REDACTED",
+                "secret_resource": "POST /data",
+                "secret_key": "secret",
+                "recipe_resource": "POST /data",
+                "recipe_key": "recipe",
+                "recipe_value": "[]"}
+        test_filter = edit_response.filter_factory(conf)(self.app)
+        plan = test_filter._plan(webob.Request.blank("/data", method="POST"))
+        self.assertEqual(["combination", "secret", "recipe"],
+                         [resource["key"] for resource in plan])
+        resp = webob.Response(body=json.dumps(self.body))
+        json_codec = test_filter.codec
+        with mock.patch.object(json_codec, 'loads',
+                               side_effect=json_codec.loads) as m_loads:
+            with mock.patch.object(json_codec, 'dumps',
+                                   side_effect=json_codec.dumps) as m_dumps:
+                resp = test_filter._apply_plan(resp, plan)
+        self.assertEqual(1, m_loads.call_count)
+        self.assertEqual(1, m_dumps.call_count)
+        self.assertEqual({"passcode": "123password",
+                          "combination": "REDACTED",
+                          "recipe": []}, resp.json["result"])
+
+    def test_edit_body_single_pass_in_place(self):
+        test_filter = edit_response.filter_factory(self.combo_conf)(self.app)
+        plan = test_filter._plan(webob.Request.blank("/data", method="POST"))
+        actions = test_filter._actions(plan)
+        ports = [{"secret": "s%d" % i, "combination": "c%d" % i}
+                 for i in range(3)]
+        body = {"ports": ports}
+        self.assertIs(body, test_filter._edit_body(body, actions))
+        self.assertIs(ports, body["ports"])
+        self.assertEqual([{"combination": "REDACTED"}] * 3, ports)
+
+    def test_edit_body_deeply_nested(self):
+        test_filter = edit_response.filter_factory(self.combo_conf)(self.app)
+        plan = test_filter._plan(webob.Request.blank("/data", method="POST"))
+        body = inner = {}
+        for i in range(10000):
+            inner["nested"] = [{}]
+            inner = inner["nested"][0]
+        inner["secret"] = "MY SECRETS"
+        test_filter._edit_body(body, test_filter._actions(plan))
+        self.assertEqual({}, inner)
+
+    def test_deeply_nested_body_passed_through(self):
+        raw = '{"secret":' + '[' * 5000 + ']' * 5000 + '}'
+
+        @webob.dec.wsgify
+        def app(req):
+            return webob.Response(body=raw, status=200,
+                                  content_type="application/json")
+        test_filter = edit_response.filter_factory(self.combo_conf)(app)
+        resp = test_filter(webob.Request.blank("/data", method="POST"))
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(raw, resp.body)
+
+    def test_body_that_can_not_be_encoded_passed_through(self):
+        test_filter = edit_response.filter_factory(self.combo_conf)(self.app)
+        with mock.patch.object(test_filter.codec, 'dumps',
+                               side_effect=RuntimeError):
+            resp = test_filter(webob.Request.blank("/data", method="POST"))
+        self.assertEqual(json.dumps(self.body), resp.body)
+
+    def test_value_without_key(self):
+        conf = {"enabled": "true",
+                "filters": "nokey",
+                "nokey_resource": "GET /sauce",
+                "nokey_value": "REDACTED"}
+        self.assertRaises(ValueError,
+                          edit_response.filter_factory(conf), self.app)
+
+    def test_json_backend(self):
+        conf = dict(self.combo_conf, json_backend="json")
+        test_filter = edit_response.filter_factory(conf)(self.app)
+        self.assertEqual("json", test_filter.codec.name)
+        conf["json_backend"] = "nope"
+        self.assertRaises(ValueError, edit_response.filter_factory(conf),
+                          self.app)
@@ -0,0 +1,125 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import json
+
+import webob
+
+from wafflehaus import edit_response
+from wafflehaus.edit_response import predicates
+from wafflehaus import tests
+
+RULES = [{"id": 1, "protocol": "tcp", "port": 22, "remote": "10.0.0.0/8"},
+         {"id": 2, "protocol": "udp", "port": 53, "remote": "0.0.0.0/0"},
+         {"id": 3, "protocol": "icmp", "port": None, "remote": "10.1.0.0/16"},
+         {"id": 4, "protocol": "tcp", "port": "443", "remote": "0.0.0.0/0"},
+         {"id": 5, "remote": ["a", "list"]}]
+
+
+class TestPredicates(tests.TestCase):
+
+    def _kept(self, expression):
+        foreach = predicates.compile_foreach(expression)
+        return [item["id"] for item in foreach.filter(RULES)]
+
+    def test_equal(self):
+        self.assertEqual([1, 4], self._kept("foreach:keep_if:protocol=tcp"))
+        self.assertEqual([2, 3, 5],
+                         self._kept("foreach:drop_if:protocol=tcp"))
+
+    def test_not_equal_needs_key(self):
+        self.assertEqual([2, 3],
+                         self._kept("foreach:keep_if:protocol!=tcp"))
+
+    def test_in(self):
+        self.assertEqual([2, 3],
+                         self._kept("foreach:keep_if:protocol in udp|icmp"))
+
+    def test_prefix(self):
+        self.assertEqual([1, 3], self._kept("foreach:keep_if:remote^=10."))
+
+    def test_numeric(self):
+        self.assertEqual([1, 2], self._kept("foreach:keep_if:port<100"))
+        self.assertEqual([2, 4], self._kept("foreach:keep_if:port>=53"))
+        self.assertEqual([4], self._kept("foreach:keep_if:port>53"))
+        self.assertEqual([1, 2], self._kept("foreach:keep_if:port<=53"))
+
+    def test_any_condition(self):
+        self.assertEqual([2, 3, 4], self._kept(
+            "foreach:keep_if:protocol=udp,port>100,remote=10.1.0.0/16"))
+
+    def test_values_contain_operators(self):
+        foreach = predicates.compile_foreach("foreach:keep_if:a=b=c")
+        self.assertTrue(foreach.matches({"a": "b=c"}))
+        foreach = predicates.compile_foreach(
+            "foreach:keep_if:binding:host_id=compute-1")
+        self.assertTrue(foreach.matches({"binding:host_id": "compute-1"}))
+
+    def test_equal_conditions_indexed(self):
+        foreach = predicates.compile_foreach(
+            "foreach:keep_if:alias=a,other=x,alias=b,alias in c|d")
+        self.assertEqual(2, len(foreach.conditions))
+        alias = foreach.conditions[0]
+        self.assertEqual("in", alias.op)
+        self.assertEqual(frozenset("abcd"), alias.value)
+        self.assertTrue(foreach.matches({"alias": "c"}))
+        self.assertTrue(foreach.matches({"other": "x"}))
+        self.assertFalse(foreach.matches({"alias": "x"}))
+        self.assertFalse(foreach.matches({"alias": ["a"]}))
+
+    def test_short_circuit(self):
+        foreach = predicates.compile_foreach("foreach:keep_if:a=1,b=2")
+        calls = []
+
+        class Item(dict):
+            def get(self, key, default=None):
+                calls.append(key)
+                return dict.get(self, key, default)
+
+        self.assertTrue(foreach.matches(Item(a="1", b="2")))
+        self.assertEqual(["a"], calls)
+
+    def test_bad_expressions(self):
+        self.assertRaises(ValueError, predicates.compile_foreach,
+                          "foreach:keep_if")
+        self.assertRaises(ValueError, predicates.compile_foreach,
+                          "foreach:keep_if:nothing")
+        self.assertRaises(ValueError, predicates.compile_foreach,
+                          "foreach:keep_if:port<many")
+
+
+class TestCompiledForeach(tests.TestCase):
+
+    def setUp(self):
+        super(TestCompiledForeach, self).setUp()
+        self.conf = {"enabled": "true",
+                     "filters": "rules",
+                     "rules_resource": "GET /rules",
+                     "rules_key": "rules",
+                     "rules_value": "foreach:drop_if:remote^=0.0.0.0"}
+
+    @webob.dec.wsgify
+    def _fake_app(self, req):
+        return webob.Response(body=json.dumps({"rules": RULES[:4]}),
+                              content_type="application/json")
+
+    def test_compiled_at_start(self):
+        test_filter = edit_response.filter_factory(self.conf)(self.app)
+        foreach = test_filter.resources["rules"]["foreach"]
+        self.assertIsInstance(foreach, predicates.Foreach)
+
+    def test_filters_response(self):
+        test_filter = edit_response.filter_factory(self.conf)(self._fake_app)
+        resp = test_filter(webob.Request.blank("/rules", method="GET"))
+        self.assertEqual([1, 3], [rule["id"] for rule in resp.json["rules"]])
@@ -0,0 +1,237 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import copy
+import json
+
+from hypothesis import given
+from hypothesis import settings
+from hypothesis import strategies as st
+import webob
+
+from wafflehaus import edit_response
+from wafflehaus.edit_response import stream
+from wafflehaus import tests
+
+KEYS = ['secret', 'combination', 'ports', 'name']
+
+scalars = st.one_of(st.none(), st.booleans(), st.integers(),
+                    st.floats(allow_nan=False, allow_infinity=False),
+                    st.text(max_size=5),
+                    st.sampled_from(['"', '\\', u'\u2603', '{[,:]}']))
+keys = st.one_of(st.sampled_from(KEYS), st.text(max_size=3))
+json_values = st.recursive(
+    scalars,
+    lambda children: st.one_of(st.lists(children, max_size=4),
+                               st.dictionaries(keys, children, max_size=4)),
+    max_leaves=20)
+
+
+def chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+class TestJSONReader(tests.TestCase):
+
+    def test_tokens_across_chunks(self):
+        body = ' {"a\\"b": [true, -1.5e3, null, "x,y"]} '
+        for size in range(1, len(body) + 1):
+            reader = stream.JSONReader(chunked(body, size))
+            self.assertEqual('{', reader.first())
+            self.assertEqual('{"a\\"b":[true,-1.5e3,null,"x,y"]}',
+                             reader.value(collect=True))
+            self.assertEqual('', reader.peek())
+
+    def test_long_string_scanned_once(self):
+        text = '"' + 'ab\\"c' * 2000 + '"'
+        scanned = []
+        string_body = stream._STRING_BODY
+
+        def match(buf, pos):
+            found = string_body.match(buf, pos)
+            scanned.append(found.end() - pos)
+            return found
+        self.create_patch(
+            'wafflehaus.edit_response.stream._STRING_BODY').match = match
+        reader = stream.JSONReader(chunked(text, 7))
+        self.assertEqual(text, reader.string())
+        self.assertEqual(len(text) - 2, sum(scanned))
+
+    def test_malformed(self):
+        for body in ('{"a": tru}', '{"a": "b', '[1}', '{"a": nope}'):
+            reader = stream.JSONReader(chunked(body, 3))
+            self.assertRaises(ValueError, reader.value)
+
+    def test_rest(self):
+        reader = stream.JSONReader(chunked('  garbage here', 4))
+        self.assertEqual('g', reader.first())
+        self.assertEqual('  garbage here', ''.join(reader.rest()))
+
+    def test_rest_from_mark(self):
+        body = '{"a": 1, "b": [2, 3]}'
+        for size in range(1, len(body) + 1):
+            reader = stream.JSONReader(chunked(body, size))
+            reader.take('{')
+            reader.string()
+            reader.mark()
+            reader.take(':')
+            reader.scalar()
+            reader.take(',')
+            self.assertEqual(': 1, "b": [2, 3]}', ''.join(reader.rest()))
+
+
+class TestEditResponseStreaming(tests.TestCase):
+
+    def setUp(self):
+        super(TestEditResponseStreaming, self).setUp()
+        self.conf = {"enabled": "true",
+                     "streaming": "true",
+                     "stream_chunk_size": "16",
+                     "filters": "secret combination ports name",
+                     "secret_resource": "GET /data",
+                     "secret_key": "secret",
+                     "combination_resource": "GET /data",
+                     "combination_key": "combination",
+                     "combination_value": "REDACTED",
+                     "ports_resource": "GET /data",
+                     "ports_key": "ports",
+                     "ports_value": "foreach:drop_if:name=bad",
+                     "name_resource": "GET /data",
+                     "name_key": "name",
+                     "name_value": "[]"}
+        self.chunks = []
+
+    def _app(self, environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return self.chunks
+
+    def _get(self, conf, chunks):
+        self.chunks = chunks
+        waffle = edit_response.filter_factory(conf)(self._app)
+        return waffle(webob.Request.blank("/data", method="GET"))
+
+    def _expected(self, body, conf=None):
+        waffle = edit_response.filter_factory(conf or self.conf)(None)
+        plan = waffle._plan(webob.Request.blank("/data", method="GET"))
+        return waffle._edit_body(copy.deepcopy(body), waffle._actions(plan))
+
+    @settings(max_examples=300, deadline=None)
+    @given(json_values.filter(lambda v: isinstance(v, (dict, list))),
+           st.integers(min_value=1, max_value=40))
+    def test_same_as_in_memory(self, body, size):
+        resp = self._get(self.conf, chunked(json.dumps(body), size))
+        self.assertEqual(self._expected(body), json.loads(resp.body))
+
+    def test_foreach_filters_items(self):
+        body = {"ports": [{"name": "good", "secret": 1, "combination": 2},
+                          {"name": "bad"},
+                          {"name": "good", "nested": {"secret": 3}}]}
+        conf = dict(self.conf, filters="secret combination ports")
+        resp = self._get(conf, chunked(json.dumps(body), 7))
+        self.assertIsNone(resp.content_length)
+        self.assertEqual({"ports": [{"name": "good",
+                                     "combination": "REDACTED"},
+                                    {"name": "good", "nested": {}}]},
+                         json.loads(resp.body))
+
+    def test_foreach_skips_mixed_list(self):
+        body = {"ports": [{"name": "bad"}, "bad", {"name": "bad",
+                                                   "secret": 1}]}
+        conf = dict(self.conf, filters="secret combination ports")
+        for size in (1, 7, 100):
+            resp = self._get(conf, chunked(json.dumps(body), size))
+            self.assertEqual(self._expected(body, conf),
+                             json.loads(resp.body))
+            self.assertEqual({"ports": [{"name": "bad"}, "bad",
+                                        {"name": "bad"}]},
+                             json.loads(resp.body))
+
+    def test_chunks_bounded(self):
+        body = {"networks": [{"name": "net%d" % i, "secret": "x" * 50}
+                             for i in range(200)]}
+        self.chunks = chunked(json.dumps(body), 64)
+        waffle = edit_response.filter_factory(self.conf)(self._app)
+        resp = waffle(webob.Request.blank("/data", method="GET"))
+        sizes = [len(chunk) for chunk in resp.app_iter]
+        self.assertTrue(len(sizes) > 100)
+        self.assertTrue(max(sizes) < 64)
+
+    def test_not_json_passed_through(self):
+        for body in ('garbage', '', '  "a string"', '42'):
+            resp = self._get(self.conf, chunked(body, 3))
+            self.assertEqual(body, resp.body)
+
+    def test_malformed_rest_passed_through(self):
+        resp = self._get(self.conf, ['{"name": "x", "other": tru', 'ly}'])
+        self.assertEqual('{"name":[],"other": truly}', resp.body)
+
+    def test_malformed_passed_through_unchanged(self):
+        conf = dict(self.conf, stream_chunk_size='65536')
+        for body in ('{"a":1,"secret":2,garbage garbage}', '{"a":1} xx',
+                     '[{"name": "x"}, {"secret": 1}'):
+            for size in (1, 5, len(body)):
+                resp = self._get(conf, chunked(body, size))
+                self.assertEqual(body, resp.body)
+
+    def test_malformed_rest_not_buffered(self):
+        rest = ['x' * 10] * 50
+        conf = dict(self.conf, stream_chunk_size='65536')
+        waffle = edit_response.filter_factory(conf)(
+            tests.body_app(['{"secret": 1, ', 'oops'] + rest))
+        resp = waffle(webob.Request.blank("/data", method="GET"))
+        chunks = list(resp.app_iter)
+        self.assertEqual(['{"secret": 1, oops'] + rest, chunks)
+
+    def test_deleted_member_not_held(self):
+        readers = []
+        held = []
+
+        def reader(chunks, **kwargs):
+            readers.append(JSONReader(chunks, **kwargs))
+            return readers[0]
+
+        def chunks():
+            yield '{"secret": ['
+            for i in range(1000):
+                held.append(sum(len(text) for text in readers[0].held or []))
+                yield '1, ' * 100
+            yield '1], "a": tru}'
+        JSONReader = stream.JSONReader
+        self.create_patch(
+            'wafflehaus.edit_response.stream.JSONReader').side_effect = reader
+        resp = self._get(self.conf, chunks())
+        self.assertEqual('{"a":tru}', resp.body)
+        self.assertTrue(max(held) < 1000)
+
+    def test_app_iter_closed(self):
+        for chunks in (['"hello"'], ['{"secret": 1}'], ['{"a": 1} xx']):
+            app_iter = tests.CountingBody(chunks)
+            waffle = edit_response.filter_factory(self.conf)(
+                tests.body_app(app_iter))
+            resp = waffle(webob.Request.blank("/data", method="GET"))
+            self.assertFalse(app_iter.closed)
+            list(resp.app_iter)
+            resp.app_iter.close()
+            self.assertTrue(app_iter.closed)
+
+    def test_status_replaced(self):
+        conf = {"enabled": "true",
+                "streaming": "true",
+                "filters": "httpget",
+                "httpget_resource": "GET /data",
+                "httpget_key": "http_status_code",
+                "httpget_value": "replace_if:200:201"}
+        resp = self._get(conf, ['{"a": 1}'])
+        self.assertEqual(201, resp.status_code)
+        self.assertEqual({"a": 1}, json.loads(resp.body))
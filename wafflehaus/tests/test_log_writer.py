@@ -0,0 +1,193 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+
+import mock
+import webob
+
+from wafflehaus.log_filters import req_resp
+from wafflehaus.log_filters import writer
+from wafflehaus import tests
+
+
+class TestAsyncWriter(tests.TestCase):
+
+    def setUp(self):
+        super(TestAsyncWriter, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'records.log')
+
+    def _read(self, path=None):
+        with open(path or self.path) as f:
+            return f.read()
+
+    def _writer(self, **kwargs):
+        log_writer = writer.AsyncWriter(self.path, **kwargs)
+        self.addCleanup(log_writer.close)
+        return log_writer
+
+    def test_records_written_in_order(self):
+        log_writer = self._writer(batch_size=7)
+        for i in range(100):
+            self.assertTrue(log_writer.write('record %d\n' % i))
+        log_writer.flush()
+        self.assertEqual(''.join('record %d\n' % i for i in range(100)),
+                         self._read())
+        self.assertEqual({'queued': 0, 'written': 100, 'dropped': 0},
+                         log_writer.stats())
+
+    def _stall(self, log_writer):
+        """Holds the writer thread in its first write until released."""
+        entered = threading.Event()
+        release = threading.Event()
+        writes = []
+
+        def write(data):
+            writes.append(data)
+            entered.set()
+            release.wait()
+        log_writer._file = mock.Mock(wraps=log_writer._file)
+        log_writer._file.write.side_effect = write
+        log_writer.write('first\n')
+        entered.wait()
+        return release, writes
+
+    def test_records_batched(self):
+        log_writer = self._writer(batch_size=50)
+        release, writes = self._stall(log_writer)
+        for i in range(30):
+            log_writer.write('%d\n' % i)
+        release.set()
+        log_writer.flush()
+        self.assertEqual(['first\n', ''.join('%d\n' % i for i in range(30))],
+                         writes)
+
+    def test_full_queue_drops(self):
+        log_writer = self._writer(queue_size=2)
+        release, writes = self._stall(log_writer)
+        self.assertTrue(log_writer.write('a\n'))
+        self.assertTrue(log_writer.write('b\n'))
+        self.assertFalse(log_writer.write('c\n'))
+        self.assertEqual(1, log_writer.stats()['dropped'])
+        release.set()
+        log_writer.flush()
+        self.assertEqual(['first\n', 'a\nb\n'], writes)
+
+    def test_close_writes_queue(self):
+        log_writer = self._writer(overflow='block', queue_size=5)
+        for i in range(50):
+            log_writer.write('%d\n' % i)
+        log_writer.close()
+        self.assertEqual(50, len(self._read().splitlines()))
+        self.assertFalse(log_writer.write('late\n'))
+        self.assertEqual(1, log_writer.stats()['dropped'])
+
+    def test_bad_record_does_not_stop_writer(self):
+        log_writer = self._writer(overflow='block', queue_size=2)
+        log_writer.write('a\n')
+        log_writer.write(u'caf\u00e9\n')
+        log_writer.write('b\n')
+        log_writer.flush()
+        for i in range(10):
+            log_writer.write('%d\n' % i)
+        log_writer.flush()
+        self.assertEqual(['a', 'b'] + [str(i) for i in range(10)],
+                         self._read().splitlines())
+        self.assertEqual({'queued': 0, 'written': 12, 'dropped': 1},
+                         log_writer.stats())
+
+    def test_thread_started_by_first_write(self):
+        log_writer = self._writer()
+        self.assertIsNone(log_writer._thread)
+        log_writer.write('a\n')
+        self.assertTrue(log_writer._thread.is_alive())
+
+    def _wait_child(self, pid):
+        for i in range(500):
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                return status
+            time.sleep(0.01)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        self.fail("Forked writer did not finish")
+
+    def test_forked_process_gets_own_thread(self):
+        log_writer = self._writer(overflow='block', queue_size=5)
+        log_writer.write('parent\n')
+        log_writer.flush()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                for i in range(20):
+                    log_writer.write('%d\n' % i)
+                log_writer.flush()
+                status = 0
+            finally:
+                os._exit(status)
+        self.assertEqual(0, self._wait_child(pid))
+        self.assertEqual(['parent'] + [str(i) for i in range(20)],
+                         self._read().splitlines())
+
+    def test_bad_policy(self):
+        self.assertRaises(ValueError, writer.AsyncWriter, self.path,
+                          overflow='spill')
+
+
+class TestAsyncRequestResponseLogger(tests.TestCase):
+
+    def setUp(self):
+        super(TestAsyncRequestResponseLogger, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.conf = {'enabled': 'true', 'async_log': 'true',
+                     'log_file': os.path.join(self.dir, 'simple.log'),
+                     'do_detail': 'true', 'detail_level': '400'}
+
+    @webob.dec.wsgify
+    def _app(self, req):
+        return webob.Response(body='{"error":\n"gone"}', status=404)
+
+    def test_one_record_per_request(self):
+        waffle = req_resp.filter_factory(self.conf)(self._app)
+        self.addCleanup(waffle.close)
+        with mock.patch.object(waffle.writer, 'write',
+                               wraps=waffle.writer.write) as write:
+            with mock.patch.object(waffle.dwriter, 'write',
+                                   wraps=waffle.dwriter.write) as dwrite:
+                resp = webob.Request.blank('/widgets?limit=1',
+                                           method='GET').get_response(waffle)
+        self.assertEqual(404, resp.status_int)
+        self.assertEqual(1, write.call_count)
+        self.assertEqual(1, dwrite.call_count)
+        waffle.close()
+
+        with open(self.conf['log_file']) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[0].startswith('Starting wafflehaus'))
+        self.assertIn('404', lines[1])
+        self.assertIn('GET /widgets?limit=1', lines[1])
+        with open(os.path.join(self.dir, 'simple.detail.log')) as f:
+            details = f.read().splitlines()
+        self.assertIn('RESBODY: {"error":', details[-2])
+        self.assertIn('RESBODY: "gone"}', details[-1])
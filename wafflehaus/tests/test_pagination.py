@@ -15,6 +15,10 @@
 
 import json
 
+from hypothesis import given
+from hypothesis import settings
+from hypothesis import strategies as st
+import mock
 import webob
 
 from wafflehaus.pagination import pagination
@@ -70,7 +74,8 @@ class TestPagination(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(body), status=200)
+            return webob.Response(body=json.dumps(body), status=200,
+                                  content_type="application/json")
         conf = {'pagination_url': self.url, 'enabled': 'True'}
         test_filter = pagination.filter_factory(conf)(app)
         resp = test_filter(webob.Request.blank("/networks?limit=1",
@@ -201,7 +206,8 @@ class TestPagination(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(body), status=200)
+            return webob.Response(body=json.dumps(body), status=200,
+                                  content_type="application/json")
 
         conf = {'pagination_url': self.url, 'enabled': 'True'}
         test_filter = pagination.filter_factory(conf)(app)
@@ -292,7 +298,8 @@ class TestPagination(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(body), status=200)
+            return webob.Response(body=json.dumps(body), status=200,
+                                  content_type="application/json")
         conf = {'pagination_url': self.url, 'enabled': 'True'}
         test_filter = pagination.filter_factory(conf)(app)
         resp = test_filter(webob.Request.blank("/subnets?limit=1",
@@ -392,7 +399,8 @@ class TestPagination(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(body), status=200)
+            return webob.Response(body=json.dumps(body), status=200,
+                                  content_type="application/json")
         conf = {'pagination_url': self.url, 'enabled': 'True'}
         test_filter = pagination.filter_factory(conf)(app)
         resp = test_filter(webob.Request.blank("/ports?limit=1",
@@ -412,8 +420,9 @@ class TestPagination(tests.TestCase):
         resp = test_filter(webob.Request.blank("/networks?limit=1",
                                                method="GET"))
 
-        # Should just return our app function here, not a response with json
-        self.assertEqual(resp, app)
+        # The error response of the app is passed on as it is
+        self.assertEqual(400, resp.status_code)
+        self.assertEqual(body, json.loads(resp.body))
 
     def test_paginate_disabled_waffle(self):
         """When pagination waffle is disabled return result as is"""
@@ -421,7 +430,8 @@ class TestPagination(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(body), status=200)
+            return webob.Response(body=json.dumps(body), status=200,
+                                  content_type="application/json")
 
         conf = {'pagination_url': self.url, 'enabled': 'False'}
         test_filter = pagination.filter_factory(conf)(app)
@@ -452,7 +462,8 @@ class TestPagination(tests.TestCase):
 
         @webob.dec.wsgify
         def app(req):
-            return webob.Response(body=json.dumps(body), status=200)
+            return webob.Response(body=json.dumps(body), status=200,
+                                  content_type="application/json")
 
         conf = {'enabled': 'True'}
         test_filter = pagination.filter_factory(conf)(app)
@@ -473,20 +484,136 @@ class TestPagination(tests.TestCase):
         resp = test_filter(webob.Request.blank("/networks?limit=1",
                                                method="GET"))
 
-        # Should just return our app function here, not a response with json
-        self.assertEqual(resp, app)
+        # The empty response is not JSON, so it is passed on as it is
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('', resp.body)
 
     def test_paginate_exception_response(self):
         """Tests when the app throws an Exception"""
 
+        class AppError(Exception):
+            pass
+
         @webob.dec.wsgify
         def app(req):
-            raise Exception
+            raise AppError()
 
         conf = {'pagination_url': self.url, 'enabled': 'True'}
         test_filter = pagination.filter_factory(conf)(app)
-        resp = test_filter(webob.Request.blank("/networks?limit=1",
+
+        # The app is not called a second time, the exception propagates
+        self.assertRaises(AppError, test_filter,
+                          webob.Request.blank("/networks?limit=1",
+                                              method="GET"))
+
+
+LOCAL = "http://localhost:9696/v2.0/ports?limit=2&marker=%s"
+
+hrefs = st.one_of(st.sampled_from([LOCAL % "a", LOCAL % "b" + "_links",
+                                   u"http://h\u2603st/x", '"quoted"']),
+                  st.text(max_size=8))
+links = st.lists(st.fixed_dictionaries({"href": hrefs,
+                                        "rel": st.sampled_from(
+                                            ["next", "previous"])}),
+                 max_size=3)
+members = st.dictionaries(st.sampled_from(["ports", "name", "meta"]),
+                          st.one_of(st.none(), st.text(max_size=5), links),
+                          max_size=3)
+
+
+class TestRewriteBytes(tests.TestCase):
+    """The bytes mode splices the rewritten links into the body."""
+
+    def setUp(self):
+        super(TestRewriteBytes, self).setUp()
+        self.url = 'https://example.com:8443'
+        self.conf = {'pagination_url': self.url, 'enabled': 'True',
+                     'rewrite_mode': 'bytes'}
+
+    def _call(self, raw, conf=None):
+        @webob.dec.wsgify
+        def app(req):
+            return webob.Response(body=raw, content_type="application/json")
+        test_filter = pagination.filter_factory(conf or self.conf)(app)
+        return test_filter(webob.Request.blank("/v2.0/ports?limit=2",
                                                method="GET"))
 
-        # Should just return our app function here, not a response with json
-        self.assertEqual(resp, app)
+    def test_url_parsed_once(self):
+        test_filter = pagination.filter_factory(self.conf)(self.app)
+        self.assertEqual('https', test_filter.scheme)
+        self.assertEqual('example.com:8443', test_filter.netloc)
+
+    def test_only_links_rewritten(self):
+        ports = '{"ports": [ {"id": "a",  "name": "x"} ],\n "ports_links": '
+        raw = ports + '[{"href": "%s", "rel": "next"}] }\n' % (LOCAL % "a")
+        with mock.patch.object(pagination.Pagination,
+                               '_rewrite_json') as rewrite_json:
+            resp = self._call(raw)
+        self.assertFalse(rewrite_json.called)
+        self.assertTrue(resp.body.startswith(ports))
+        self.assertEqual(
+            [{"href": "https://example.com:8443/v2.0/ports?limit=2&marker=a",
+              "rel": "next"}], resp.json["ports_links"])
+        self.assertEqual(len(resp.body), resp.content_length)
+
+    def test_leading_links_rewritten(self):
+        ports = ', "ports": [{"id": "a",  "name": "x"}]}'
+        raw = ' { "ports_links" : [{"href": "%s", "rel": "next"}]' % (
+            LOCAL % "a") + ports
+        with mock.patch.object(pagination.Pagination,
+                               '_rewrite_json') as rewrite_json:
+            resp = self._call(raw)
+        self.assertFalse(rewrite_json.called)
+        self.assertTrue(resp.body.endswith(ports))
+        self.assertEqual(
+            [{"href": "https://example.com:8443/v2.0/ports?limit=2&marker=a",
+              "rel": "next"}], resp.json["ports_links"])
+
+    def test_falls_back_to_json(self):
+        link = '{"href": "%s", "rel": "next"}' % (LOCAL % "a")
+        bodies = [
+            # The links are neither the first nor the last member
+            '{"id": 1, "ports_links": [%s], "ports": []}' % link,
+            '{"ports_links": [%s] "ports": []}' % link,
+            # The links are nested in the last member
+            '{"ports": [{"meta_links": [%s]}]}' % link,
+            '{"ports": {"ports_links": [%s]}}' % link,
+            # The links are not all links
+            '{"ports": [], "ports_links": [%s, 1]}' % link,
+            '{"ports": [], "ports_links": [{"rel": "next"}]}',
+            # The body is not an object or is malformed
+            '[%s]' % link,
+            '{"ports": [], "ports_links": [%s}' % link,
+            '{"ports": [], "ports_links": [%s]]}' % link]
+        json_conf = dict(self.conf, rewrite_mode='json')
+        for raw in bodies:
+            expected = self._call(raw, json_conf)
+            self.assertEqual(expected.body, self._call(raw).body, raw)
+
+    @settings(max_examples=200, deadline=None)
+    @given(members, links, st.booleans())
+    def test_same_as_json(self, data, page_links, leading):
+        raw = json.dumps(data)[1:-1]
+        section = '"ports_links": %s' % json.dumps(page_links)
+        if raw:
+            raw = [section, raw] if leading else [raw, section]
+            raw = ', '.join(raw)
+        else:
+            raw = section
+        raw = '{%s}' % raw
+        json_conf = dict(self.conf, rewrite_mode='json')
+        expected = self._call(raw, json_conf)
+        self.assertEqual(json.loads(expected.body),
+                         json.loads(self._call(raw).body))
+
+    def test_json_backend(self):
+        raw = '{"ports": [], "ports_links": [{"href": "http://x/v2.0"}]}'
+        expected = self._call(raw)
+        for backend in ('json', 'simplejson'):
+            conf = dict(self.conf, json_backend=backend)
+            self.assertEqual(expected.body, self._call(raw, conf).body)
+
+    def test_unknown_rewrite_mode(self):
+        conf = dict(self.conf, rewrite_mode='byte')
+        self.assertRaises(ValueError, pagination.filter_factory(conf),
+                          self.app)
@@ -16,6 +16,7 @@ import json
 import mock
 import webob
 
+import wafflehaus.payload_filter as pf
 from wafflehaus.payload_filter import unset_key
 from wafflehaus import tests
 
@@ -78,7 +79,6 @@ class TestPayloadFilter(tests.TestCase):
         self.assertEqual(self.app, resp)
         # result is the request after the keys are set , unset key is misnomer
         body = req.body
-        self.assertEqual(result.body, req.body)
         self.assertIsNotNone(body)
         json_body = json.loads(body)
         # request body will be having  by the config passed
@@ -92,6 +92,14 @@ class TestPayloadFilter(tests.TestCase):
         self.assertTrue('thing' in widget)
         self.assertEqual('thingie', widget['thing'])
 
+    def test_json_backend(self):
+        conf = dict(self.simple_conf1, json_backend='json')
+        result = unset_key.filter_factory(conf)(self.app)
+        self.assertEqual('json', result.codec.name)
+        req = webob.Request.blank('/widget', method='POST', body=self.body1)
+        result.__call__(req)
+        self.assertEqual('thingie', json.loads(req.body)['widget']['thing'])
+
     def test_request_body_not_overridden(self):
         """Payload filter will not change values that are set."""
         # already existing keys should not be reset
@@ -104,7 +112,6 @@ class TestPayloadFilter(tests.TestCase):
         resp = result.__call__(req)
         self.assertEqual(self.app, resp)
         body = req.body
-        self.assertEqual(req.body, result.body)
         self.assertIsNotNone(body)
         json_body = json.loads(body)
         self.assertTrue('widget' in json_body)
@@ -126,7 +133,6 @@ class TestPayloadFilter(tests.TestCase):
         resp = result.__call__(req)
         self.assertEqual(self.app, resp)
         body = req.body
-        self.assertEqual(req.body, result.body)
         self.assertIsNotNone(body)
         json_body = json.loads(body)
         self.assertTrue('widget' in json_body)
@@ -154,7 +160,6 @@ class TestPayloadFilter(tests.TestCase):
         resp = result.__call__(req)
         self.assertEqual(self.app, resp)
         body = req.body
-        self.assertEqual(req.body, result.body)
         self.assertIsNotNone(body)
         json_body = json.loads(body)
         self.assertTrue('widget' in json_body)
@@ -179,7 +184,6 @@ class TestPayloadFilter(tests.TestCase):
         resp = result.__call__(req)
         self.assertEqual(self.app, resp)
         body = req.body
-        self.assertEqual(req.body, result.body)
         self.assertIsNotNone(body)
         json_body = json.loads(body)
         self.assertTrue('widget' in json_body)
@@ -200,7 +204,6 @@ class TestPayloadFilter(tests.TestCase):
         resp = result.__call__(req)
         self.assertEqual(self.app, resp)
         body = req.body
-        self.assertEqual(req.body, result.body)
         self.assertIsNotNone(body)
         json_body = json.loads(body)
         self.assertTrue('widget' in json_body)
@@ -220,7 +223,6 @@ class TestPayloadFilter(tests.TestCase):
         resp = result.__call__(req)
         self.assertEqual(self.app, resp)
         body = req.body
-        self.assertEqual(req.body, result.body)
         self.assertIsNotNone(body)
         json_body = json.loads(body)
         self.assertTrue('widgets' in json_body)
@@ -241,7 +243,6 @@ class TestPayloadFilter(tests.TestCase):
         resp = result.__call__(req)
         self.assertEqual(self.app, resp)
         body = req.body
-        self.assertEqual(req.body, result.body)
         self.assertIsNotNone(body)
         json_body = json.loads(body)
         self.assertTrue('widgets' in json_body)
@@ -268,10 +269,111 @@ class TestPayloadFilter(tests.TestCase):
                                   headers=headers)
         resp = result.__call__(req)
         self.assertEqual(self.app, resp)
-        self.assertFalse(hasattr(result, 'body'))
+        self.assertEqual(self.body5, req.body)
         headers = {'X_WAFFLEHAUS_DEFAULTPAYLOAD_ENABLED': True}
         req = webob.Request.blank('/widget', method='POST', body=self.body5,
                                   headers=headers)
         resp = result.__call__(req)
         self.assertEqual(self.app, resp)
-        self.assertTrue(hasattr(result, 'body'))
+        self.assertNotEqual(self.body5, req.body)
+        self.assertFalse(hasattr(result, 'body'))
+
+
+class TestDefaultsTree(tests.TestCase):
+
+    def test_defaults_share_paths(self):
+        defaults = pf.get_defaults('port:a=1, port:fixed_ips:b=null,'
+                                   'port:fixed_ips:c=2, port:a=3, net=x')
+        self.assertEqual(['net', 'port'], sorted(defaults))
+        port = defaults['port']
+        self.assertEqual('1', port['a'][None])
+        self.assertIsNone(port['fixed_ips']['b'][None])
+        self.assertEqual('2', port['fixed_ips']['c'][None])
+        self.assertEqual({}, pf.get_defaults(''))
+
+    def test_all_defaults_set_in_one_walk(self):
+        conf = ['port:key%d=%d' % (i, i) for i in range(50)]
+        conf.extend('port:fixed_ips:ip%d=null' % i for i in range(50))
+        defaults = pf.get_defaults(','.join(conf))
+        payload = {"port": {"key0": "set",
+                            "fixed_ips": [{"subnet_id": "s"}, "odd", {}]}}
+        pf.set_unset_keys(payload, defaults)
+        port = payload["port"]
+        self.assertEqual("set", port["key0"])
+        self.assertEqual("49", port["key49"])
+        self.assertEqual("odd", port["fixed_ips"][1])
+        for fixed_ip in (port["fixed_ips"][0], port["fixed_ips"][2]):
+            self.assertIsNone(fixed_ip["ip0"])
+            self.assertIsNone(fixed_ip["ip49"])
+        self.assertEqual("s", port["fixed_ips"][0]["subnet_id"])
+
+    def test_deep_paths(self):
+        path = ':'.join('k%d' % i for i in range(2000))
+        defaults = pf.get_defaults('%s=deep' % path)
+        payload = node = {}
+        for i in range(1999):
+            node['k%d' % i] = {}
+            node = node['k%d' % i]
+        pf.set_unset_keys(payload, defaults)
+        self.assertEqual('deep', node['k1999'])
+
+    def test_other_payloads_unchanged(self):
+        defaults = pf.get_defaults('widget:thing=thingie')
+        for payload in ('[1, 2]', '"widget"', '{"widget": "text"}',
+                        '{"widget": [[{}]]}', 'not json'):
+            expected = payload
+            if payload != 'not json':
+                expected = json.dumps(json.loads(payload))
+            self.assertEqual(expected,
+                             pf.json_set_unset_keys(payload, defaults))
+
+
+class TestSkipPayload(tests.TestCase):
+    """Requests that need no defaults are not decoded or encoded."""
+
+    def setUp(self):
+        super(TestSkipPayload, self).setUp()
+        conf = {'resource': 'GET POST PUT /widget', 'enabled': 'true',
+                'defaults': 'widget:thing=thingie'}
+        self.filter = unset_key.filter_factory(conf)(self.app)
+        self.body = '{"widget": {"name": "foo"}}'
+
+    def _call(self, method='POST', body=None, content_type=None):
+        req = webob.Request.blank('/widget', method=method)
+        if body is not None:
+            req.body = body
+        if content_type is not None:
+            req.content_type = content_type
+        with mock.patch('wafflehaus.payload_filter.json_set_unset_keys',
+                        side_effect=pf.json_set_unset_keys) as set_keys:
+            self.assertEqual(self.app, self.filter(req))
+        return req, set_keys.called
+
+    def test_body_with_every_default_untouched(self):
+        body = '{ "widget" : {"thing": "derp", "name": "foo"} }'
+        with mock.patch('json.dumps') as dumps:
+            req, called = self._call(body=body)
+        self.assertTrue(called)
+        self.assertFalse(dumps.called)
+        self.assertEqual(body, req.body)
+
+    def test_requests_without_payload_skipped(self):
+        for method, body in (('GET', self.body), ('PUT', None),
+                             ('POST', '')):
+            req, called = self._call(method=method, body=body)
+            self.assertFalse(called, method)
+
+    def test_content_types(self):
+        req, called = self._call(body=self.body, content_type='text/plain')
+        self.assertFalse(called)
+        self.assertEqual(self.body, req.body)
+        for content_type in ('application/json',
+                             'application/vnd.widget+json'):
+            req, called = self._call(body=self.body,
+                                     content_type=content_type)
+            self.assertEqual('thingie', json.loads(req.body)['widget'][
+                'thing'])
+
+    def test_no_state_kept(self):
+        self._call(body=self.body)
+        self.assertFalse(hasattr(self.filter, 'body'))
@@ -15,6 +15,7 @@
 import mock
 import webob.exc
 
+import wafflehaus.resource_filter as rf
 from wafflehaus.resource_filter import block_resource
 from wafflehaus import tests
 
@@ -199,3 +200,41 @@ class TestResourceFilter(tests.TestCase):
                                        headers=headers)
         # verify that run time header modified worked
         self.assertTrue(isinstance(resp, webob.exc.HTTPException))
+
+    def test_parse_resources_compiles_matcher(self):
+        resources = rf.parse_resources('POST /widget, GET /widget/{id}')
+        self.assertTrue(isinstance(resources, rf.ResourceMatcher))
+        self.assertEqual(['/widget', '/widget/{id}'], resources.keys())
+        self.assertTrue(resources.match('POST', '/widget'))
+        self.assertFalse(resources.match('GET', '/widget'))
+        self.assertTrue(resources.match('GET', '/widget/1234'))
+        self.assertFalse(resources.match('GET', '/cog'))
+
+    def test_parse_resources_cached_by_spec(self):
+        first = rf.parse_resources('GET /cached')
+        second = rf.parse_resources('GET /cached')
+        self.assertIs(first, second)
+        self.assertIsNot(first, rf.parse_resources('POST /cached'))
+
+    def test_parse_resources_unknown_matcher(self):
+        self.assertRaises(ValueError, rf.parse_resources, 'GET /widget',
+                          'radx')
+        conf = {'resource': 'GET /widget', 'resource_matcher': 'radx'}
+        self.assertRaises(ValueError,
+                          block_resource.filter_factory(conf), self.app)
+
+    def test_match_does_not_build_mapper(self):
+        result = block_resource.filter_factory(self.complex_conf)(self.app)
+        m_mapper = self.create_patch('wafflehaus.resource_filter.Mapper')
+        resp = result.__call__.request('/widget/1234/sub/1234', method='POST')
+        self.assertTrue(isinstance(resp, webob.exc.HTTPException))
+        resp = result.__call__.request('/widget', method='POST')
+        self.assertEqual(self.app, resp)
+        self.assertEqual(0, m_mapper.call_count)
+
+    def test_matched_request_with_plain_dict(self):
+        req = webob.Request.blank('/widget', method='POST')
+        self.assertTrue(rf.matched_request(req, {'/widget': ['POST']}))
+        self.assertFalse(rf.matched_request(req, {'/widget': ['GET']}))
+        self.assertFalse(rf.matched_request(req, {}))
+        self.assertFalse(rf.matched_request(req, None))
@@ -0,0 +1,129 @@
+# Copyright 2016 Openstack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from hypothesis import given
+from hypothesis import settings
+from hypothesis import strategies as st
+import webob.exc
+
+import wafflehaus.resource_filter as rf
+from wafflehaus.resource_filter import block_resource
+from wafflehaus.resource_filter import radix
+from wafflehaus import tests
+
+# The radix matcher must agree with the routes matcher
+
+WORDS = ['v2.0', 'ports', 'networks', 'widget', 'sub', '1234', 'abc-def',
+         'x.json', 'x.xml', '']
+METHODS = ['GET', 'POST', 'PUT', 'DELETE']
+
+# Segment templates, '%d' is replaced to keep variable names unique
+SEGMENTS = ['ports', 'networks', 'widget', 'sub', 'v2.0', '{id%d}',
+            r'{id%d:\d+}', '{id%d:[a-f0-9-]+}', '{id%d:json|xml}',
+            'x{.fmt%d}', 'x{.fmt%d:json|xml}', '{a%d}-{b%d}', ':leg%d',
+            '*wild%d', '{any%d:.+}', '{slash%d:[!-z]+}']
+
+
+@st.composite
+def templates(draw):
+    parts = draw(st.lists(st.sampled_from(SEGMENTS), min_size=0,
+                          max_size=4))
+    segments = []
+    for i, part in enumerate(parts):
+        segments.append(part.replace('%d', str(i)))
+    methods = draw(st.lists(st.sampled_from(METHODS), min_size=1,
+                            max_size=2, unique=True))
+    return '%s /%s' % (' '.join(methods), '/'.join(segments))
+
+
+@st.composite
+def paths(draw):
+    words = draw(st.lists(st.sampled_from(WORDS), min_size=0, max_size=5))
+    return '/' + '/'.join(words)
+
+
+class TestRadixMatcher(tests.TestCase):
+
+    def _both(self, spec):
+        return (rf.parse_resources(spec),
+                rf.parse_resources(spec, 'radix'))
+
+    @settings(max_examples=300, deadline=None)
+    @given(st.lists(templates(), min_size=1, max_size=8),
+           st.lists(paths(), min_size=1, max_size=8))
+    def test_agrees_with_routes(self, specs, request_paths):
+        spec = ', '.join(specs)
+        routes_matcher, radix_matcher = self._both(spec)
+        self.assertTrue(isinstance(radix_matcher, rf.RadixResourceMatcher))
+        self.assertEqual(routes_matcher, radix_matcher)
+        for path in request_paths:
+            for method in METHODS:
+                self.assertEqual(routes_matcher.match(method, path),
+                                 radix_matcher.match(method, path),
+                                 '%s %s against %s' % (method, path, spec))
+
+    @settings(max_examples=200, deadline=None)
+    @given(st.lists(templates(), min_size=1, max_size=8))
+    def test_agrees_on_instances_of_templates(self, specs):
+        spec = ', '.join(specs)
+        routes_matcher, radix_matcher = self._both(spec)
+        for resource in routes_matcher:
+            path = resource
+            for var, value in (('{id0}', '99'), ('{id1}', 'abc'),
+                               (r'{id2:\d+}', '7'), ('{a3}', 'q'),
+                               ('{b3}', 'r'), ('x{.fmt0}', 'x.json'),
+                               ('{.fmt1}', '')):
+                path = path.replace(var, value)
+            for method in METHODS:
+                self.assertEqual(routes_matcher.match(method, path),
+                                 radix_matcher.match(method, path),
+                                 '%s %s against %s' % (method, path, spec))
+
+    def test_first_configured_resource_wins(self):
+        spec = 'GET /widget/{id}, POST /widget/special'
+        routes_matcher, radix_matcher = self._both(spec)
+        for matcher in (routes_matcher, radix_matcher):
+            self.assertTrue(matcher.match('GET', '/widget/special'))
+            self.assertFalse(matcher.match('POST', '/widget/special'))
+
+    def test_unsplittable_templates_use_routes(self):
+        trie = radix.PathTrie()
+        self.assertEqual(0, trie.insert('/files/{path:.+}'))
+        self.assertEqual(1, trie.insert('/files/{name}'))
+        self.assertEqual(0, trie.lookup('/files/a/b'))
+        self.assertEqual(0, trie.lookup('/files/a'))
+        self.assertIsNone(trie.lookup('/files'))
+
+    def test_segment_safe(self):
+        self.assertTrue(radix._segment_safe(r'\d+'))
+        self.assertTrue(radix._segment_safe('json|xml'))
+        self.assertTrue(radix._segment_safe('[a-f0-9-]{36}'))
+        self.assertFalse(radix._segment_safe('.+'))
+        self.assertFalse(radix._segment_safe('[^x]+'))
+        self.assertFalse(radix._segment_safe(r'\S+'))
+        self.assertFalse(radix._segment_safe('[!-z]'))
+        self.assertFalse(radix._segment_safe(r'a\/b'))
+
+    def test_block_resource_with_radix(self):
+        conf = {'resource': 'POST /widget{.format:json|xml}',
+                'resource_matcher': 'radix', 'enabled': 'true'}
+        result = block_resource.filter_factory(conf)(self.app)
+        self.assertTrue(isinstance(result.resources,
+                                   rf.RadixResourceMatcher))
+        resp = result.__call__.request('/widget.json', method='POST')
+        self.assertTrue(isinstance(resp, webob.exc.HTTPException))
+        resp = result.__call__.request('/widget.derp', method='POST')
+        self.assertEqual(self.app, resp)
+        resp = result.__call__.request('/widget', method='PUT')
+        self.assertEqual(self.app, resp)